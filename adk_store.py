@@ -0,0 +1,392 @@
+import os
+import sys
+import json
+import time
+import uuid
+import zlib
+import sqlite3
+import hashlib
+from contextlib import contextmanager
+from typing import Any, Optional
+
+from google.adk.events import Event
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService, Session
+from google.adk.sessions.base_session_service import (
+    BaseSessionService,
+    GetSessionConfig,
+    ListEventsResponse,
+    ListSessionsResponse,
+)
+from google.adk.sessions.state import State
+from google.adk.artifacts.base_artifact_service import BaseArtifactService
+from google.adk.artifacts.in_memory_artifact_service import InMemoryArtifactService
+from google.genai import types
+
+from state_store import STATE_DB_JOURNAL_MODE
+
+# --- Persistent ADK Sessions and Artifacts ---
+# Session events and artifact versions are stored as zlib-compressed, content-addressed blobs
+# (identical content is stored once) with a small SQLite index, so the preliminary plans,
+# research, drafts and HTML of every run can be inspected afterwards and nothing accumulates
+# in Python dicts during long batch runs. ADK_STORE=memory switches back to ADK's in-memory services.
+ADK_STORE = os.getenv("ADK_STORE", "disk").strip().lower()
+ADK_STORE_DIR = os.getenv(
+    "ADK_STORE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".seo_cache", "adk_store")
+)
+COMPRESSION_LEVEL = 6
+
+
+class BlobStore:
+    """Compressed blobs addressed by the SHA-256 of their uncompressed content."""
+
+    def __init__(self, root_dir: str):
+        self.root_dir = root_dir
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.root_dir, digest[:2], digest[2:] + ".zz")
+
+    def put(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, "wb") as f:
+                f.write(zlib.compress(data, COMPRESSION_LEVEL))
+            os.replace(temp_path, path)
+        return digest
+
+    def get(self, digest: str) -> bytes:
+        with open(self._path(digest), "rb") as f:
+            return zlib.decompress(f.read())
+
+    def digests(self):
+        for prefix in os.listdir(self.root_dir) if os.path.isdir(self.root_dir) else []:
+            for name in os.listdir(os.path.join(self.root_dir, prefix)):
+                if name.endswith(".zz"):
+                    yield prefix + name[:-3]
+
+    def delete(self, digest: str) -> int:
+        path = self._path(digest)
+        size = os.path.getsize(path)
+        os.remove(path)
+        return size
+
+
+class AdkStore:
+    """The SQLite index and blob store shared by the session and artifact services."""
+
+    def __init__(self, root_dir: str = ADK_STORE_DIR):
+        os.makedirs(root_dir, exist_ok=True)
+        self.blobs = BlobStore(os.path.join(root_dir, "blobs"))
+        self._conn = sqlite3.connect(os.path.join(root_dir, "index.sqlite3"), timeout=30, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute(f"PRAGMA journal_mode={STATE_DB_JOURNAL_MODE}")
+        self._conn.execute("PRAGMA busy_timeout=30000")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                app_name TEXT, user_id TEXT, session_id TEXT, state TEXT, created_at REAL, last_update_time REAL,
+                PRIMARY KEY (app_name, user_id, session_id));
+            CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, app_name TEXT, user_id TEXT, session_id TEXT,
+                event_id TEXT, author TEXT, timestamp REAL, blob TEXT);
+            CREATE INDEX IF NOT EXISTS events_session ON events (app_name, user_id, session_id, timestamp);
+            CREATE TABLE IF NOT EXISTS app_state (app_name TEXT, key TEXT, value TEXT, PRIMARY KEY (app_name, key));
+            CREATE TABLE IF NOT EXISTS user_state (
+                app_name TEXT, user_id TEXT, key TEXT, value TEXT, PRIMARY KEY (app_name, user_id, key));
+            CREATE TABLE IF NOT EXISTS artifacts (
+                app_name TEXT, user_id TEXT, scope TEXT, filename TEXT, version INTEGER, blob TEXT, size INTEGER,
+                saved_at REAL, PRIMARY KEY (app_name, user_id, scope, filename, version));
+        """)
+
+    @contextmanager
+    def transaction(self):
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield self._conn
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    def query(self, sql: str, params: tuple = ()) -> list[sqlite3.Row]:
+        return self._conn.execute(sql, params).fetchall()
+
+    def collect_garbage(self) -> tuple[int, int]:
+        """Deletes blobs no longer referenced by any event or artifact. Returns (blobs, bytes) freed."""
+        referenced = {row["blob"] for row in self.query("SELECT blob FROM events UNION SELECT blob FROM artifacts")}
+        freed_blobs = freed_bytes = 0
+        for digest in list(self.blobs.digests()):
+            if digest not in referenced:
+                freed_bytes += self.blobs.delete(digest)
+                freed_blobs += 1
+        return freed_blobs, freed_bytes
+
+
+class PersistentSessionService(BaseSessionService):
+    """
+    Disk-backed ADK session service. Sessions keep only their metadata and state in the
+    index; events are loaded from their blobs when a session is read.
+    """
+
+    def __init__(self, store: AdkStore | None = None):
+        self.store = store or AdkStore()
+
+    def create_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        state: Optional[dict[str, Any]] = None,
+        session_id: Optional[str] = None,
+    ) -> Session:
+        # Creating a session with an existing ID starts it over, like a fresh in-memory session.
+        session_id = session_id.strip() if session_id and session_id.strip() else str(uuid.uuid4())
+        now = time.time()
+        with self.store.transaction() as conn:
+            self._delete_rows(conn, app_name, user_id, session_id)
+            conn.execute(
+                "INSERT INTO sessions (app_name, user_id, session_id, state, created_at, last_update_time) VALUES (?, ?, ?, ?, ?, ?)",
+                (app_name, user_id, session_id, json.dumps(state or {}), now, now),
+            )
+        session = Session(app_name=app_name, user_id=user_id, id=session_id, state=state or {}, last_update_time=now)
+        return self._merge_state(session)
+
+    def get_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        config: Optional[GetSessionConfig] = None,
+    ) -> Optional[Session]:
+        rows = self.store.query(
+            "SELECT state, last_update_time FROM sessions WHERE app_name = ? AND user_id = ? AND session_id = ?",
+            (app_name, user_id, session_id),
+        )
+        if not rows:
+            return None
+        sql = "SELECT blob FROM events WHERE app_name = ? AND user_id = ? AND session_id = ?"
+        params = (app_name, user_id, session_id)
+        if config and config.after_timestamp:
+            sql += " AND timestamp >= ?"
+            params += (config.after_timestamp,)
+        sql += " ORDER BY id"
+        event_rows = self.store.query(sql, params)
+        if config and config.num_recent_events:
+            event_rows = event_rows[-config.num_recent_events:]
+        session = Session(
+            app_name=app_name,
+            user_id=user_id,
+            id=session_id,
+            state=json.loads(rows[0]["state"]),
+            events=[Event.model_validate_json(self.store.blobs.get(row["blob"])) for row in event_rows],
+            last_update_time=rows[0]["last_update_time"],
+        )
+        return self._merge_state(session)
+
+    def _merge_state(self, session: Session) -> Session:
+        for row in self.store.query("SELECT key, value FROM app_state WHERE app_name = ?", (session.app_name,)):
+            session.state[State.APP_PREFIX + row["key"]] = json.loads(row["value"])
+        for row in self.store.query(
+            "SELECT key, value FROM user_state WHERE app_name = ? AND user_id = ?", (session.app_name, session.user_id)
+        ):
+            session.state[State.USER_PREFIX + row["key"]] = json.loads(row["value"])
+        return session
+
+    def list_sessions(self, *, app_name: str, user_id: str) -> ListSessionsResponse:
+        rows = self.store.query(
+            "SELECT session_id, last_update_time FROM sessions WHERE app_name = ? AND user_id = ? ORDER BY created_at",
+            (app_name, user_id),
+        )
+        return ListSessionsResponse(sessions=[
+            Session(app_name=app_name, user_id=user_id, id=row["session_id"], last_update_time=row["last_update_time"])
+            for row in rows
+        ])
+
+    def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        with self.store.transaction() as conn:
+            self._delete_rows(conn, app_name, user_id, session_id)
+
+    def _delete_rows(self, conn, app_name: str, user_id: str, session_id: str):
+        for table in ("sessions", "events"):
+            conn.execute(
+                f"DELETE FROM {table} WHERE app_name = ? AND user_id = ? AND session_id = ?", (app_name, user_id, session_id)
+            )
+
+    def list_events(self, *, app_name: str, user_id: str, session_id: str) -> ListEventsResponse:
+        session = self.get_session(app_name=app_name, user_id=user_id, session_id=session_id)
+        return ListEventsResponse(events=session.events if session else [])
+
+    def append_event(self, session: Session, event: Event) -> Event:
+        super().append_event(session=session, event=event)
+        if event.partial:
+            return event
+        session.last_update_time = event.timestamp
+        blob = self.store.blobs.put(event.model_dump_json(exclude_none=True).encode("utf-8"))
+        state_delta = event.actions.state_delta if event.actions and event.actions.state_delta else {}
+        with self.store.transaction() as conn:
+            conn.execute(
+                "INSERT INTO events (app_name, user_id, session_id, event_id, author, timestamp, blob) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (session.app_name, session.user_id, session.id, event.id, event.author, event.timestamp, blob),
+            )
+            for key, value in state_delta.items():
+                if key.startswith(State.APP_PREFIX):
+                    conn.execute(
+                        "INSERT OR REPLACE INTO app_state (app_name, key, value) VALUES (?, ?, ?)",
+                        (session.app_name, key.removeprefix(State.APP_PREFIX), json.dumps(value)),
+                    )
+                elif key.startswith(State.USER_PREFIX):
+                    conn.execute(
+                        "INSERT OR REPLACE INTO user_state (app_name, user_id, key, value) VALUES (?, ?, ?, ?)",
+                        (session.app_name, session.user_id, key.removeprefix(State.USER_PREFIX), json.dumps(value)),
+                    )
+            session_state = {
+                key: value for key, value in session.state.items()
+                if not key.startswith((State.APP_PREFIX, State.USER_PREFIX, State.TEMP_PREFIX))
+            }
+            conn.execute(
+                "UPDATE sessions SET state = ?, last_update_time = ? WHERE app_name = ? AND user_id = ? AND session_id = ?",
+                (json.dumps(session_state), event.timestamp, session.app_name, session.user_id, session.id),
+            )
+        return event
+
+
+class PersistentArtifactService(BaseArtifactService):
+    """Disk-backed ADK artifact service; every saved version is kept as a blob."""
+
+    def __init__(self, store: AdkStore | None = None):
+        self.store = store or AdkStore()
+
+    def _scope(self, session_id: str, filename: str) -> str:
+        # "user:" artifacts are shared by all sessions of the user, as in ADK's in-memory service.
+        return "user" if filename.startswith("user:") else f"session:{session_id}"
+
+    async def save_artifact(self, *, app_name: str, user_id: str, session_id: str, filename: str, artifact: types.Part) -> int:
+        data = artifact.model_dump_json(exclude_none=True).encode("utf-8")
+        blob = self.store.blobs.put(data)
+        scope = self._scope(session_id, filename)
+        with self.store.transaction() as conn:
+            row = conn.execute(
+                "SELECT MAX(version) AS latest FROM artifacts WHERE app_name = ? AND user_id = ? AND scope = ? AND filename = ?",
+                (app_name, user_id, scope, filename),
+            ).fetchone()
+            version = 0 if row["latest"] is None else row["latest"] + 1
+            conn.execute(
+                "INSERT INTO artifacts (app_name, user_id, scope, filename, version, blob, size, saved_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (app_name, user_id, scope, filename, version, blob, len(data), time.time()),
+            )
+        return version
+
+    async def load_artifact(
+        self, *, app_name: str, user_id: str, session_id: str, filename: str, version: Optional[int] = None
+    ) -> Optional[types.Part]:
+        sql = "SELECT blob FROM artifacts WHERE app_name = ? AND user_id = ? AND scope = ? AND filename = ?"
+        params = (app_name, user_id, self._scope(session_id, filename), filename)
+        if version is not None:
+            sql += " AND version = ?"
+            params += (version,)
+        rows = self.store.query(sql + " ORDER BY version DESC LIMIT 1", params)
+        if not rows:
+            return None
+        return types.Part.model_validate_json(self.store.blobs.get(rows[0]["blob"]))
+
+    async def list_artifact_keys(self, *, app_name: str, user_id: str, session_id: str) -> list[str]:
+        rows = self.store.query(
+            "SELECT DISTINCT filename FROM artifacts WHERE app_name = ? AND user_id = ? AND scope IN (?, 'user') ORDER BY filename",
+            (app_name, user_id, f"session:{session_id}"),
+        )
+        return [row["filename"] for row in rows]
+
+    async def delete_artifact(self, *, app_name: str, user_id: str, session_id: str, filename: str) -> None:
+        with self.store.transaction() as conn:
+            conn.execute(
+                "DELETE FROM artifacts WHERE app_name = ? AND user_id = ? AND scope = ? AND filename = ?",
+                (app_name, user_id, self._scope(session_id, filename), filename),
+            )
+
+    async def list_versions(self, *, app_name: str, user_id: str, session_id: str, filename: str) -> list[int]:
+        rows = self.store.query(
+            "SELECT version FROM artifacts WHERE app_name = ? AND user_id = ? AND scope = ? AND filename = ? ORDER BY version",
+            (app_name, user_id, self._scope(session_id, filename), filename),
+        )
+        return [row["version"] for row in rows]
+
+
+_shared_store = None
+
+
+def _get_shared_store() -> AdkStore:
+    global _shared_store
+    if _shared_store is None:
+        _shared_store = AdkStore()
+    return _shared_store
+
+
+def create_session_service() -> BaseSessionService:
+    """Session service selected by ADK_STORE ("disk" by default, or "memory")."""
+    if ADK_STORE == "memory":
+        return InMemorySessionService()
+    return PersistentSessionService(_get_shared_store())
+
+
+def create_artifact_service() -> BaseArtifactService:
+    """Artifact service selected by ADK_STORE ("disk" by default, or "memory")."""
+    if ADK_STORE == "memory":
+        return InMemoryArtifactService()
+    return PersistentArtifactService(_get_shared_store())
+
+
+_runners = {}
+
+
+def get_runner(app_name: str, build_agent) -> Runner:
+    """
+    The Runner of an app, created on first use with the agent from build_agent() and the
+    configured session and artifact services. Runners are kept for the life of the process,
+    so repeated runs in one process (daemon mode) reuse their agents and model clients.
+    """
+    if app_name not in _runners:
+        _runners[app_name] = Runner(
+            app_name=app_name,
+            agent=build_agent(),
+            session_service=create_session_service(),
+            artifact_service=create_artifact_service(),
+        )
+    return _runners[app_name]
+
+
+def _event_text(event: Event) -> str:
+    parts = event.content.parts if event.content and event.content.parts else []
+    return "".join(part.text or "" for part in parts)
+
+
+if __name__ == "__main__":
+    # Usage: python adk_store.py list [app_name] | show <session_id> | gc
+    command = sys.argv[1] if len(sys.argv) > 1 else "list"
+    store = AdkStore()
+    if command == "list":
+        sql = ("SELECT s.app_name, s.user_id, s.session_id, s.last_update_time, COUNT(e.id) AS events FROM sessions s "
+               "LEFT JOIN events e USING (app_name, user_id, session_id)")
+        params = ()
+        if len(sys.argv) > 2:
+            sql += " WHERE s.app_name = ?"
+            params = (sys.argv[2],)
+        for row in store.query(sql + " GROUP BY s.app_name, s.user_id, s.session_id ORDER BY s.last_update_time", params):
+            updated = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(row["last_update_time"]))
+            print(f"{updated}  {row['app_name']}/{row['user_id']}/{row['session_id']}  ({row['events']} events)")
+    elif command == "show" and len(sys.argv) > 2:
+        service = PersistentSessionService(store)
+        for row in store.query("SELECT app_name, user_id FROM sessions WHERE session_id = ?", (sys.argv[2],)):
+            session = service.get_session(app_name=row["app_name"], user_id=row["user_id"], session_id=sys.argv[2])
+            print(f"=== {row['app_name']}/{row['user_id']}/{sys.argv[2]} ===")
+            for event in session.events:
+                print(f"--- [{event.author}] ---")
+                print(_event_text(event))
+    elif command == "gc":
+        freed_blobs, freed_bytes = store.collect_garbage()
+        print(f"Deleted {freed_blobs} unreferenced blobs ({freed_bytes / 1024:.1f} KiB).")
+    else:
+        print("Usage: python adk_store.py list [app_name] | show <session_id> | gc")
+        sys.exit(1)
@@ -3,15 +3,24 @@ import re
 import time
 import asyncio
 import csv
+import httpx
+from bs4 import BeautifulSoup
 from dotenv import load_dotenv
 
 from google.adk.agents import Agent
 from google.adk.models.lite_llm import LiteLlm
 from google.adk.runners import Runner
-from google.adk.sessions import InMemorySessionService
-from google.adk.artifacts.in_memory_artifact_service import InMemoryArtifactService
 from google.genai import types as genai_types
 
+import http_pool
+import llm_batch
+import llm_gateway
+from llm_gateway import PipelineLiteLLMClient
+from adk_store import get_runner
+from state_store import StateStore
+import tracing
+from tracing import traced
+
 # --- Configuration ---
 COMPETITOR_URLS_SHEET_NAME = "Competitor URLs"
 ANALYSIS_OUTPUT_SHEET_NAME = "Competitor Analysis"
@@ -21,6 +30,10 @@ COMPETITOR_URLS_CSV_PATH = os.path.join(BASE_FILE_PATH, f"{COMPETITOR_URLS_SHEET
 ANALYSIS_OUTPUT_CSV_PATH = os.path.join(BASE_FILE_PATH, f"{ANALYSIS_OUTPUT_SHEET_NAME}.csv")
 POSTED_CSV_FILENAME = "Posted.csv"
 POSTED_CSV_PATH = os.path.join(BASE_FILE_PATH, POSTED_CSV_FILENAME)
+STATE_DB_PATH = os.path.join(BASE_FILE_PATH, "seo_state.sqlite3")
+STATE_TABLES = ["competitor_urls", "competitor_analysis", "posted"]
+
+state_store = None  # StateStore opened in main()
 
 URL_COL_COMP_SHEET = "URL"
 ANALYSED_COL_COMP_SHEET = "Analysed"
@@ -34,15 +47,21 @@ POSTED_CSV_HEADERS = [TOPIC_COL_ANALYSIS_SHEET, KEYWORDS_COL_ANALYSIS_SHEET, SUM
 load_dotenv()
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 
-if not OPENROUTER_API_KEY:
-    print("Error: OPENROUTER_API_KEY not found in environment variables. Please set it in a .env file.")
-    exit(1)
-
 # --- LLM and Agent Setup ---
-model = LiteLlm(
-    model="openrouter/openai/gpt-4o-mini-search-preview",
-    api_key=OPENROUTER_API_KEY,
-)
+ANALYZER_MODEL_NAME = "openai/gpt-4o-mini-search-preview"
+
+# ANALYZER_MODE=batch submits all pending URLs as one provider batch job (llm_batch.py)
+# instead of analyzing them one by one through the agent: about half the price, and the
+# requests count against the provider's batch quota rather than the live rate limits. Batch
+# models cannot browse, so the page text is fetched here and included in each request.
+ANALYZER_MODE = os.getenv("ANALYZER_MODE", "live").strip().lower()  # live | batch
+ANALYZER_BATCH_MODEL = os.getenv("ANALYZER_BATCH_MODEL", "gpt-4o-mini")
+LLM_BATCH_API_BASE = os.getenv("LLM_BATCH_API_BASE", "https://api.openai.com/v1")
+LLM_BATCH_API_KEY = os.getenv("LLM_BATCH_API_KEY") or os.getenv("OPENAI_API_KEY")
+BATCH_JOB_NAME = "analyzer"
+PAGE_FETCH_CONCURRENCY = int(os.getenv("PAGE_FETCH_CONCURRENCY", "8"))
+PAGE_FETCH_TIMEOUT_SECONDS = float(os.getenv("PAGE_FETCH_TIMEOUT_SECONDS", "20"))
+PAGE_TEXT_MAX_CHARS = int(os.getenv("PAGE_TEXT_MAX_CHARS", "20000"))
 
 AGENT_INSTRUCTION = """
 You are part of a professional SEO team.
@@ -68,12 +87,19 @@ Example of the expected output format:
 Do not output any introductory text, explanations, or anything else besides the single markdown table with its three required rows (header, separator, one data row). Ensure the keywords are directly from the blog content.
 """
 
-analyzer_agent = Agent(
-    name="seo_competitor_analyzer",
-    model=model,
-    instruction=AGENT_INSTRUCTION,
-    tools=[],
-)
+def build_analyzer_agent() -> Agent:
+    """Created when the analysis runs rather than at import, so importing this module needs no API key."""
+    model = LiteLlm(
+        model="openrouter/" + ANALYZER_MODEL_NAME,
+        api_key=OPENROUTER_API_KEY,
+        llm_client=PipelineLiteLLMClient(),
+    )
+    return Agent(
+        name="seo_competitor_analyzer",
+        model=model,
+        instruction=AGENT_INSTRUCTION,
+        tools=[],
+    )
 
 # --- CSV Helper Functions ---
 def _ensure_csv_with_headers(file_path, expected_headers):
@@ -90,6 +116,7 @@ def _ensure_csv_with_headers(file_path, expected_headers):
     else:
         print(f"CSV file '{file_path}' already exists.")
 
+@traced("csv")
 def initialize_csv_files():
     print(f"Ensuring CSV file: {COMPETITOR_URLS_CSV_PATH}")
     _ensure_csv_with_headers(COMPETITOR_URLS_CSV_PATH, [URL_COL_COMP_SHEET, ANALYSED_COL_COMP_SHEET])
@@ -98,250 +125,64 @@ def initialize_csv_files():
     print(f"Ensuring CSV file: {POSTED_CSV_PATH}")
     _ensure_csv_with_headers(POSTED_CSV_PATH, POSTED_CSV_HEADERS)
 
-def get_urls_to_analyze_csv():
-    urls_data = []
-    try:
-        with open(COMPETITOR_URLS_CSV_PATH, 'r', newline='', encoding='utf-8') as csvfile:
-            reader = csv.DictReader(csvfile)
-            if URL_COL_COMP_SHEET not in reader.fieldnames or ANALYSED_COL_COMP_SHEET not in reader.fieldnames:
-                print(f"Error: Missing required columns ('{URL_COL_COMP_SHEET}' or '{ANALYSED_COL_COMP_SHEET}') in '{COMPETITOR_URLS_CSV_PATH}'.")
-                return []
-            for i, row in enumerate(reader):
-                url = row.get(URL_COL_COMP_SHEET, "").strip()
-                analysed_status = row.get(ANALYSED_COL_COMP_SHEET, "").strip().lower()
-                if url and analysed_status == "no":
-                    urls_data.append({"url": url, "original_row_index": i + 2})
-    except FileNotFoundError:
-        print(f"Error: '{COMPETITOR_URLS_CSV_PATH}' not found. Please create it or run the converter script.")
-        initialize_csv_files()
-        return []
-    except Exception as e:
-        print(f"Error reading '{COMPETITOR_URLS_CSV_PATH}': {e}")
-        return []
-    return urls_data
+def get_urls_to_analyze():
+    """Competitor URLs whose 'Analysed' status is 'No'."""
+    rows = state_store.rows("competitor_urls", status_in=("no",))
+    return [{"url": row[URL_COL_COMP_SHEET].strip()} for row in rows if row[URL_COL_COMP_SHEET].strip()]
 
 def get_posted_urls_to_analyze():
-    urls_data = []
-    try:
-        with open(POSTED_CSV_PATH, 'r', newline='', encoding='utf-8') as csvfile:
-            reader = csv.DictReader(csvfile)
-            if not all(col in reader.fieldnames for col in [URL_COL_ANALYSIS_SHEET, ANALYSED_COL_COMP_SHEET]):
-                print(f"Error: Missing required columns ('{URL_COL_ANALYSIS_SHEET}' or '{ANALYSED_COL_COMP_SHEET}') in '{POSTED_CSV_PATH}'.")
-                return []
-            for i, row in enumerate(reader):
-                url = row.get(URL_COL_ANALYSIS_SHEET, "").strip()
-                analysed_status = row.get(ANALYSED_COL_COMP_SHEET, "").strip().lower()
-                if url and (analysed_status == "no" or not analysed_status):
-                    urls_data.append({"url": url})
-    except FileNotFoundError:
-        print(f"Error: '{POSTED_CSV_PATH}' not found. Please create it. Attempting to initialize.")
-        initialize_csv_files()
-        return []
-    except Exception as e:
-        print(f"Error reading '{POSTED_CSV_PATH}': {e}")
-        return []
-    return urls_data
+    """Posted URLs whose 'Analysed' status is 'No' or empty."""
+    rows = state_store.rows("posted", status_in=("no", ""))
+    return [{"url": row[URL_COL_ANALYSIS_SHEET].strip()} for row in rows if row[URL_COL_ANALYSIS_SHEET].strip()]
 
-def write_analysis_data_csv(data_dict):
-    output_buffer = []
+def write_analysis_data(data_dict):
+    """Updates the analysis rows of the URL, or appends a new one."""
     url_to_update = data_dict[URL_COL_ANALYSIS_SHEET]
-    updated_in_file = False
-
-    canonical_fieldnames = [TOPIC_COL_ANALYSIS_SHEET, KEYWORDS_COL_ANALYSIS_SHEET, SUMMARY_COL_ANALYSIS_SHEET, URL_COL_ANALYSIS_SHEET]
-    current_fieldnames = []
-
     try:
-        with open(ANALYSIS_OUTPUT_CSV_PATH, 'r', newline='', encoding='utf-8') as csvfile:
-            reader = csv.reader(csvfile)
-            header = next(reader, None)
-
-            if header and any(h.strip() for h in header):
-                current_fieldnames = header
-                output_buffer.append(current_fieldnames)
-
-                url_col_idx = -1
-                try:
-                    url_col_idx = current_fieldnames.index(URL_COL_ANALYSIS_SHEET)
-                except ValueError:
-                    print(f"Warning: '{URL_COL_ANALYSIS_SHEET}' not in '{ANALYSIS_OUTPUT_CSV_PATH}' headers. Update/Append might be problematic.")
-
-                for row_list in reader:
-                    if not any(cell.strip() for cell in row_list):
-                        continue
-
-                    is_target_row = False
-                    if url_col_idx != -1 and url_col_idx < len(row_list) and row_list[url_col_idx] == url_to_update:
-                        is_target_row = True
-
-                    if is_target_row:
-                        print(f"Updating data for URL {url_to_update} in '{ANALYSIS_OUTPUT_CSV_PATH}'")
-                        updated_row_values = []
-                        temp_row_dict_for_update = dict(zip(current_fieldnames, row_list))
-                        for fn_header in current_fieldnames:
-                            updated_row_values.append(data_dict.get(fn_header, temp_row_dict_for_update.get(fn_header, "")))
-                        output_buffer.append(updated_row_values)
-                        updated_in_file = True
-                    else:
-                        output_buffer.append(row_list)
-            else:
-                print(f"'{ANALYSIS_OUTPUT_CSV_PATH}' is empty or has no valid header. Will create/overwrite with new data and canonical headers.")
-                current_fieldnames = canonical_fieldnames
-                output_buffer.append(current_fieldnames)
-
-        if not updated_in_file:
-            print(f"Appending new data for URL {url_to_update} to '{ANALYSIS_OUTPUT_CSV_PATH}'")
-            if not output_buffer or not output_buffer[0]:
-                header_for_append = current_fieldnames if current_fieldnames and any(h.strip() for h in current_fieldnames) else canonical_fieldnames
-                if not output_buffer:
-                    output_buffer.append(header_for_append)
-                else:
-                    output_buffer[0] = header_for_append
-            else:
-                header_for_append = output_buffer[0]
-
-            new_row_values = [data_dict.get(fn, "") for fn in header_for_append]
-            output_buffer.append(new_row_values)
-
-        with open(ANALYSIS_OUTPUT_CSV_PATH, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerows(output_buffer)
-        print(f"Successfully wrote to '{ANALYSIS_OUTPUT_CSV_PATH}' for URL {url_to_update}")
-
-    except FileNotFoundError:
-        print(f"File '{ANALYSIS_OUTPUT_CSV_PATH}' not found. Creating new file with data.")
-        output_buffer.append(canonical_fieldnames)
-        new_row_values = [data_dict.get(fn, "") for fn in canonical_fieldnames]
-        output_buffer.append(new_row_values)
-        with open(ANALYSIS_OUTPUT_CSV_PATH, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerows(output_buffer)
-        print(f"Successfully created and wrote to '{ANALYSIS_OUTPUT_CSV_PATH}' for URL {url_to_update}")
+        if state_store.upsert("competitor_analysis", url_to_update, data_dict):
+            print(f"Updated analysis data for URL {url_to_update}.")
+        else:
+            print(f"Appended analysis data for URL {url_to_update}.")
     except Exception as e:
-        print(f"Error writing to '{ANALYSIS_OUTPUT_CSV_PATH}': {e}")
-        import traceback
-        traceback.print_exc()
+        print(f"Error saving analysis data for URL {url_to_update}: {e}")
 
-def update_posted_csv_data(url_to_update: str, analysis_results: dict):
+def update_posted_data(url_to_update: str, analysis_results: dict):
     """
-    Updates an existing row in Posted.csv with new analysis data and marks it as 'Yes'.
+    Updates an existing Posted row with new analysis data and marks it as 'Yes'.
     analysis_results should be a dict with keys TOPIC_COL_ANALYSIS_SHEET, etc.
     """
-    rows = []
-    updated = False
-
+    values = {
+        column: analysis_results[column]
+        for column in (TOPIC_COL_ANALYSIS_SHEET, KEYWORDS_COL_ANALYSIS_SHEET, SUMMARY_COL_ANALYSIS_SHEET)
+        if column in analysis_results
+    }
+    values[ANALYSED_COL_COMP_SHEET] = "Yes"
     try:
-        with open(POSTED_CSV_PATH, 'r', newline='', encoding='utf-8') as csvfile:
-            reader = csv.DictReader(csvfile)
-            if not reader.fieldnames:
-                print(f"Error: {POSTED_CSV_PATH} seems to be empty or has no headers.")
-                return
-
-            if not all(col in reader.fieldnames for col in POSTED_CSV_HEADERS):
-                print(f"Error: '{POSTED_CSV_PATH}' is missing some of the required headers: {POSTED_CSV_HEADERS}. Found: {reader.fieldnames}")
-                return
-
-            fieldnames = reader.fieldnames
-
-            for row in reader:
-                if row.get(URL_COL_ANALYSIS_SHEET) == url_to_update:
-                    row[TOPIC_COL_ANALYSIS_SHEET] = analysis_results.get(TOPIC_COL_ANALYSIS_SHEET, row.get(TOPIC_COL_ANALYSIS_SHEET, ""))
-                    row[KEYWORDS_COL_ANALYSIS_SHEET] = analysis_results.get(KEYWORDS_COL_ANALYSIS_SHEET, row.get(KEYWORDS_COL_ANALYSIS_SHEET, ""))
-                    row[SUMMARY_COL_ANALYSIS_SHEET] = analysis_results.get(SUMMARY_COL_ANALYSIS_SHEET, row.get(SUMMARY_COL_ANALYSIS_SHEET, ""))
-                    row[ANALYSED_COL_COMP_SHEET] = "Yes"
-                    updated = True
-                    print(f"Prepared update for URL {url_to_update} in '{POSTED_CSV_PATH}'")
-                rows.append(row)
-
-        if not updated:
-            print(f"Warning: URL '{url_to_update}' not found in '{POSTED_CSV_PATH}' for updating. No changes made to this file for this URL.")
-            return
-
-        with open(POSTED_CSV_PATH, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(rows)
-
-        print(f"Successfully updated data in '{POSTED_CSV_PATH}' for URL {url_to_update}")
-
-    except FileNotFoundError:
-        print(f"Error: '{POSTED_CSV_PATH}' not found during update. It should have been created.")
+        if state_store.update("posted", url_to_update, values):
+            print(f"Successfully updated posted data for URL {url_to_update}.")
+        else:
+            print(f"Warning: URL '{url_to_update}' not found in posted URLs for updating. No changes made for this URL.")
     except Exception as e:
-        print(f"Error updating '{POSTED_CSV_PATH}' for URL {url_to_update}: {e}")
-        import traceback
-        traceback.print_exc()
+        print(f"Error updating posted data for URL {url_to_update}: {e}")
 
-def mark_url_as_analyzed_csv(url_info_to_mark):
-    output_buffer = []
+def mark_url_as_analyzed(url_info_to_mark):
     url_to_mark = url_info_to_mark["url"]
-    found_and_marked = False
-
-    current_fieldnames = []
-
     try:
-        with open(COMPETITOR_URLS_CSV_PATH, 'r', newline='', encoding='utf-8') as csvfile:
-            reader = csv.reader(csvfile)
-            header = next(reader, None)
-
-            if header and any(h.strip() for h in header):
-                current_fieldnames = header
-                output_buffer.append(current_fieldnames)
-
-                url_col_idx = -1
-                analysed_col_idx = -1
-                try:
-                    url_col_idx = current_fieldnames.index(URL_COL_COMP_SHEET)
-                    analysed_col_idx = current_fieldnames.index(ANALYSED_COL_COMP_SHEET)
-                except ValueError:
-                    print(f"Warning: Missing required columns ('{URL_COL_COMP_SHEET}' or '{ANALYSED_COL_COMP_SHEET}') in '{COMPETITOR_URLS_CSV_PATH}' header. Cannot mark URLs.")
-                    for row_list in reader:
-                        if not any(cell.strip() for cell in row_list):
-                            continue
-                        output_buffer.append(row_list)
-
-                if url_col_idx != -1 and analysed_col_idx != -1:
-                    for row_list in reader:
-                        if not any(cell.strip() for cell in row_list):
-                            continue
-
-                        current_row_list_copy = list(row_list)
-
-                        if url_col_idx < len(current_row_list_copy) and current_row_list_copy[url_col_idx] == url_to_mark:
-                            if analysed_col_idx < len(current_row_list_copy):
-                                current_row_list_copy[analysed_col_idx] = "Yes"
-                                print(f"Marking URL {url_to_mark} as 'Yes' in '{COMPETITOR_URLS_CSV_PATH}'")
-                                found_and_marked = True
-                            else:
-                                print(f"Warning: Row for {url_to_mark} in '{COMPETITOR_URLS_CSV_PATH}' is too short to mark 'Analysed'. Length: {len(current_row_list_copy)}, Expected index: {analysed_col_idx}")
-                        output_buffer.append(current_row_list_copy)
-
-            else:
-                print(f"'{COMPETITOR_URLS_CSV_PATH}' is empty or has no valid header. Cannot mark URL or clean file.")
-                return
-
-        if not found_and_marked and (header and any(h.strip() for h in header) and URL_COL_COMP_SHEET in header):
-            print(f"Warning: URL '{url_to_mark}' not found in '{COMPETITOR_URLS_CSV_PATH}' to mark as analyzed (after filtering empty rows).")
-
-        if output_buffer:
-            with open(COMPETITOR_URLS_CSV_PATH, 'w', newline='', encoding='utf-8') as csvfile:
-                writer = csv.writer(csvfile)
-                writer.writerows(output_buffer)
-            print(f"Successfully updated '{COMPETITOR_URLS_CSV_PATH}' (empty rows removed if any).")
+        if state_store.update("competitor_urls", url_to_mark, {ANALYSED_COL_COMP_SHEET: "Yes"}):
+            print(f"Marked URL {url_to_mark} as 'Yes'.")
         else:
-            print(f"No content to write for '{COMPETITOR_URLS_CSV_PATH}' after processing.")
-
-    except FileNotFoundError:
-        print(f"Error: '{COMPETITOR_URLS_CSV_PATH}' not found during marking analyzed. It should have been created by initialize_csv_files.")
+            print(f"Warning: URL '{url_to_mark}' not found in competitor URLs to mark as analyzed.")
     except Exception as e:
-        print(f"Error updating '{COMPETITOR_URLS_CSV_PATH}': {e}")
-
+        print(f"Error marking URL {url_to_mark} as analyzed: {e}")
 
 # --- Markdown Parsing Function ---
+@traced("parse")
 def parse_ai_table_output(markdown_table: str) -> dict | None:
     if not markdown_table or not markdown_table.strip():
         print("Warning: Empty or whitespace-only markdown_table received from LLM.")
         return None
 
-    lines = [line.strip() for line in markdown_table.strip().split('\\n') if line.strip()]
+    lines = [line.strip() for line in markdown_table.strip().splitlines() if line.strip()]
 
     header_line_index = -1
     for i, line in enumerate(lines):
@@ -359,7 +200,7 @@ def parse_ai_table_output(markdown_table: str) -> dict | None:
     for i in range(header_line_index + 1, len(lines)):
         line_content = lines[i]
         if line_content.startswith('|') and \
-           not re.match(r"^[|\\s:-]+$", line_content):
+           not re.match(r"^[|\s:-]+$", line_content):
             data_row_index = i
             break
 
@@ -372,7 +213,7 @@ def parse_ai_table_output(markdown_table: str) -> dict | None:
     if len(raw_data_columns) >= 3:
         topic = raw_data_columns[0]
         keywords = raw_data_columns[1]
-        summary = raw_data_columns[2].replace("<br>", "\\n").replace("<br/>", "\\n").replace("<br />", "\\n")
+        summary = raw_data_columns[2].replace("<br>", "\n").replace("<br/>", "\n").replace("<br />", "\n")
 
         if not topic and len(raw_data_columns[0]) == 0:
              print(f"Warning: Parsed 'Topic' is empty. Row: '{lines[data_row_index]}'")
@@ -390,6 +231,89 @@ def parse_ai_table_output(markdown_table: str) -> dict | None:
         print(f"Warning: Expected at least 3 data columns based on prompt, found {len(raw_data_columns)}. Row: '{lines[data_row_index]}'. Table:\\n{markdown_table}")
         return None
 
+# --- Batch Mode ---
+async def fetch_page_text(url: str) -> str | None:
+    """The visible text of a page (scripts, styles and navigation removed), or None if it could not be fetched."""
+    try:
+        response = await http_pool.get_client().get(url, timeout=PAGE_FETCH_TIMEOUT_SECONDS, headers={"User-Agent": "Mozilla/5.0 (compatible; seo-analyzer)"})
+        response.raise_for_status()
+    except httpx.HTTPError as e:
+        print(f"Error fetching {url}: {e}")
+        return None
+    soup = BeautifulSoup(response.text, "html.parser")
+    for tag in soup(["script", "style", "noscript", "nav", "header", "footer", "form"]):
+        tag.decompose()
+    text = " ".join(soup.get_text(" ").split())
+    return text[:PAGE_TEXT_MAX_CHARS] or None
+
+async def _fetch_pages(urls: list[str]) -> dict:
+    semaphore = asyncio.Semaphore(PAGE_FETCH_CONCURRENCY)
+
+    async def fetch(url):
+        async with semaphore:
+            return url, await fetch_page_text(url)
+
+    with tracing.span("fetch pages", "network", urls=len(urls)):
+        return dict(await asyncio.gather(*(fetch(url) for url in urls)))
+
+async def _submit_analysis_batch(competitor_urls: list[dict], posted_urls: list[dict]) -> dict | None:
+    pending = [("competitor", info["url"]) for info in competitor_urls] + [("posted", info["url"]) for info in posted_urls]
+    pages = await _fetch_pages(sorted({url for _, url in pending}))
+    request_lines, items = [], {}
+    for n, (kind, url) in enumerate(pending):
+        if not pages.get(url):
+            print(f"Skipping {kind} URL {url} in this batch: its page could not be fetched. It stays pending.")
+            continue
+        custom_id = f"{kind}-{n}"
+        messages = [
+            {"role": "system", "content": AGENT_INSTRUCTION},
+            {"role": "user", "content": f"Please analyze the following URL: {url}\n\nThe text content of the page:\n{pages[url]}"},
+        ]
+        request_lines.append(llm_batch.build_request_line(custom_id, ANALYZER_BATCH_MODEL, messages))
+        items[custom_id] = {"kind": kind, "url": url}
+    if not request_lines:
+        print("No pages could be fetched; nothing to submit.")
+        return None
+    return await llm_batch.submit_job(BATCH_JOB_NAME, request_lines, items, LLM_BATCH_API_BASE, LLM_BATCH_API_KEY)
+
+async def analyze_in_batch(competitor_urls: list[dict], posted_urls: list[dict]):
+    """
+    Analyzes the pending URLs as one batch job, or collects the job an earlier run submitted.
+    The results go through parse_ai_table_output into the state store like live results do.
+    """
+    job = llm_batch.load_job(BATCH_JOB_NAME)
+    if job:
+        print(f"Resuming batch {job['batch_id']} submitted {(time.time() - job['submitted_at']) / 60:.0f} min ago ({job['requests']} requests).")
+    else:
+        job = await _submit_analysis_batch(competitor_urls, posted_urls)
+        if not job:
+            return
+    with tracing.span("Analyzer batch", "batch", batch_id=job["batch_id"]):
+        batch = await llm_batch.wait_for_job(job, LLM_BATCH_API_KEY)
+    if batch is None:
+        return
+    results = await llm_batch.collect_results(job, batch, LLM_BATCH_API_KEY)
+
+    succeeded = failed = 0
+    tokens = 0
+    for custom_id, item in job["items"].items():
+        result = results[custom_id]
+        tokens += (result["usage"] or {}).get("total_tokens", 0)
+        parsed_data = parse_ai_table_output(result["content"]) if result["content"] else None
+        if not parsed_data:
+            failed += 1
+            print(f"Batch result for {item['kind']} URL {item['url']} not usable ({result['error'] or 'unparsable table'}); it stays pending.")
+            continue
+        succeeded += 1
+        if item["kind"] == "competitor":
+            parsed_data[URL_COL_ANALYSIS_SHEET] = item["url"]
+            write_analysis_data(parsed_data)
+            mark_url_as_analyzed({"url": item["url"]})
+        else:
+            update_posted_data(item["url"], parsed_data)
+    llm_batch.finish_job(BATCH_JOB_NAME)
+    print(f"Batch {job['batch_id']} {batch.status}: {succeeded} URLs analyzed, {failed} left pending, {tokens} tokens.")
+
 # --- Main Logic ---
 async def _run_agent_and_parse(runner: Runner, session_id: str, url_to_analyze: str) -> dict | None:
     """
@@ -404,17 +328,18 @@ async def _run_agent_and_parse(runner: Runner, session_id: str, url_to_analyze:
 
     try:
         event_count = 0
-        async for event in runner.run_async(session_id=session_id, user_id='analyzer_user', new_message=content):
-            event_count += 1
-            if event.is_final_response():
-                if event.content and event.content.parts:
-                    agent_final_text = event.content.parts[0].text
-                elif event.actions and event.actions.escalate and event.error_message:
-                    agent_final_text = f"Agent escalated with error: {event.error_message}"
-                    print(f"Error: Agent escalated for {url_to_analyze}: {event.error_message}")
-                else:
-                    print(f"Warning: Final response for {url_to_analyze} had no parsable content. Event: {event}")
-                break
+        with llm_gateway.stage("Analyzer"), tracing.span("Analyzer", "agent", url=url_to_analyze):
+            async for event in runner.run_async(session_id=session_id, user_id='analyzer_user', new_message=content):
+                event_count += 1
+                if event.is_final_response():
+                    if event.content and event.content.parts:
+                        agent_final_text = event.content.parts[0].text
+                    elif event.actions and event.actions.escalate and event.error_message:
+                        agent_final_text = f"Agent escalated with error: {event.error_message}"
+                        print(f"Error: Agent escalated for {url_to_analyze}: {event.error_message}")
+                    else:
+                        print(f"Warning: Final response for {url_to_analyze} had no parsable content. Event: {event}")
+                    break
 
         if not agent_final_text:
             print(f"Error: Agent did not produce final text for {url_to_analyze} after {event_count} events.")
@@ -431,6 +356,7 @@ async def _run_agent_and_parse(runner: Runner, session_id: str, url_to_analyze:
         print(f"Error during agent processing for URL {url_to_analyze}: {e}")
         return None
 
+@traced("url")
 async def process_single_competitor_url(runner: Runner, session_id: str, url_info: dict):
     current_url = url_info["url"]
     print(f"\\nProcessing Competitor URL: {current_url}")
@@ -439,12 +365,13 @@ async def process_single_competitor_url(runner: Runner, session_id: str, url_inf
 
     if parsed_data:
         parsed_data[URL_COL_ANALYSIS_SHEET] = current_url
-        write_analysis_data_csv(parsed_data)
-        mark_url_as_analyzed_csv(url_info)
-        print(f"Successfully processed competitor URL and saved CSV data for {current_url}.")
+        write_analysis_data(parsed_data)
+        mark_url_as_analyzed(url_info)
+        print(f"Successfully processed competitor URL and saved analysis data for {current_url}.")
     else:
-        print(f"Skipping CSV update for competitor URL {current_url} due to processing/parsing failure.")
+        print(f"Skipping state update for competitor URL {current_url} due to processing/parsing failure.")
 
+@traced("url")
 async def process_single_posted_url(runner: Runner, session_id: str, url_info: dict):
     current_url = url_info["url"]
     print(f"\\nProcessing Posted URL: {current_url}")
@@ -452,19 +379,28 @@ async def process_single_posted_url(runner: Runner, session_id: str, url_info: d
     parsed_data = await _run_agent_and_parse(runner, session_id, current_url)
 
     if parsed_data:
-        update_posted_csv_data(current_url, parsed_data)
-        print(f"Successfully processed posted URL and updated CSV data for {current_url}.")
+        update_posted_data(current_url, parsed_data)
+        print(f"Successfully processed posted URL and updated its data for {current_url}.")
     else:
-        print(f"Skipping CSV update for posted URL {current_url} due to processing/parsing failure.")
+        print(f"Skipping state update for posted URL {current_url} due to processing/parsing failure.")
+
+def _missing_api_key() -> str | None:
+    if ANALYZER_MODE == "batch":
+        return None if LLM_BATCH_API_KEY else "LLM_BATCH_API_KEY (or OPENAI_API_KEY)"
+    return None if OPENROUTER_API_KEY else "OPENROUTER_API_KEY"
 
 async def main():
     print("Starting SEO Competitor Analysis Process (CSV Mode)...")
-    global COMPETITOR_URLS_CSV_PATH, ANALYSIS_OUTPUT_CSV_PATH, POSTED_CSV_PATH
+    if _missing_api_key():
+        print(f"Error: {_missing_api_key()} not found in environment variables. Please set it in a .env file.")
+        return
+    global COMPETITOR_URLS_CSV_PATH, ANALYSIS_OUTPUT_CSV_PATH, POSTED_CSV_PATH, STATE_DB_PATH, state_store
 
     script_dir = os.path.dirname(os.path.abspath(__file__))
     COMPETITOR_URLS_CSV_PATH = os.path.join(script_dir, f"{COMPETITOR_URLS_SHEET_NAME}.csv")
     ANALYSIS_OUTPUT_CSV_PATH = os.path.join(script_dir, f"{ANALYSIS_OUTPUT_SHEET_NAME}.csv")
     POSTED_CSV_PATH = os.path.join(script_dir, POSTED_CSV_FILENAME)
+    STATE_DB_PATH = os.path.join(script_dir, "seo_state.sqlite3")
 
     print(f"Script execution directory: {os.path.abspath(script_dir)}")
     print(f"Using Competitor URLs CSV: {os.path.abspath(COMPETITOR_URLS_CSV_PATH)}")
@@ -472,8 +408,13 @@ async def main():
     print(f"Using Posted URLs CSV: {os.path.abspath(POSTED_CSV_PATH)}")
 
     initialize_csv_files()
+    if state_store is None:  # The daemon keeps one store open across runs.
+        state_store = StateStore(STATE_DB_PATH, csv_dir=script_dir)
+    for table in STATE_TABLES:
+        state_store.sync_from_csv(table)
+    llm_gateway.configure("analyzer")
 
-    competitor_urls_to_process = get_urls_to_analyze_csv()
+    competitor_urls_to_process = get_urls_to_analyze()
     if not competitor_urls_to_process:
         print(f"No URLs found to process in '{COMPETITOR_URLS_CSV_PATH}'.")
     else:
@@ -489,31 +430,38 @@ async def main():
         print("No URLs to process from any source. Exiting.")
         return
 
-    session_service = InMemorySessionService()
-    artifact_service = InMemoryArtifactService()
-    session = session_service.create_session(user_id='analyzer_user', app_name='seo_analyzer_app')
-    print(f"Created ADK session: {session.id} for all URL processing.")
-
-    runner = Runner(
-        app_name='seo_analyzer_app',
-        agent=analyzer_agent,
-        session_service=session_service,
-        artifact_service=artifact_service
-    )
-
-    if competitor_urls_to_process:
-        print("\\n--- Processing Competitor URLs ---")
-        for url_info in competitor_urls_to_process:
-            await process_single_competitor_url(runner, session.id, url_info)
-            # await asyncio.sleep(1)
-
-    if posted_urls_to_process:
-        print("\\n--- Processing Posted URLs ---")
-        for url_info in posted_urls_to_process:
-            await process_single_posted_url(runner, session.id, url_info)
-            # await asyncio.sleep(1)
+    try:
+        if ANALYZER_MODE == "batch":
+            try:
+                await analyze_in_batch(competitor_urls_to_process, posted_urls_to_process)
+            except Exception as e:
+                print(f"Error during batch analysis: {e}")
+            print("\nCompetitor analysis process (batch mode) finished.")
+            return
 
-    print("\\nCompetitor analysis process (CSV Mode) finished for all specified files.")
+        runner = get_runner('seo_analyzer_app', build_analyzer_agent)
+        session = runner.session_service.create_session(user_id='analyzer_user', app_name='seo_analyzer_app')
+        print(f"Created ADK session: {session.id} for all URL processing.")
+
+        if competitor_urls_to_process:
+            print("\\n--- Processing Competitor URLs ---")
+            for url_info in competitor_urls_to_process:
+                await process_single_competitor_url(runner, session.id, url_info)
+                # await asyncio.sleep(1)
+
+        if posted_urls_to_process:
+            print("\\n--- Processing Posted URLs ---")
+            for url_info in posted_urls_to_process:
+                await process_single_posted_url(runner, session.id, url_info)
+                # await asyncio.sleep(1)
+        print("\\nCompetitor analysis process (CSV Mode) finished for all specified files.")
+    finally:
+        # The CSV files are refreshed once per run instead of being rewritten for every URL.
+        state_store.export_tables(STATE_TABLES)
+        llm_gateway.print_llm_stats()
 
 if __name__ == "__main__":
-    asyncio.run(main()) 
\ No newline at end of file
+    if _missing_api_key():
+        print(f"Error: {_missing_api_key()} not found in environment variables. Please set it in a .env file.")
+        exit(1)
+    tracing.run_script("analyzer", main)
\ No newline at end of file
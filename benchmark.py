@@ -0,0 +1,297 @@
+import os
+import csv
+import sys
+import glob
+import json
+import time
+import random
+import shutil
+import signal
+import argparse
+import tempfile
+import subprocess
+import urllib.request
+
+import metrics
+from llm_stub_server import add_stub_arguments, stub_argv, TOPIC_TERMS, QUALIFIERS
+
+# --- Offline Benchmark ---
+# Runs analyzer.py, keyword_planner.py and blog_post_generator.py against the local
+# OpenRouter stand-in (llm_stub_server.py) on generated data, for every combination of
+# data size and concurrency level. Reports throughput, p95 LLM call latency, peak RSS and
+# time spent in CSV I/O (from the runs' trace spans). Every run works in a fresh temporary
+# copy of the scripts, so the repository's CSVs, state store and caches are not touched.
+# Results are saved to .seo_cache/benchmarks/ and can be compared with an earlier run.
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BENCHMARK_DIR = os.getenv("BENCHMARK_DIR", os.path.join(SCRIPT_DIR, ".seo_cache", "benchmarks"))
+STAGES = {
+    "analyzer": "analyzer.py",
+    "planner": "keyword_planner.py",
+    "generator": "blog_post_generator.py",
+}
+# Settings that would make a run use the repository's state instead of its workspace.
+ISOLATED_ENV = ("ADK_STORE_DIR", "METRICS_DIR", "SEO_TRACE_DIR", "SEO_PROFILE")
+RUN_TIMEOUT_SECONDS = float(os.getenv("BENCHMARK_TIMEOUT_SECONDS", "1800"))
+
+
+def _csv_list(value: str, cast=str) -> list:
+    return [cast(item.strip()) for item in value.split(",") if item.strip()]
+
+
+# --- Stub server ---
+def start_stub(args) -> tuple[subprocess.Popen, str]:
+    """Starts llm_stub_server.py on a free port. Returns the process and its API base URL."""
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(SCRIPT_DIR, "llm_stub_server.py"), "--port", "0", *stub_argv(args)],
+        stdout=subprocess.PIPE, text=True,
+    )
+    line = process.stdout.readline().strip()
+    if " on " not in line:
+        process.kill()
+        raise RuntimeError(f"The stub server did not start: {line or 'no output'}")
+    return process, line.rsplit(" on ", 1)[1]
+
+
+def stub_request(base_url: str, path: str, method: str = "GET") -> dict:
+    request = urllib.request.Request(base_url + path, method=method, data=b"" if method == "POST" else None)
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.loads(response.read())
+
+
+# --- Workspace and data ---
+def _write_csv(path: str, headers: list[str], rows: list[list[str]]):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(headers)
+        writer.writerows(rows)
+
+
+def create_workspace(size: int, seed: int) -> str:
+    """A temporary copy of the scripts with `size` pending competitor URLs and clusters and `size` analysed posts."""
+    workspace = tempfile.mkdtemp(prefix="seo-bench-")
+    for path in glob.glob(os.path.join(SCRIPT_DIR, "*.py")):
+        shutil.copy2(path, workspace)
+    rng = random.Random(seed)
+
+    def keywords(n=3):
+        return ", ".join(f"{rng.choice(TOPIC_TERMS)} {rng.choice(QUALIFIERS)}" for _ in range(n))
+
+    def summary():
+        return "\n".join(f"- {rng.choice(TOPIC_TERMS).capitalize()} {rng.choice(QUALIFIERS)} explained for patients." for _ in range(4))
+
+    _write_csv(os.path.join(workspace, "Competitor URLs.csv"), ["URL", "Analysed"],
+               [[f"https://competitor.example.com/blog/{rng.choice(TOPIC_TERMS).replace(' ', '-')}-{i}/", "No"] for i in range(size)])
+    _write_csv(os.path.join(workspace, "Competitor Analysis.csv"), ["Topic", "Keywords", "Summary", "URL"],
+               [[f"Analysed post {i}", keywords(), summary(), f"https://competitor.example.com/blog/analysed-{i}/"] for i in range(size)])
+    _write_csv(os.path.join(workspace, "Posted.csv"), ["Topic", "Keywords", "Summary", "URL", "Analysed"],
+               [[f"Our post {i}", keywords(), summary(), f"https://clinic.example.com/blog/post-{i}/", "Yes"] for i in range(size)])
+    _write_csv(os.path.join(workspace, "Clusters.csv"), ["Cluster", "Intent", "Keywords", "Primary Keyword", "Completed"],
+               [[f"Cluster {i}", "Users researching treatment options.", keywords(5), f"benchmark keyword {i}", "No"] for i in range(size)])
+    return workspace
+
+
+def _count_rows(workspace: str, csv_name: str, column: str | None = None, value: str | None = None) -> int:
+    try:
+        with open(os.path.join(workspace, csv_name), newline="", encoding="utf-8") as f:
+            return sum(1 for row in csv.DictReader(f) if column is None or (row.get(column) or "").strip().lower() == value)
+    except FileNotFoundError:
+        return 0
+
+
+def items_done(stage: str, workspace: str, size: int) -> int:
+    """Work items the stage completed: URLs analysed, clusters planned or posts written."""
+    if stage == "analyzer":
+        return _count_rows(workspace, "Competitor URLs.csv", "Analysed", "yes")
+    if stage == "planner":
+        return _count_rows(workspace, "Clusters.csv") - size
+    return len(glob.glob(os.path.join(workspace, "generated_blog_posts", "*.html")))
+
+
+def csv_io_seconds(trace_dir: str) -> float:
+    """Time covered by 'csv' spans in the runs' traces (nested spans are counted once)."""
+    intervals = {}
+    for path in glob.glob(os.path.join(trace_dir, "*.trace.json")):
+        with open(path, encoding="utf-8") as f:
+            for event in json.load(f).get("traceEvents", []):
+                if event.get("ph") == "X" and event.get("cat") == "csv":
+                    intervals.setdefault((event["pid"], event["tid"]), []).append((event["ts"], event["ts"] + event["dur"]))
+    total_us = 0.0
+    for spans in intervals.values():
+        end = float("-inf")
+        for span_start, span_end in sorted(spans):
+            if span_end > end:
+                total_us += span_end - max(span_start, end)
+                end = span_end
+    return total_us / 1e6
+
+
+# --- Runs ---
+def _wait(process: subprocess.Popen, deadline: float) -> int:
+    """Waits for the process with os.wait4 to get its own peak RSS. Returns the peak RSS in KiB."""
+    while True:
+        pid, status, usage = os.wait4(process.pid, os.WNOHANG)
+        if pid:
+            process.returncode = os.waitstatus_to_exitcode(status)
+            # ru_maxrss is in KiB on Linux and in bytes on macOS.
+            return usage.ru_maxrss // 1024 if sys.platform == "darwin" else usage.ru_maxrss
+        if time.monotonic() > deadline:
+            process.send_signal(signal.SIGTERM)
+            deadline = time.monotonic() + 10
+        time.sleep(0.05)
+
+
+def run_scenario(stage: str, size: int, concurrency: int, workers: int, base_url: str, args) -> dict:
+    workspace = create_workspace(size, args.data_seed)
+    trace_dir = os.path.join(workspace, ".seo_cache", "traces")
+    env = {key: value for key, value in os.environ.items() if key not in ISOLATED_ENV}
+    env.update({
+        "OPENROUTER_API_KEY": "stub-key",
+        "OPENROUTER_API_BASE": base_url,
+        "LITELLM_LOCAL_MODEL_COST_MAP": "True",  # No network access for LiteLLM's price list.
+        "LLM_CACHE": "0",
+        "CONCURRENCY_INITIAL": str(concurrency),
+        "CONCURRENCY_MAX": str(concurrency),
+        "RATE_LIMIT_RPM": str(args.rate_limit_rpm),
+        "MAX_CLUSTERS_PER_RUN": str(size),
+        "SEO_TRACE": "1",
+        "SEO_TRACE_DIR": trace_dir,
+        "PYTHONUNBUFFERED": "1",
+    })
+    env.update(dict(item.split("=", 1) for item in args.env))
+    stub_request(base_url, "/stats/reset", "POST")
+
+    print(f"\n--- {stage}: size {size}, concurrency {concurrency}, {workers} worker(s) ({workspace}) ---")
+    started = time.monotonic()
+    deadline = started + args.timeout
+    processes = []
+    for worker in range(workers):
+        log = open(os.path.join(workspace, f"{stage}-{worker}.log"), "w", encoding="utf-8")
+        processes.append((subprocess.Popen([sys.executable, STAGES[stage]], cwd=workspace, env=env, stdout=log, stderr=subprocess.STDOUT), log))
+    peak_rss_kib = 0
+    exit_codes = []
+    for process, log in processes:
+        peak_rss_kib = max(peak_rss_kib, _wait(process, deadline))
+        exit_codes.append(process.returncode)
+        log.close()
+    wall_seconds = time.monotonic() - started
+
+    records = metrics.load_records(os.path.join(workspace, ".seo_cache", "metrics", metrics.CALLS_LOG_NAME))
+    calls = metrics.summarize(records, "script") if records else []
+    stub_stats = stub_request(base_url, "/stats")
+    items = items_done(stage, workspace, size)
+    result = {
+        "stage": stage, "size": size, "concurrency": concurrency, "workers": workers,
+        "items": items, "wall_seconds": round(wall_seconds, 2),
+        "items_per_minute": round(items * 60 / wall_seconds, 2) if wall_seconds else 0.0,
+        "llm_calls": len(records),
+        "llm_errors": sum(r["outcome"] != "ok" for r in records),
+        "llm_p95_seconds": max((row["p95_seconds"] for row in calls), default=None),
+        "peak_rss_mb": round(peak_rss_kib / 1024, 1),
+        "csv_io_seconds": round(csv_io_seconds(trace_dir), 3),
+        "stub_requests": stub_stats["requests"],
+        "stub_peak_in_flight": stub_stats["peak_in_flight"],
+        "stub_by_status": stub_stats["by_status"],
+        "exit_codes": exit_codes,
+    }
+    if any(exit_codes):
+        print(f"Warning: {stage} exited with {exit_codes}; logs kept in {workspace}.")
+    elif not args.keep:
+        shutil.rmtree(workspace, ignore_errors=True)
+    return result
+
+
+# --- Reporting ---
+def _key(result: dict) -> tuple:
+    return result["stage"], result["size"], result["concurrency"], result["workers"]
+
+
+def print_results(results: list[dict], baseline: list[dict] | None = None):
+    previous = {_key(r): r for r in baseline or []}
+    print(f"\n{'stage':<10} {'size':>5} {'conc':>4} {'wrk':>3} {'items':>5} {'wall s':>7} {'items/min':>9} {'calls':>5} "
+          f"{'err':>4} {'p95 s':>6} {'RSS MB':>7} {'CSV ms':>6} {'peak':>4}")
+    for r in results:
+        p95 = f"{r['llm_p95_seconds']:.2f}" if r["llm_p95_seconds"] is not None else "n/a"
+        print(f"{r['stage']:<10} {r['size']:>5} {r['concurrency']:>4} {r['workers']:>3} {r['items']:>5} {r['wall_seconds']:>7.1f} "
+              f"{r['items_per_minute']:>9.2f} {r['llm_calls']:>5} {r['llm_errors']:>4} {p95:>6} {r['peak_rss_mb']:>7.1f} "
+              f"{r['csv_io_seconds'] * 1000:>6.0f} {r['stub_peak_in_flight']:>4}")
+        before = previous.get(_key(r))
+        if before:
+            changes = []
+            for field, label in (("items_per_minute", "throughput"), ("llm_p95_seconds", "p95"), ("peak_rss_mb", "RSS"), ("csv_io_seconds", "CSV I/O")):
+                if before.get(field) and r.get(field) is not None:
+                    changes.append(f"{label} {(r[field] - before[field]) / before[field] * 100:+.1f}%")
+            print(f"{'':<10} vs baseline: {', '.join(changes) or 'no comparable fields'}")
+
+
+def save_results(results: list[dict], args) -> str:
+    os.makedirs(BENCHMARK_DIR, exist_ok=True)
+    path = os.path.join(BENCHMARK_DIR, f"benchmark-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    options = {k: v for k, v in vars(args).items() if k not in ("baseline",)}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"created": time.time(), "options": options, "results": results}, f, indent=2)
+    return path
+
+
+def load_baseline(selector: str) -> list[dict] | None:
+    if selector == "last":
+        saved = sorted(glob.glob(os.path.join(BENCHMARK_DIR, "benchmark-*.json")))
+        if not saved:
+            print("No earlier benchmark results to compare with.")
+            return None
+        selector = saved[-1]
+    with open(selector, encoding="utf-8") as f:
+        return json.load(f)["results"]
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Offline benchmark of the pipeline scripts against a local OpenRouter stand-in.")
+    parser.add_argument("--stages", default="analyzer,planner,generator", help=f"Comma-separated stages from {list(STAGES)}.")
+    parser.add_argument("--sizes", default="5,20", help="Comma-separated data sizes (pending URLs/clusters per run).")
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma-separated LLM concurrency limits per model.")
+    parser.add_argument("--workers", type=int, default=1, help="Generator processes sharing the cluster queue.")
+    parser.add_argument("--rate-limit-rpm", type=float, default=6000, help="RATE_LIMIT_RPM for the runs (the stub's own limit is --max-rpm).")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="Extra environment for the runs, e.g. WRITE_BLOG_MODE=sections.")
+    parser.add_argument("--timeout", type=float, default=RUN_TIMEOUT_SECONDS, help="Seconds before a run is stopped.")
+    parser.add_argument("--data-seed", type=int, default=1)
+    parser.add_argument("--baseline", default=None, help="Earlier results file to compare with, or 'last'.")
+    parser.add_argument("--keep", action="store_true", help="Keep the temporary workspaces.")
+    add_stub_arguments(parser)
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    stages = _csv_list(args.stages)
+    unknown = [stage for stage in stages if stage not in STAGES]
+    if unknown:
+        print(f"Unknown stages {unknown}; choose from {list(STAGES)}.")
+        return 2
+    bad_env = [item for item in args.env if "=" not in item]
+    if bad_env:
+        print(f"Invalid --env values {bad_env}; use KEY=VALUE.")
+        return 2
+    baseline = load_baseline(args.baseline) if args.baseline else None
+
+    stub, base_url = start_stub(args)
+    print(f"Stub server at {base_url}.")
+    results = []
+    try:
+        for stage in stages:
+            for size in _csv_list(args.sizes, int):
+                for concurrency in _csv_list(args.concurrency, int):
+                    workers = args.workers if stage == "generator" else 1
+                    results.append(run_scenario(stage, size, concurrency, workers, base_url, args))
+    except KeyboardInterrupt:
+        print("Benchmark interrupted; reporting the finished runs.")
+    finally:
+        stub.terminate()
+        stub.wait()
+
+    print_results(results, baseline)
+    if results:
+        print(f"\nResults saved to {save_results(results, args)}.")
+    return 1 if any(any(r["exit_codes"]) for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
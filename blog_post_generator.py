@@ -1,6 +1,6 @@
 import os
+import socket
 import asyncio
-import csv
 import re
 import json
 from dotenv import load_dotenv
@@ -9,26 +9,49 @@ import litellm
 from google.adk.agents import Agent
 from google.adk.models.lite_llm import LiteLlm
 from google.adk.runners import Runner
-from google.adk.sessions import InMemorySessionService
-from google.adk.artifacts.in_memory_artifact_service import InMemoryArtifactService
 from google.genai import types as genai_types
 
+import llm_gateway
+from llm_gateway import PipelineLiteLLMClient
+from adk_store import get_runner
+from resilience import describe_error
+from html_renderer import render_blog_post_html
+from blog_sections import split_plan_into_sections, build_plan_outline, stitch_sections, split_plan_into_research_queries, split_draft_into_sections
+import content_quality
+from citations import CitationResolver, extract_sources
+from internal_link_index import InternalLinkIndex, format_posted_entry, estimate_tokens
+from state_store import StateStore
+import tracing
+from tracing import traced
 
 # --- Configuration ---
 load_dotenv()
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 
-
-if not OPENROUTER_API_KEY:
-    print("CRITICAL: OPENROUTER_API_KEY not found. Please set it in a .env file. Exiting.")
-    exit(1) 
-
 # CSV File Paths
 BASE_FILE_PATH = "." 
 CLUSTERS_CSV_PATH = os.path.join(BASE_FILE_PATH, "Clusters.csv")
 POSTED_CSV_FILENAME = "Posted.csv"
 POSTED_CSV_PATH = os.path.join(BASE_FILE_PATH, POSTED_CSV_FILENAME)
 BLOG_OUTPUT_DIR = os.path.join(BASE_FILE_PATH, "generated_blog_posts")
+SEO_CACHE_DIR = os.path.join(BASE_FILE_PATH, ".seo_cache")
+INTERNAL_LINK_INDEX_PATH = os.path.join(SEO_CACHE_DIR, "internal_link_index.json")
+STATE_DB_PATH = os.path.join(BASE_FILE_PATH, "seo_state.sqlite3")
+
+state_store = None  # StateStore opened in main()
+
+# Work queue: each run claims clusters with a lease that is renewed while the cluster is being
+# processed, so several generator processes (or hosts sharing the state database) never pick
+# the same cluster. A crashed worker's lease expires and the cluster is reclaimed.
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+CLUSTER_LEASE_SECONDS = int(os.getenv("CLUSTER_LEASE_SECONDS", "900"))
+MAX_CLUSTERS_PER_RUN = int(os.getenv("MAX_CLUSTERS_PER_RUN", "1"))
+# Primary keyword of a cluster to write again whatever its status, without a lease (e.g. to
+# replay a recorded run from a cassette while debugging a later stage).
+REGENERATE_CLUSTER = os.getenv("REGENERATE_CLUSTER", "").strip()
+
+# Number of previously posted blogs offered to Agent 5 (selected by relevance to the draft).
+INTERNAL_LINK_TOP_K = int(os.getenv("INTERNAL_LINK_TOP_K", "8"))
 
 # CSV Headers
 CLUSTER_FIELD_CLUSTER = "Cluster"
@@ -45,6 +68,22 @@ WRITE_BLOG_MODEL_NAME = "anthropic/claude-3.7-sonnet"
 INTERNAL_LINK_MODEL_NAME = "google/gemini-2.5-flash-preview:thinking"
 HTML_CONVERSION_MODEL_NAME = "openai/gpt-4o"
 
+# Research: "single" sends the whole preliminary plan as one query, "parallel" splits it
+# into up to RESEARCH_MAX_SUBQUERIES sub-questions that are researched concurrently.
+RESEARCH_MODE = os.getenv("RESEARCH_MODE", "single").strip().lower()
+RESEARCH_MAX_SUBQUERIES = int(os.getenv("RESEARCH_MAX_SUBQUERIES", "4"))
+
+# Blog writing: "single" writes the whole post in one Agent 4 call, "sections" writes the
+# plan's sections concurrently and stitches them ("local" join or an "llm" smoothing pass).
+WRITE_BLOG_MODE = os.getenv("WRITE_BLOG_MODE", "single").strip().lower()
+WRITE_BLOG_STITCH_MODE = os.getenv("WRITE_BLOG_STITCH_MODE", "local").strip().lower()
+STITCH_MODEL_NAME = "google/gemini-2.5-flash-preview:thinking"
+TARGET_BLOG_WORD_COUNT = 2250
+
+# HTML conversion: "local" renders the Markdown deterministically (Agent 6 is only used as a fallback),
+# "llm" always uses Agent 6.
+HTML_RENDER_MODE = os.getenv("HTML_RENDER_MODE", "local").strip().lower()
+
 # --- Prompt Definitions ---
 # Agent 1: Preliminary Blog Post Plan
 PROMPT_AGENT_1_PRELIMINARY_PLAN = """
@@ -130,8 +169,12 @@ Create the detailed plan.
 Your output must only be the plan and nothing else.
 """
 
+# Prompts with a long fixed part are split in two: the INSTRUCTION_* text is the agent's
+# instruction, sent first as the system message, and the PROMPT_* text carries what changes
+# per call. The unchanged prefix can then be cached by the provider (see prompt_cache.py).
+
 # Agent 4: Write Blog Post
-PROMPT_AGENT_4_WRITE_BLOG = """\
+INSTRUCTION_AGENT_4_WRITE_BLOG = """\
 You are part of a team that creates world class blog posts.
 You are the team's best copywriter and are responsible for writing out the actual blog post.
 
@@ -146,7 +189,7 @@ The blog post you create must:
 - Be very detailed.
 - Include the keywords mentioned in each section within that section.
 - Use the research as advised by the plan. If the plan or research findings include citation markers like ` - source: URL`, **ensure these markers are preserved exactly as they appear** in the final blog post text. Do not alter or remove them. They will be converted to links later.
-- Place the primary keyword: '{primary_keyword}' in the blog title, H1 header, and early in the introduction.
+- Place the primary keyword given with the project in the blog title, H1 header, and early in the introduction.
 - Place one keyword for each section in the heading of that section, if specified in the plan.
 - When possible, pepper synonyms of the keywords throughout each section.
 - When possible, use Latent Semantic Indexing (LSI) keywords and related terms to enhance context.
@@ -154,7 +197,9 @@ The blog post you create must:
 - Be suitable for a year 5 reading level.
 
 Make sure to create the entire blog post draft in your first output. Don't stop or cut it short.
+"""
 
+PROMPT_AGENT_4_WRITE_BLOG = """\
 Here are the details of your next blog post project:
 
 Detailed Plan:
@@ -169,8 +214,84 @@ Primary Keyword:
 Write the blog post.
 """
 
+# Agent 4 (section mode): Write one section of the blog post
+INSTRUCTION_AGENT_4_WRITE_SECTION = """\
+You are part of a team that creates world class blog posts.
+You are the team's best copywriter. The blog post is being written section by section by several copywriters at the same time, and you are responsible for ONE section.
+
+Every section of the blog post must:
+- Follow the plan for the section bit by bit.
+- Use short paragraphs.
+- Use bullet points and subheadings with keywords where appropriate.
+- Not have any fluff. The content must be value dense and direct.
+- Be very detailed.
+- Include the keywords mentioned for the section within the section.
+- Use the research as advised by the plan. If the plan or research findings include citation markers like ` - source: URL`, **ensure these markers are preserved exactly as they appear** in the text. Do not alter or remove them. They will be converted to links later.
+- Place one keyword for the section in its heading, if specified in the plan.
+- When possible, pepper synonyms of the keywords throughout the section.
+- When possible, use Latent Semantic Indexing (LSI) keywords and related terms to enhance context.
+- Be suitable for a year 5 reading level.
+"""
+
+PROMPT_AGENT_4_WRITE_SECTION = """\
+Primary keyword of the blog post: '{primary_keyword}'
+
+Outline of the whole blog post (other sections are written by your colleagues, do not cover them):
+{plan_outline}
+
+Plan for the introduction (shared with every copywriter so the post reads as one piece):
+{intro_plan}
+
+{section_instructions}
+
+Plan for YOUR section ({section_number} of {section_count}: {section_title}):
+{section_plan}
+
+Research Findings:
+{research_findings}
+
+Write ONLY your section in Markdown, about {section_word_count} words. Do not write other sections, a table of contents or closing remarks for the whole post unless your section is the conclusion.
+"""
+
+SECTION_INSTRUCTIONS_INTRO = "Your section opens the blog post: start with the blog title as a Markdown H1 header (`# Title`) containing the primary keyword, then write the introduction and place the primary keyword early in it."
+SECTION_INSTRUCTIONS_BODY = "Start your section with a Markdown H2 header (`## Heading`). Do not write a blog title or an introduction for the whole post."
+SECTION_PLAN_UNMATCHED = "(No separate plan for this section: keep the content and heading of your previous version.)"
+
+# Quality gate: appended to the section prompt when a failing section is sent back to the writer
+PROMPT_QUALITY_REVISION = """
+Your previous version of this section did not pass the quality check:
+{problems}
+
+Previous version:
+{previous_section}
+
+Write the section again and fix these problems. Keep its facts and any ` - source: URL` markers.
+"""
+
+# Quality gate: appended to the Agent 4 prompt when most of the draft failed and the whole post is written again
+PROMPT_QUALITY_REVISION_FULL = """
+An earlier draft of this blog post did not pass the quality check. Avoid these problems:
+{problems}
+"""
+
+# Stitch pass (section mode): smooth transitions between separately written sections
+PROMPT_STITCH_SECTIONS = """\
+You are the editor of a team that creates world class blog posts.
+The blog post below was written section by section by different copywriters at the same time.
+Your job is to make it read as a single coherent post:
+- Smooth the transitions between sections and remove repeated introductions, repeated definitions or repeated sign-offs.
+- Keep exactly one H1 title at the top and keep all other headings.
+- Do NOT shorten the post, remove information, or change keywords.
+- Preserve every citation marker like ` - source: URL` and every URL exactly as it appears.
+
+Output ONLY the full revised blog post in Markdown.
+
+Blog post:
+{stitched_blog_post}
+"""
+
 # Agent 5: Add Internal Links
-PROMPT_AGENT_5_INTERNAL_LINKS = """
+INSTRUCTION_AGENT_5_INTERNAL_LINKS = """\
 You are part of a team that creates world class blog posts.
 You are in charge of internal linking between blog posts.
 
@@ -189,7 +310,9 @@ Your job is to:
 5. Ensure you DO NOT remove any existing content or URLs (like external research source URLs already in the draft). You ONLY ADD new internal linking URLs.
 
 Your output MUST be the complete DRAFT blog post with the newly added internal linking URLs. Do not output any other commentary, explanations, or lists of links separately.
+"""
 
+PROMPT_AGENT_5_INTERNAL_LINKS = """\
 Current DRAFT Blog Post:
 {current_blog_post_content}
 
@@ -245,51 +368,36 @@ Generate the HTML code.
 
 # --- Helper Functions ---
 
-def fix_links(raw_json_response: dict) -> str:
+@traced("parse")
+def fix_links(raw_json_response: dict, resolver: CitationResolver | None = None) -> str:
+    """
+    Replaces the [n] citation markers of a research response with ` - source: URL`
+    markers in a single pass. Sources are read from 'citations' or 'message.annotations'
+    and registered on `resolver` (deduplicated) so later stages can reuse the list.
+    """
     if not isinstance(raw_json_response, dict):
         print("Error in fix_links: raw_json_response is not a dictionary.")
-        return raw_json_response.get('choices', [{}])[0].get('message', {}).get('content', "Raw response was not a dictionary.")
+        return "Raw response was not a dictionary."
 
+    resolver = resolver if resolver is not None else CitationResolver()
     try:
         text_to_process = raw_json_response['choices'][0]['message']['content']
-        citations = raw_json_response.get('citations')
-
-        if not isinstance(citations, list) or not citations:
-            print("Warning in fix_links: Top-level 'citations' field is missing, not a list, or empty. Checking message.annotations...")
-            annotations = raw_json_response.get('choices', [{}])[0].get('message', {}).get('annotations')
-            if isinstance(annotations, list):
-                extracted_urls = []
-                for ann in annotations:
-                    if isinstance(ann, dict) and ann.get('type') == 'url_citation':
-                        url_data = ann.get('url_citation')
-                        if isinstance(url_data, dict) and 'url' in url_data:
-                            extracted_urls.append(url_data['url'])
-                if extracted_urls:
-                    print(f"Found {len(extracted_urls)} URLs in 'message.annotations'. Using these.")
-                    citations = extracted_urls
-                else:
-                    print("Still no citation URLs found in 'message.annotations'. No links will be fixed.")
-                    return text_to_process
-            else:
-                 print("No citation URLs found in 'message.annotations' either. No links will be fixed.")
-                 return text_to_process
-
-        modified_text = text_to_process
-        for i, url in enumerate(citations):
-            placeholder = f"[{i+1}]"
-            replacement = f" - source: {url}"
-            modified_text = re.sub(re.escape(placeholder), replacement, modified_text)
-
-        return modified_text
+        sources = extract_sources(raw_json_response)
+        if not sources:
+            print("Warning in fix_links: No citation URLs found in 'citations' or 'message.annotations'. No links will be fixed.")
+            return text_to_process
+        return resolver.resolve(text_to_process, sources)
     except (KeyError, IndexError, TypeError) as e:
         print(f"Error parsing raw_json_response in fix_links: {e}. Details: {raw_json_response}")
         return raw_json_response.get('choices', [{}])[0].get('message', {}).get('content', "Error during link fixing, original content unavailable.")
 
-async def fetch_and_process_research_directly(query: str, client_name_for_log: str = "OnlineResearchPerplexity") -> dict:
+@traced("research")
+async def fetch_and_process_research_directly(query: str, client_name_for_log: str = "OnlineResearchPerplexity", resolver: CitationResolver | None = None) -> dict:
     """
     Performs online research using a direct LiteLLM call to a Perplexity model,
     processes citations, and returns the text content and any error.
-    Returns: {"text_content": str, "error": Optional[str]}
+    Pass a shared `resolver` to merge the sources of several research calls.
+    Returns: {"text_content": str, "sources": list[dict], "error": Optional[str]}
     """
     print(f"\n--- Direct LiteLLM Call for Research ({client_name_for_log}) ---")
     print(f"Research Query: '{query[:200]}...'")
@@ -311,112 +419,169 @@ Your output should be the synthesized summary of your research findings.
     ]
 
     try:
-        response_obj = await litellm.acompletion(
-            model="openrouter/" + RESEARCH_AGENT_MODEL_NAME,
-            messages=messages,
-            api_key=OPENROUTER_API_KEY,
-        )
+        with llm_gateway.stage(client_name_for_log):
+            response_obj = await llm_gateway.acompletion(
+                model="openrouter/" + RESEARCH_AGENT_MODEL_NAME,
+                messages=messages,
+                api_key=OPENROUTER_API_KEY,
+            )
 
         if not response_obj:
             error_msg = f"{client_name_for_log}: LiteLLM acompletion returned None."
             print(f"Error: {error_msg}")
-            return {"text_content": "Research failed: No response from LLM.", "error": error_msg}
+            return {"text_content": "Research failed: No response from LLM.", "sources": [], "error": error_msg}
 
         raw_response_dict = response_obj.model_dump()
-        
-        fixed_content = fix_links(raw_response_dict)
+        resolver = resolver if resolver is not None else CitationResolver()
+
+        fixed_content = fix_links(raw_response_dict, resolver)
         
         if "Error during link fixing" in fixed_content or "Raw response was not a dictionary" in fixed_content :
              original_content_from_raw = raw_response_dict.get('choices', [{}])[0].get('message', {}).get('content', "No text content in raw response.")
              print(f"Warning ({client_name_for_log}): fix_links reported an issue or made no changes. Using text directly from raw response if available.")
-             return {"text_content": original_content_from_raw, "error": fixed_content if "Error" in fixed_content else None}
+             return {"text_content": original_content_from_raw, "sources": resolver.sources, "error": fixed_content if "Error" in fixed_content else None}
 
-        print(f"{client_name_for_log}: Research successful and links processed.")
-        return {"text_content": fixed_content, "error": None}
+        print(f"{client_name_for_log}: Research successful and links processed ({len(resolver.sources)} sources).")
+        return {"text_content": fixed_content, "sources": resolver.sources, "error": None}
 
     except litellm.exceptions.APIConnectionError as e:
         error_msg = f"{client_name_for_log}: LiteLLM APIConnectionError: {e}"
         print(f"Error: {error_msg}")
         if hasattr(e, 'response') and hasattr(e.response, 'text'): 
             print(f"Error details: {e.response.text}")
-        return {"text_content": "Research failed due to API connection error.", "error": error_msg}
+        return {"text_content": "Research failed due to API connection error.", "sources": [], "error": error_msg}
     except Exception as e:
-        error_msg = f"{client_name_for_log}: An unexpected error occurred during research: {e}"
+        error_msg = f"{client_name_for_log}: An unexpected error occurred during research ({describe_error(e)}): {e}"
         print(f"Error: {error_msg}")
-        return {"text_content": "Research failed due to an unexpected error.", "error": error_msg}
+        return {"text_content": "Research failed due to an unexpected error.", "sources": [], "error": error_msg}
 
+@traced("research")
+async def research_in_parallel(preliminary_plan: str, primary_keyword: str) -> dict:
+    """
+    Step 2 (parallel mode): splits the preliminary plan into independent sub-questions,
+    researches them concurrently and merges the answers. All sub-queries share one
+    CitationResolver, so repeated URLs are deduplicated into one numbered source list.
+    Returns: {"text_content": str, "sources": list[dict], "error": Optional[str]}
+    """
+    sub_queries = split_plan_into_research_queries(preliminary_plan, RESEARCH_MAX_SUBQUERIES)
+    if len(sub_queries) < 2:
+        print("Preliminary plan could not be split into sub-questions. Using a single research query.")
+        return await fetch_and_process_research_directly(' '.join(preliminary_plan.splitlines()).replace('"', ' '))
+
+    print(f"Researching {len(sub_queries)} sub-questions concurrently.")
+    research_queries = [
+        f"Topic: {primary_keyword}. Research the following points of a blog post about this topic: " + ' '.join(q.splitlines()).replace('"', ' ')
+        for q in sub_queries
+    ]
+    resolver = CitationResolver()
+    sub_results = await asyncio.gather(*(
+        fetch_and_process_research_directly(q, f"OnlineResearchPerplexity[{i + 1}]", resolver=resolver)
+        for i, q in enumerate(research_queries)
+    ))
+
+    merged_parts = []
+    errors = []
+    for i, result in enumerate(sub_results):
+        if result["error"]:
+            errors.append(result["error"])
+            continue
+        merged_parts.append(f"### Research findings {i + 1}\n{result['text_content'].strip()}")
+
+    if not merged_parts:
+        error_msg = f"All {len(sub_queries)} research sub-queries failed: {errors[0] if errors else 'unknown error'}"
+        return {"text_content": "Research failed for every sub-question.", "sources": [], "error": error_msg}
+    if errors:
+        print(f"Warning: {len(errors)} of {len(sub_queries)} research sub-queries failed and were skipped: {errors}")
+
+    print(f"Merged research from {len(merged_parts)} sub-queries with {len(resolver.sources)} unique sources.")
+    return {"text_content": "\n\n".join(merged_parts), "sources": resolver.sources, "error": None}
+
+@traced("csv")
 def get_next_cluster_to_process() -> dict | None:
+    """
+    Claims the first cluster whose 'Completed' value is 'No' or empty and that no other
+    worker holds a live lease on. The lease lasts CLUSTER_LEASE_SECONDS and is kept alive
+    by keep_cluster_lease() while the cluster is processed.
+    With REGENERATE_CLUSTER set, returns that cluster instead.
+    """
+    if REGENERATE_CLUSTER:
+        rows = state_store.rows("clusters", key=REGENERATE_CLUSTER)
+        if not rows:
+            print(f"Cluster with Primary Keyword '{REGENERATE_CLUSTER}' (REGENERATE_CLUSTER) not found in {CLUSTERS_CSV_PATH}.")
+            return None
+        print(f"Regenerating cluster '{REGENERATE_CLUSTER}' regardless of its status (REGENERATE_CLUSTER).")
+        return rows[0]
     try:
-        with open(CLUSTERS_CSV_PATH, 'r', newline='', encoding='utf-8') as csvfile:
-            reader = csv.DictReader(csvfile)
-            if CLUSTER_FIELD_COMPLETED not in reader.fieldnames:
-                print(f"Error: '{CLUSTER_FIELD_COMPLETED}' column not found in {CLUSTERS_CSV_PATH}.")
-                return None
-            
-            for row in reader:
-                completed_status = row.get(CLUSTER_FIELD_COMPLETED, "").strip().lower()
-                if completed_status == 'no' or not completed_status:
-                    required_keys = [CLUSTER_FIELD_KEYWORDS, CLUSTER_FIELD_INTENT, CLUSTER_FIELD_PRIMARY_KEYWORD]
-                    if not all(key in row for key in required_keys):
-                        print(f"Warning: Skipping row due to missing one of {required_keys}. Row: {row}")
-                        continue
-                    print(f"Found cluster to process: {row.get(CLUSTER_FIELD_CLUSTER, 'N/A')}")
-                    return row
-        print(f"No clusters found with 'Completed' as 'No' or empty in {CLUSTERS_CSV_PATH}.")
-        return None
-    except FileNotFoundError:
-        print(f"Error: {CLUSTERS_CSV_PATH} not found.")
-        return None
+        row = state_store.claim_next("clusters", WORKER_ID, CLUSTER_LEASE_SECONDS)
+        if row is None:
+            print(f"No unclaimed clusters found with 'Completed' as 'No' or empty in {CLUSTERS_CSV_PATH}.")
+            return None
+        print(f"Claimed cluster to process: {row.get(CLUSTER_FIELD_CLUSTER, 'N/A')} (worker {WORKER_ID}, claim #{row['lease_claims']}).")
+        return row
     except Exception as e:
-        print(f"Error reading {CLUSTERS_CSV_PATH}: {e}")
+        print(f"Error claiming a cluster from the state store: {e}")
         return None
 
+async def keep_cluster_lease(cluster_primary_keyword: str):
+    """Heartbeat task: renews the cluster's lease until cancelled."""
+    while True:
+        await asyncio.sleep(CLUSTER_LEASE_SECONDS / 3)
+        try:
+            if not await asyncio.to_thread(state_store.renew_lease, "clusters", cluster_primary_keyword, WORKER_ID, CLUSTER_LEASE_SECONDS):
+                print(f"Warning: Lease on cluster '{cluster_primary_keyword}' was lost; another worker may reclaim it.")
+                return
+        except Exception as e:
+            print(f"Warning: Could not renew lease on cluster '{cluster_primary_keyword}': {e}")
+
+def release_cluster(cluster_primary_keyword: str):
+    """
+    Releases the lease once the cluster is no longer pending. A cluster that failed before
+    being marked keeps its lease until it expires, so it is retried later instead of
+    immediately by the same worker.
+    """
+    try:
+        still_pending = any(
+            row[CLUSTER_FIELD_COMPLETED].strip().lower() in ("no", "")
+            for row in state_store.rows("clusters", key=cluster_primary_keyword)
+        )
+        if still_pending:
+            print(f"Cluster '{cluster_primary_keyword}' is still pending; its lease will expire in up to {CLUSTER_LEASE_SECONDS}s.")
+        else:
+            state_store.release_lease("clusters", cluster_primary_keyword, WORKER_ID)
+    except Exception as e:
+        print(f"Warning: Could not release lease on cluster '{cluster_primary_keyword}': {e}")
+
+@traced("csv")
 def update_cluster_status(cluster_primary_keyword: str, new_status: str = "Yes") -> bool:
     """
-    Updates the 'Completed' status of a specific cluster in Clusters.csv.
-    Identifies the cluster row by its 'Primary Keyword'.
+    Updates the 'Completed' status of a specific cluster (identified by its 'Primary Keyword')
+    in the state store and refreshes Clusters.csv.
     """
     print(f"Attempting to update status for cluster with Primary Keyword '{cluster_primary_keyword}' to '{new_status}'.")
-    if not os.path.exists(CLUSTERS_CSV_PATH):
-        print(f"Error: Clusters.csv not found at {CLUSTERS_CSV_PATH} for updating status.")
-        return False
-
-    rows = []
-    updated = False
-    fieldnames = []
-
     try:
-        with open(CLUSTERS_CSV_PATH, 'r', newline='', encoding='utf-8') as csvfile:
-            reader = csv.DictReader(csvfile)
-            fieldnames = reader.fieldnames
-            if not fieldnames or CLUSTER_FIELD_COMPLETED not in fieldnames or CLUSTER_FIELD_PRIMARY_KEYWORD not in fieldnames:
-                print(f"Error: CSV missing required headers ('{CLUSTER_FIELD_COMPLETED}', '{CLUSTER_FIELD_PRIMARY_KEYWORD}'). Found: {fieldnames}")
-                return False
-            
-            for row in reader:
-                if row.get(CLUSTER_FIELD_PRIMARY_KEYWORD) == cluster_primary_keyword:
-                    row[CLUSTER_FIELD_COMPLETED] = new_status
-                    updated = True
-                    print(f"Marked cluster '{row.get(CLUSTER_FIELD_CLUSTER, cluster_primary_keyword)}' as '{new_status}'.")
-                rows.append(row)
-        
-        if not updated:
+        if not state_store.update("clusters", cluster_primary_keyword, {CLUSTER_FIELD_COMPLETED: new_status}):
             print(f"Warning: Cluster with Primary Keyword '{cluster_primary_keyword}' not found in {CLUSTERS_CSV_PATH}. No status updated.")
-            return False # Or True if not finding it isn't an error for the caller
-
-        # Write the modified data back to the CSV
-        with open(CLUSTERS_CSV_PATH, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(rows)
-        
-        print(f"Successfully updated {CLUSTERS_CSV_PATH}.")
+            return False
+        print(f"Marked cluster '{cluster_primary_keyword}' as '{new_status}'.")
+        state_store.export_tables(["clusters"])
         return True
-
     except Exception as e:
-        print(f"Error updating {CLUSTERS_CSV_PATH}: {e}")
+        print(f"Error updating cluster status in {CLUSTERS_CSV_PATH}: {e}")
         return False
 
+def get_agent_runner(app_name: str, agent_name: str, model_name: str, instruction: str = "") -> Runner:
+    """The Runner of one of the pipeline's agents, built on first use and reused by later runs in the process."""
+    return get_runner(app_name, lambda: Agent(
+        name=agent_name,
+        model=LiteLlm(
+            model="openrouter/" + model_name,
+            api_key=OPENROUTER_API_KEY,
+            llm_client=PipelineLiteLLMClient(),
+        ),
+        instruction=instruction,
+        tools=[],
+    ))
+
 async def run_adk_agent_prompt(runner: Runner, session_id: str, user_id: str, prompt_text: str, agent_name_for_log: str) -> dict:
     content = genai_types.Content(role='user', parts=[genai_types.Part(text=prompt_text)])
     agent_final_text = f"Agent {agent_name_for_log} did not produce a final response."
@@ -425,76 +590,270 @@ async def run_adk_agent_prompt(runner: Runner, session_id: str, user_id: str, pr
 
     print(f"\nRunning ADK Agent prompt for '{agent_name_for_log}'...")
     try:
-        async for event in runner.run_async(session_id=session_id, user_id=user_id, new_message=content):
-            if event.is_final_response():
-                if event.content and event.content.parts and hasattr(event.content.parts[0], 'text'):
-                    agent_final_text = event.content.parts[0].text
-                elif event.actions and event.actions.escalate and event.error_message:
-                    escalation_error_msg = event.error_message 
-                    agent_final_text = f"Agent '{agent_name_for_log}' escalated with error: {escalation_error_msg}"
-                    error_message_str = agent_final_text
-                    print(f"Error: {agent_final_text}")
-                else:
-                    agent_final_text = f"Agent {agent_name_for_log} produced a final response event with no parsable content or error message."
-                    print(f"Warning: {agent_final_text} Event: {event}")
-                break 
+        with llm_gateway.stage(agent_name_for_log), tracing.span(agent_name_for_log, "agent"):
+            async for event in runner.run_async(session_id=session_id, user_id=user_id, new_message=content):
+                if event.is_final_response():
+                    if event.content and event.content.parts and hasattr(event.content.parts[0], 'text'):
+                        agent_final_text = event.content.parts[0].text
+                    elif event.actions and event.actions.escalate and event.error_message:
+                        escalation_error_msg = event.error_message 
+                        agent_final_text = f"Agent '{agent_name_for_log}' escalated with error: {escalation_error_msg}"
+                        error_message_str = agent_final_text
+                        print(f"Error: {agent_final_text}")
+                    else:
+                        agent_final_text = f"Agent {agent_name_for_log} produced a final response event with no parsable content or error message."
+                        print(f"Warning: {agent_final_text} Event: {event}")
+                    break 
         
         if agent_final_text == f"Agent {agent_name_for_log} did not produce a final response." and not error_message_str:
              final_error_msg = f"Agent '{agent_name_for_log}' did not produce final text after iterating events."
              print(f"Error: {final_error_msg}")
              error_message_str = final_error_msg
     except Exception as e:
-        exception_error_msg = f"Error during ADK call for {agent_name_for_log}: {e}"
+        exception_error_msg = f"Error during ADK call for {agent_name_for_log} ({describe_error(e)}): {e}"
         print(f"Error: {exception_error_msg}")
         agent_final_text = exception_error_msg
         error_message_str = exception_error_msg
         
     return {"text_content": agent_final_text, "raw_json_response": raw_json_resp, "error": error_message_str}
 
-def get_internal_linking_data() -> str:
+@traced("prompt")
+def get_internal_linking_data(blog_post_content: str, top_k: int = INTERNAL_LINK_TOP_K) -> str:
     """
-    Reads Posted.csv (expecting Topic, Keywords, Summary, URL, Analysed cols)
-    and returns a string formatted for the internal linking agent's prompt,
-    including only posts marked 'Yes' as Analysed.
+    Selects the top_k posts from Posted.csv (only posts marked 'Yes' as Analysed)
+    most relevant to the current draft, using the persisted BM25 index, and returns
+    a string formatted for the internal linking agent's prompt.
     """
-    internal_links_text_parts = []
     if not os.path.exists(POSTED_CSV_PATH):
         print(f"Warning: {POSTED_CSV_PATH} not found. No internal links will be provided to the agent.")
         return "No internal linking data available (file not found)."
 
     try:
-        with open(POSTED_CSV_PATH, 'r', newline='', encoding='utf-8') as csvfile:
-            reader = csv.DictReader(csvfile)
-            required_posted_headers = ["Topic", "Keywords", "Summary", "URL", "Analysed"]
-            if not reader.fieldnames or not all(h in reader.fieldnames for h in required_posted_headers):
-                print(f"Warning: {POSTED_CSV_PATH} is missing one or more required headers for internal linking. Expected: {required_posted_headers}. Found: {reader.fieldnames}. No internal links will be used.")
-                return "No internal linking data available (CSV header mismatch)."
-
-            for row in reader:
-                analysed_status = row.get("Analysed", "").strip().lower()
-                url = row.get("URL", "").strip()
-                if analysed_status == 'yes' and url:
-                    topic = row.get("Topic", "N/A")
-                    keywords = row.get("Keywords", "N/A")
-                    summary = row.get("Summary", "N/A").replace('\n', ' ') # Consolidate summary for prompt
-                    internal_links_text_parts.append(
-                        f"- URL: {url}\n  Topic: {topic}\n  Keywords: {keywords}\n  Summary: {summary}\n"
-                    )
-        
-        if not internal_links_text_parts:
-            return "No suitable internal links found in Posted.csv (no posts marked 'Yes' or file is empty)."
-        
-        return "\n".join(internal_links_text_parts)
-        
+        link_index = InternalLinkIndex(POSTED_CSV_PATH, INTERNAL_LINK_INDEX_PATH).load_or_build()
+    except ValueError as e:
+        print(f"Warning: {e}. No internal links will be used.")
+        return "No internal linking data available (CSV header mismatch)."
     except Exception as e:
         print(f"Error reading or processing {POSTED_CSV_PATH} for internal linking: {e}")
         return f"Error accessing internal linking data: {e}"
 
+    if not link_index.documents:
+        return "No suitable internal links found in Posted.csv (no posts marked 'Yes' or file is empty)."
+
+    results = link_index.search(blog_post_content, top_k)
+    if not results:
+        return "No suitable internal links found in Posted.csv (no posts related to this draft)."
+
+    internal_links_text = "\n".join(format_posted_entry(doc) for _, doc in results)
+    print(f"Selected {len(results)} of {len(link_index.documents)} posted blogs for internal linking "
+          f"(~{estimate_tokens(internal_links_text)} tokens, index {'loaded from disk' if link_index.loaded_from_disk else 'rebuilt'}).")
+    return internal_links_text
+
+class SectionWriter:
+    """
+    Agent 4 (section mode) for one post: writes one section of the plan with the shared
+    context (outline, intro plan, tone rules). Used for the first draft of each section and
+    for the rewrites asked by the quality gate.
+    """
+
+    def __init__(self, plan_sections: list[dict], research_findings: str, primary_keyword: str):
+        self.user_id = "blog_writer_user_agent4"
+        self.app_name = 'blog_post_generator_app_agent4_sections'
+        self.runner = get_agent_runner(self.app_name, "blog_section_writer_agent", WRITE_BLOG_MODEL_NAME, INSTRUCTION_AGENT_4_WRITE_SECTION)
+        self.plan_outline = build_plan_outline(plan_sections)
+        self.intro_plan = plan_sections[0]["body"]
+        self.research_findings = research_findings
+        self.primary_keyword = primary_keyword
+        self.section_word_count = max(200, TARGET_BLOG_WORD_COUNT // len(plan_sections))
+
+    async def write(self, index: int, section_count: int, section_title: str, section_plan: str, revision: str = "", attempt: int = 0) -> dict:
+        suffix = f"_rewrite{attempt}" if attempt else ""
+        session_id = f"blog_post_gen_session_agent4_section{index + 1}{suffix}_{self.primary_keyword.replace(' ','_')}"
+        self.runner.session_service.create_session(session_id=session_id, user_id=self.user_id, app_name=self.app_name)
+        prompt = PROMPT_AGENT_4_WRITE_SECTION.format(
+            primary_keyword=self.primary_keyword,
+            plan_outline=self.plan_outline,
+            intro_plan=self.intro_plan,
+            section_instructions=SECTION_INSTRUCTIONS_INTRO if index == 0 else SECTION_INSTRUCTIONS_BODY,
+            section_number=index + 1,
+            section_count=section_count,
+            section_title=section_title,
+            section_plan=section_plan,
+            research_findings=self.research_findings,
+            section_word_count=self.section_word_count,
+        ) + revision
+        return await run_adk_agent_prompt(self.runner, session_id, self.user_id, prompt, f"BlogWriter[section {index + 1}]")
+
+
+def _format_problems(problems: list[str]) -> str:
+    return "\n".join(f"- {problem}" for problem in problems)
+
+
+async def rewrite_failing_sections(section_texts: list[str], matched_plans: list[dict | None], writer: SectionWriter, keywords: str,
+                                   reports: list[dict] | None = None) -> list[str]:
+    """
+    Quality gate: checks the written sections locally and sends only the failing ones back to
+    the section writer with the problems found, for up to QUALITY_MAX_REWRITES rounds.
+    `matched_plans` holds the plan section of each written section (None if there is none).
+    A rewrite is kept only if it has no more problems than the text it replaces.
+    """
+    section_texts = list(section_texts)
+    plan_texts = [plan["body"] if plan else None for plan in matched_plans]
+    if reports is None:
+        reports = content_quality.check_sections(section_texts, plan_texts, keywords, writer.primary_keyword)
+        print(f"Quality gate: {content_quality.summarize(reports)}.\n{content_quality.format_report(reports)}")
+
+    for attempt in range(1, content_quality.QUALITY_MAX_REWRITES + 1):
+        failing = [index for index, report in enumerate(reports) if report["problems"]]
+        if not failing:
+            break
+        print(f"Quality gate: rewriting sections {[index + 1 for index in failing]} (round {attempt}).")
+
+        async def _rewrite(index: int) -> dict:
+            plan = matched_plans[index]
+            revision = PROMPT_QUALITY_REVISION.format(problems=_format_problems(reports[index]["problems"]), previous_section=section_texts[index])
+            return await writer.write(index, len(section_texts), plan["title"] if plan else reports[index]["title"],
+                                      plan["body"] if plan else SECTION_PLAN_UNMATCHED, revision=revision, attempt=attempt)
+
+        results = await asyncio.gather(*(_rewrite(index) for index in failing))
+        candidate_texts = list(section_texts)
+        for index, result in zip(failing, results):
+            if result["error"]:
+                print(f"Rewrite of section {index + 1} failed: {result['error']}. Keeping the previous version.")
+            else:
+                candidate_texts[index] = result["text_content"]
+        candidate_reports = content_quality.check_sections(candidate_texts, plan_texts, keywords, writer.primary_keyword)
+        for index in failing:
+            if len(candidate_reports[index]["problems"]) <= len(reports[index]["problems"]):
+                section_texts[index], reports[index] = candidate_texts[index], candidate_reports[index]
+        print(f"Quality gate after round {attempt}: {content_quality.summarize(reports)}.\n{content_quality.format_report(reports)}")
+    return section_texts
+
+
+@traced("agent")
+async def write_blog_in_sections(detailed_plan: str, research_findings: str, primary_keyword: str, keywords: str = "") -> dict | None:
+    """
+    Agent 4 (section mode): splits the detailed plan into sections, writes them concurrently
+    with shared context (outline, intro plan, tone rules, keyword assignments), passes them
+    through the quality gate and stitches the results. Returns the same structure as
+    run_adk_agent_prompt, or None when the plan cannot be split so the caller can fall back
+    to single-pass writing.
+    """
+    sections = split_plan_into_sections(detailed_plan)
+    if len(sections) < 2:
+        print("Detailed plan could not be split into sections. Falling back to single-pass writing.")
+        return None
+
+    print(f"Writing {len(sections)} sections concurrently: {[s['title'] for s in sections]}")
+    writer = SectionWriter(sections, research_findings, primary_keyword)
+    section_results = await asyncio.gather(*(
+        writer.write(index, len(sections), section["title"], section["body"]) for index, section in enumerate(sections)
+    ))
+    failed = [r["error"] for r in section_results if r["error"]]
+    if failed:
+        error_msg = f"{len(failed)} of {len(sections)} sections failed: {failed[0]}"
+        return {"text_content": error_msg, "raw_json_response": None, "error": error_msg}
+
+    section_texts = [r["text_content"] for r in section_results]
+    if content_quality.QUALITY_GATE_ENABLED:
+        section_texts = await rewrite_failing_sections(section_texts, sections, writer, keywords)
+    stitched_post = stitch_sections(section_texts)
+    if WRITE_BLOG_STITCH_MODE != "llm":
+        return {"text_content": stitched_post, "raw_json_response": None, "error": None}
+
+    stitch_runner = get_agent_runner('blog_post_generator_app_stitch', "blog_stitch_agent", STITCH_MODEL_NAME)
+    stitch_session_id = f"blog_post_gen_session_stitch_{primary_keyword.replace(' ','_')}"
+    stitch_runner.session_service.create_session(session_id=stitch_session_id, user_id=writer.user_id, app_name='blog_post_generator_app_stitch')
+    stitch_output_struct = await run_adk_agent_prompt(
+        stitch_runner, stitch_session_id, writer.user_id, PROMPT_STITCH_SECTIONS.format(stitched_blog_post=stitched_post), "SectionStitcher"
+    )
+    if stitch_output_struct["error"]:
+        print(f"LLM stitch pass failed: {stitch_output_struct['error']}. Using locally stitched post.")
+        return {"text_content": stitched_post, "raw_json_response": None, "error": None}
+    return stitch_output_struct
+
+async def write_blog_single_pass(detailed_plan: str, research_findings: str, primary_keyword: str, revision: str = "", attempt: int = 0) -> dict:
+    """Agent 4: writes the whole blog post in one call."""
+    runner_agent4 = get_agent_runner('blog_post_generator_app_agent4', "blog_writer_agent", WRITE_BLOG_MODEL_NAME, INSTRUCTION_AGENT_4_WRITE_BLOG)
+    suffix = f"_rewrite{attempt}" if attempt else ""
+    session_agent4_id = f"blog_post_gen_session_agent4{suffix}_{(primary_keyword or 'default_pk').replace(' ','_')}"
+    user_id_agent4 = "blog_writer_user_agent4"
+    runner_agent4.session_service.create_session(session_id=session_agent4_id, user_id=user_id_agent4, app_name='blog_post_generator_app_agent4')
+    prompt_for_agent4 = PROMPT_AGENT_4_WRITE_BLOG.format(
+        detailed_plan=detailed_plan,
+        research_findings=research_findings,
+        primary_keyword=primary_keyword
+    ) + revision
+    return await run_adk_agent_prompt(
+        runner_agent4, session_agent4_id, user_id_agent4, prompt_for_agent4, "BlogWriter"
+    )
+
+@traced("agent")
+async def apply_quality_gate(blog_post: str, detailed_plan: str, research_findings: str, primary_keyword: str, keywords: str) -> str:
+    """
+    Quality gate for a single-pass draft: splits it into its H1/H2 sections, matches them to
+    the plan sections and rewrites only the failing ones. The whole post is written again
+    (once) only when it has no sections to rewrite or most of its sections failed.
+    """
+    plan_sections = split_plan_into_sections(detailed_plan)
+    draft_sections = split_draft_into_sections(blog_post)
+    if len(draft_sections) < 2:
+        draft_sections, matched_plans = [{"title": "Full Post", "body": blog_post}], [{"title": "Full Post", "body": detailed_plan}]
+    else:
+        matched_plans = content_quality.match_plan_sections(draft_sections, plan_sections)
+    section_texts = [section["body"] for section in draft_sections]
+    plan_texts = [plan["body"] if plan else None for plan in matched_plans]
+    reports = content_quality.check_sections(section_texts, plan_texts, keywords, primary_keyword)
+    print(f"Quality gate: {content_quality.summarize(reports)}.\n{content_quality.format_report(reports)}")
+    failing = [index for index, report in enumerate(reports) if report["problems"]]
+    if not failing:
+        return blog_post
+
+    if len(draft_sections) < 2 or len(failing) / len(reports) > content_quality.QUALITY_FULL_REWRITE_SHARE:
+        print("Quality gate: writing the whole post again.")
+        problems = [f"{reports[index]['title'] or f'Section {index + 1}'}: {problem}" for index in failing for problem in reports[index]["problems"]]
+        rewrite = await write_blog_single_pass(detailed_plan, research_findings, primary_keyword,
+                                               revision=PROMPT_QUALITY_REVISION_FULL.format(problems=_format_problems(problems)), attempt=1)
+        if rewrite["error"]:
+            print(f"Rewrite of the post failed: {rewrite['error']}. Keeping the first draft.")
+            return blog_post
+        rewrite_sections = split_draft_into_sections(rewrite["text_content"]) or [{"title": "Full Post", "body": rewrite["text_content"]}]
+        rewrite_plans = content_quality.match_plan_sections(rewrite_sections, plan_sections) if len(rewrite_sections) >= 2 else [{"title": "Full Post", "body": detailed_plan}]
+        rewrite_reports = content_quality.check_sections([section["body"] for section in rewrite_sections],
+                                                         [plan["body"] if plan else None for plan in rewrite_plans], keywords, primary_keyword)
+        print(f"Quality gate after the rewrite: {content_quality.summarize(rewrite_reports)}.\n{content_quality.format_report(rewrite_reports)}")
+        if sum(1 for report in rewrite_reports if report["problems"]) / len(rewrite_reports) > len(failing) / len(reports):
+            print("The rewrite did worse than the first draft. Keeping the first draft.")
+            return blog_post
+        return rewrite["text_content"]
+
+    writer = SectionWriter(plan_sections, research_findings, primary_keyword)
+    section_texts = await rewrite_failing_sections(section_texts, matched_plans, writer, keywords, reports=reports)
+    return stitch_sections(section_texts)
+
+async def convert_to_html_with_agent(blog_post_content: str, primary_keyword: str) -> dict:
+    """Agent 6: converts the final blog post to HTML with an LLM. Used when local rendering is disabled or fails."""
+    runner_agent6 = get_agent_runner('blog_post_generator_app_agent6', "html_converter_agent", HTML_CONVERSION_MODEL_NAME)
+    session_agent6_id = f"blog_post_gen_session_agent6_{primary_keyword.replace(' ','_')}"
+    user_id_agent6 = "blog_writer_user_agent6"
+    runner_agent6.session_service.create_session(session_id=session_agent6_id, user_id=user_id_agent6, app_name='blog_post_generator_app_agent6')
+
+    prompt_for_agent6 = PROMPT_AGENT_6_HTML_CONVERSION.format(
+        final_blog_post_content_with_links=blog_post_content
+    )
+
+    return await run_adk_agent_prompt(
+        runner_agent6, session_agent6_id, user_id_agent6, prompt_for_agent6, "HtmlConverter"
+    )
+
 # --- Main Logic ---
 async def main():
     print("Starting Blog Post Generation Process...")
+    if not OPENROUTER_API_KEY:
+        print("CRITICAL: OPENROUTER_API_KEY not found. Please set it in a .env file. Exiting.")
+        return
 
-    global CLUSTERS_CSV_PATH, POSTED_CSV_PATH, BLOG_OUTPUT_DIR
+    global CLUSTERS_CSV_PATH, POSTED_CSV_PATH, BLOG_OUTPUT_DIR, SEO_CACHE_DIR, INTERNAL_LINK_INDEX_PATH, STATE_DB_PATH, state_store
     
     # --- Path setup ---
     script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -505,6 +864,9 @@ async def main():
     # POSTED_CSV_FILENAME is defined globally
     POSTED_CSV_PATH = os.path.join(script_dir, POSTED_CSV_FILENAME) 
     BLOG_OUTPUT_DIR = os.path.join(script_dir, "generated_blog_posts")
+    SEO_CACHE_DIR = os.path.join(script_dir, ".seo_cache")
+    INTERNAL_LINK_INDEX_PATH = os.path.join(SEO_CACHE_DIR, "internal_link_index.json")
+    STATE_DB_PATH = os.path.join(script_dir, "seo_state.sqlite3")
 
     print(f"Script execution directory: {os.path.abspath(script_dir)}")
     print(f"Using Clusters CSV: {os.path.abspath(CLUSTERS_CSV_PATH)}")
@@ -520,39 +882,51 @@ async def main():
             print(f"Error creating blog output directory {BLOG_OUTPUT_DIR}: {e}. Fallback: will attempt to save in script directory: {script_dir}")
             BLOG_OUTPUT_DIR = script_dir # Fallback
 
+    llm_gateway.configure("blog_post_generator")
+
     # Ensure Clusters.csv exists (basic check, get_next_cluster handles more)
     if not os.path.exists(CLUSTERS_CSV_PATH):
         print(f"CRITICAL: Clusters.csv not found at {os.path.abspath(CLUSTERS_CSV_PATH)}. Please ensure it exists. Exiting.")
         return
 
-    cluster_to_process = get_next_cluster_to_process()
-    if not cluster_to_process:
-        print("No suitable cluster found in Clusters.csv to process. Exiting.")
-        return
+    if state_store is None:  # The daemon keeps one store open across runs.
+        state_store = StateStore(STATE_DB_PATH, csv_dir=script_dir)
+    state_store.sync_from_csv("clusters")
+
+    processed_count = 0
+    while processed_count < (1 if REGENERATE_CLUSTER else MAX_CLUSTERS_PER_RUN):
+        # State store writes run in a worker thread: they may wait up to 30 s for another worker's lock.
+        cluster_to_process = await asyncio.to_thread(get_next_cluster_to_process)
+        if not cluster_to_process:
+            if processed_count == 0:
+                print("No suitable cluster found in Clusters.csv to process. Exiting.")
+            break
+        if REGENERATE_CLUSTER:
+            await generate_blog_post(cluster_to_process)
+            processed_count += 1
+            continue
+
+        cluster_primary_keyword = cluster_to_process.get(CLUSTER_FIELD_PRIMARY_KEYWORD, "")
+        heartbeat_task = asyncio.create_task(keep_cluster_lease(cluster_primary_keyword))
+        try:
+            await generate_blog_post(cluster_to_process)
+        finally:
+            heartbeat_task.cancel()
+            await asyncio.to_thread(release_cluster, cluster_primary_keyword)
+        processed_count += 1
 
+    llm_gateway.print_llm_stats()
+    print("\nBlog Post Generation Process (including HTML) Fully Finished.")
+
+@traced("cluster")
+async def generate_blog_post(cluster_to_process: dict):
+    """Runs the full pipeline (Agents 1-6) for one claimed cluster."""
     # --- Agent 1: Preliminary Planner (Gemini via OpenRouter) ---
     print("\n--- Step 1: Preliminary Blog Post Planning ---")
-    prelim_planner_model = LiteLlm(
-        model="openrouter/" + PRELIM_PLAN_MODEL_NAME,
-        api_key=OPENROUTER_API_KEY,
-    )
-    preliminary_planner_agent = Agent(
-        name="preliminary_blog_planner_agent",
-        model=prelim_planner_model,
-        instruction="", 
-        tools=[],
-    )
-    session_service_agent1 = InMemorySessionService()
-    artifact_service_agent1 = InMemoryArtifactService()
-    session_agent1_id = "blog_post_gen_session_agent1"
+    runner_agent1 = get_agent_runner('blog_post_generator_app_agent1', "preliminary_blog_planner_agent", PRELIM_PLAN_MODEL_NAME)
+    session_agent1_id = f"blog_post_gen_session_agent1_{cluster_to_process.get(CLUSTER_FIELD_PRIMARY_KEYWORD, 'default_pk').replace(' ','_')}"
     user_id_agent1 = "blog_writer_user_agent1"
-    session_service_agent1.create_session(session_id=session_agent1_id, user_id=user_id_agent1, app_name='blog_post_generator_app_agent1')
-    runner_agent1 = Runner(
-        app_name='blog_post_generator_app_agent1',
-        agent=preliminary_planner_agent,
-        session_service=session_service_agent1,
-        artifact_service=artifact_service_agent1
-    )
+    runner_agent1.session_service.create_session(session_id=session_agent1_id, user_id=user_id_agent1, app_name='blog_post_generator_app_agent1')
     prompt_for_agent1 = PROMPT_AGENT_1_PRELIMINARY_PLAN.format(
         keywords=cluster_to_process.get(CLUSTER_FIELD_KEYWORDS, ""),
         intent=cluster_to_process.get(CLUSTER_FIELD_INTENT, ""),
@@ -572,7 +946,7 @@ async def main():
     # Update cluster status to 'Yes' immediately after successful Agent 1 processing
     processed_primary_keyword_for_status_update = cluster_to_process.get(CLUSTER_FIELD_PRIMARY_KEYWORD)
     if processed_primary_keyword_for_status_update:
-        if update_cluster_status(processed_primary_keyword_for_status_update, "Yes"):
+        if await asyncio.to_thread(update_cluster_status, processed_primary_keyword_for_status_update, "Yes"):
             print(f"Successfully updated status to 'Yes' for cluster with primary keyword: {processed_primary_keyword_for_status_update} after Agent 1.")
         else:
             print(f"Failed to update status for cluster with primary keyword: {processed_primary_keyword_for_status_update} after Agent 1.")
@@ -587,13 +961,19 @@ async def main():
     if not research_query_for_direct_call or research_query_for_direct_call.strip() == "":
         print("Preliminary plan output is empty. Using primary keyword for research instead.")
         research_query_for_direct_call = f"Provide comprehensive research information about: {cluster_to_process.get(CLUSTER_FIELD_PRIMARY_KEYWORD, 'general topic')}"
+        research_result_struct = await fetch_and_process_research_directly(research_query_for_direct_call)
+    elif RESEARCH_MODE == "parallel":
+        research_result_struct = await research_in_parallel(
+            preliminary_plan_output, cluster_to_process.get(CLUSTER_FIELD_PRIMARY_KEYWORD, "")
+        )
     else:
         research_query_for_direct_call = ' '.join(research_query_for_direct_call.splitlines()).replace('"', ' ')
         print(f"Using this preliminary plan as input for direct research call: '{research_query_for_direct_call[:200]}...'")
-    
-    research_result_struct = await fetch_and_process_research_directly(research_query_for_direct_call)
+        research_result_struct = await fetch_and_process_research_directly(research_query_for_direct_call)
     research_findings_output = research_result_struct["text_content"]
     research_error = research_result_struct["error"]
+    research_sources = research_result_struct.get("sources", [])
+    print(f"Research returned {len(research_sources)} unique sources.")
 
     print("\nResearch Findings Output (from direct call, potentially with fixed links):")
     print(research_findings_output)
@@ -604,27 +984,10 @@ async def main():
 
     # --- Agent 3: Detailed Plan Generation (ADK Agent) ---
     print("\n--- Step 3: Generating Detailed Blog Post Plan ---")
-    detailed_plan_model = LiteLlm(
-        model="openrouter/" + DETAILED_PLAN_MODEL_NAME,
-        api_key=OPENROUTER_API_KEY,
-    )
-    detailed_plan_agent = Agent(
-        name="detailed_blog_planner_agent",
-        model=detailed_plan_model,
-        instruction="", 
-        tools=[],
-    )
-    session_service_agent3 = InMemorySessionService()
-    artifact_service_agent3 = InMemoryArtifactService()
-    session_agent3_id = "blog_post_gen_session_agent3"
+    runner_agent3 = get_agent_runner('blog_post_generator_app_agent3', "detailed_blog_planner_agent", DETAILED_PLAN_MODEL_NAME)
+    session_agent3_id = f"blog_post_gen_session_agent3_{cluster_to_process.get(CLUSTER_FIELD_PRIMARY_KEYWORD, 'default_pk').replace(' ','_')}"
     user_id_agent3 = "blog_writer_user_agent3"
-    session_service_agent3.create_session(session_id=session_agent3_id, user_id=user_id_agent3, app_name='blog_post_generator_app_agent3')
-    runner_agent3 = Runner(
-        app_name='blog_post_generator_app_agent3',
-        agent=detailed_plan_agent,
-        session_service=session_service_agent3,
-        artifact_service=artifact_service_agent3
-    )
+    runner_agent3.session_service.create_session(session_id=session_agent3_id, user_id=user_id_agent3, app_name='blog_post_generator_app_agent3')
     prompt_for_agent3 = PROMPT_AGENT_3_DETAILED_PLAN.format(
         keywords=cluster_to_process.get(CLUSTER_FIELD_KEYWORDS, ""),
         intent=cluster_to_process.get(CLUSTER_FIELD_INTENT, ""),
@@ -647,35 +1010,29 @@ async def main():
 
     # --- Agent 4: Write Blog Post (ADK Agent) ---
     print("\n--- Step 4: Writing Blog Post ---")
-    write_blog_model = LiteLlm(
-        model="openrouter/" + WRITE_BLOG_MODEL_NAME,
-        api_key=OPENROUTER_API_KEY,
-    )
-    write_blog_agent = Agent(
-        name="blog_writer_agent",
-        model=write_blog_model,
-        instruction="", 
-        tools=[],
-    )
-    session_service_agent4 = InMemorySessionService()
-    artifact_service_agent4 = InMemoryArtifactService()
-    session_agent4_id = "blog_post_gen_session_agent4"
-    user_id_agent4 = "blog_writer_user_agent4"
-    session_service_agent4.create_session(session_id=session_agent4_id, user_id=user_id_agent4, app_name='blog_post_generator_app_agent4')
-    runner_agent4 = Runner(
-        app_name='blog_post_generator_app_agent4',
-        agent=write_blog_agent,
-        session_service=session_service_agent4,
-        artifact_service=artifact_service_agent4
-    )
-    prompt_for_agent4 = PROMPT_AGENT_4_WRITE_BLOG.format(
-        detailed_plan=detailed_plan_output,
-        research_findings=research_findings_output,
-        primary_keyword=cluster_to_process.get(CLUSTER_FIELD_PRIMARY_KEYWORD, "")
-    )
-    agent4_output_struct = await run_adk_agent_prompt(
-        runner_agent4, session_agent4_id, user_id_agent4, prompt_for_agent4, "BlogWriter"
-    )
+    agent4_output_struct = None
+    if WRITE_BLOG_MODE == "sections":
+        agent4_output_struct = await write_blog_in_sections(
+            detailed_plan_output,
+            research_findings_output,
+            cluster_to_process.get(CLUSTER_FIELD_PRIMARY_KEYWORD, ""),
+            cluster_to_process.get(CLUSTER_FIELD_KEYWORDS, "")
+        )
+
+    if agent4_output_struct is None:
+        agent4_output_struct = await write_blog_single_pass(
+            detailed_plan_output,
+            research_findings_output,
+            cluster_to_process.get(CLUSTER_FIELD_PRIMARY_KEYWORD, "")
+        )
+        if content_quality.QUALITY_GATE_ENABLED and not agent4_output_struct["error"]:
+            agent4_output_struct["text_content"] = await apply_quality_gate(
+                agent4_output_struct["text_content"],
+                detailed_plan_output,
+                research_findings_output,
+                cluster_to_process.get(CLUSTER_FIELD_PRIMARY_KEYWORD, ""),
+                cluster_to_process.get(CLUSTER_FIELD_KEYWORDS, "")
+            )
     blog_post_output = agent4_output_struct["text_content"]
     agent4_error = agent4_output_struct["error"]
     print("\nGenerated Blog Post (raw):")
@@ -686,30 +1043,12 @@ async def main():
         
     # --- Agent 5: Add Internal Links ---
     print("\n--- Step 5: Adding Internal Links ---")
-    internal_link_model = LiteLlm(
-        model="openrouter/" + INTERNAL_LINK_MODEL_NAME,
-        api_key=OPENROUTER_API_KEY,
-    )
-    internal_linker_agent = Agent(
-        name="internal_linker_agent",
-        model=internal_link_model,
-        instruction="", # The main instruction is in the dynamic prompt
-        tools=[],
-    )
-    session_service_agent5 = InMemorySessionService() # New session service for this agent
-    artifact_service_agent5 = InMemoryArtifactService()
+    runner_agent5 = get_agent_runner('blog_post_generator_app_agent5', "internal_linker_agent", INTERNAL_LINK_MODEL_NAME, INSTRUCTION_AGENT_5_INTERNAL_LINKS)
     session_agent5_id = f"blog_post_gen_session_agent5_{cluster_to_process.get(CLUSTER_FIELD_PRIMARY_KEYWORD, 'default_pk').replace(' ','_')}"
     user_id_agent5 = "blog_writer_user_agent5"
-    session_service_agent5.create_session(session_id=session_agent5_id, user_id=user_id_agent5, app_name='blog_post_generator_app_agent5')
-    
-    runner_agent5 = Runner(
-        app_name='blog_post_generator_app_agent5',
-        agent=internal_linker_agent,
-        session_service=session_service_agent5,
-        artifact_service=artifact_service_agent5
-    )
+    runner_agent5.session_service.create_session(session_id=session_agent5_id, user_id=user_id_agent5, app_name='blog_post_generator_app_agent5')
 
-    internal_links_str_data = get_internal_linking_data()
+    internal_links_str_data = get_internal_linking_data(blog_post_output)
     
     prompt_for_agent5 = PROMPT_AGENT_5_INTERNAL_LINKS.format(
         current_blog_post_content=blog_post_output,
@@ -732,40 +1071,25 @@ async def main():
     else:
         content_for_html_conversion = blog_post_with_internal_links
 
-    # --- Agent 6: Convert to HTML ---
+    # --- Step 6: Convert to HTML (local renderer, Agent 6 as fallback) ---
     print("\n--- Step 6: Converting to HTML ---")
-    html_model = LiteLlm(
-        model="openrouter/" + HTML_CONVERSION_MODEL_NAME,
-        api_key=OPENROUTER_API_KEY,
-    )
-    html_converter_agent = Agent(
-        name="html_converter_agent",
-        model=html_model,
-        instruction="",
-        tools=[],
-    )
-    session_service_agent6 = InMemorySessionService()
-    artifact_service_agent6 = InMemoryArtifactService()
-    session_agent6_id = f"blog_post_gen_session_agent6_{cluster_to_process.get(CLUSTER_FIELD_PRIMARY_KEYWORD, 'default_pk').replace(' ','_')}"
-    user_id_agent6 = "blog_writer_user_agent6"
-    session_service_agent6.create_session(session_id=session_agent6_id, user_id=user_id_agent6, app_name='blog_post_generator_app_agent6')
-
-    runner_agent6 = Runner(
-        app_name='blog_post_generator_app_agent6',
-        agent=html_converter_agent,
-        session_service=session_service_agent6,
-        artifact_service=artifact_service_agent6
-    )
+    primary_keyword_for_session = cluster_to_process.get(CLUSTER_FIELD_PRIMARY_KEYWORD, 'default_pk')
+    final_html_output = ""
+    agent6_error = None
 
-    prompt_for_agent6 = PROMPT_AGENT_6_HTML_CONVERSION.format(
-        final_blog_post_content_with_links=content_for_html_conversion
-    )
+    if HTML_RENDER_MODE == "local":
+        try:
+            source_titles = {source["url"]: source["title"] for source in research_sources if source.get("title")}
+            final_html_output = render_blog_post_html(content_for_html_conversion, source_titles=source_titles)
+            print("Rendered HTML locally from Markdown.")
+        except Exception as e:
+            print(f"Local HTML rendering failed: {e}. Falling back to Agent 6 (HtmlConverter).")
+            final_html_output = ""
 
-    agent6_output_struct = await run_adk_agent_prompt(
-        runner_agent6, session_agent6_id, user_id_agent6, prompt_for_agent6, "HtmlConverter"
-    )
-    final_html_output = agent6_output_struct["text_content"]
-    agent6_error = agent6_output_struct["error"]
+    if not final_html_output:
+        agent6_output_struct = await convert_to_html_with_agent(content_for_html_conversion, primary_keyword_for_session)
+        final_html_output = agent6_output_struct["text_content"]
+        agent6_error = agent6_output_struct["error"]
 
     print("\nFinal HTML Output (raw snippet):")
     print(final_html_output[:1000] + "..." if len(final_html_output) > 1000 else final_html_output) # Print snippet
@@ -784,8 +1108,6 @@ async def main():
             print(f"Successfully saved HTML to: {os.path.abspath(output_html_path)}")
         except Exception as e:
             print(f"Error saving HTML file to {output_html_path}: {e}")
-            
-    print("\nBlog Post Generation Process (including HTML) Fully Finished.")
 
 if __name__ == "__main__":
     if not os.getenv("OPENROUTER_API_KEY"):
@@ -793,4 +1115,4 @@ if __name__ == "__main__":
         exit(1)
         
     print("Running blog post generator manually...")
-    asyncio.run(main()) 
\ No newline at end of file
+    tracing.run_script("blog_post_generator", main)
\ No newline at end of file
@@ -0,0 +1,181 @@
+import re
+
+from tracing import traced
+
+# --- Plan / Draft Section Helpers ---
+# Used by the section-parallel writing mode and the quality gate of blog_post_generator.py.
+
+MIN_SECTIONS_FOR_PARALLEL = 2
+MAX_SECTIONS = 12
+
+MD_HEADING_RE = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+BOLD_LINE_RE = re.compile(r"^\s*(?:[-*+]\s+|\d+[.)]\s+)?\*\*(.+?)\*\*:?\s*$")
+TOP_LEVEL_ITEM_RE = re.compile(r"^(?:[-*+]|\d+[.)]|[IVXLC]+\.)\s+(.+)$")
+
+
+def _clean_title(title: str) -> str:
+    title = re.sub(r"[*_`]", "", title).strip()
+    return title.rstrip(":").strip()
+
+
+def _split_on(lines: list[str], is_boundary) -> list[dict]:
+    sections = []
+    preamble = []
+    for line in lines:
+        title = is_boundary(line)
+        if title is not None:
+            sections.append({"title": _clean_title(title), "lines": [line]})
+        elif sections:
+            sections[-1]["lines"].append(line)
+        else:
+            preamble.append(line)
+    if sections and any(l.strip() for l in preamble):
+        sections[0]["lines"] = preamble + sections[0]["lines"]
+    return [{"title": s["title"], "body": "\n".join(s["lines"]).strip()} for s in sections]
+
+
+def _heading_boundary(min_level: int):
+    def _is_boundary(line):
+        match = MD_HEADING_RE.match(line.strip())
+        if match and len(match.group(1)) <= min_level:
+            return match.group(2)
+        return None
+    return _is_boundary
+
+
+def _bold_line_boundary(line):
+    if line[:1].isspace():
+        return None
+    match = BOLD_LINE_RE.match(line)
+    return match.group(1) if match else None
+
+
+def _top_level_item_boundary(line):
+    if not line or line[:1].isspace():
+        return None
+    match = TOP_LEVEL_ITEM_RE.match(line.strip())
+    return match.group(1) if match else None
+
+
+@traced("prompt")
+def split_plan_into_sections(detailed_plan: str) -> list[dict]:
+    """
+    Splits Agent 3's detailed plan into writing sections ({"title", "body"}).
+    Tries Markdown headings first (shallowest level that yields several sections),
+    then bold-only lines, then unindented top-level bullets.
+    Returns a single-section list when the plan has no usable structure.
+    """
+    lines = detailed_plan.strip().splitlines()
+    candidates = []
+    for level in range(1, 4):
+        candidates.append(_split_on(lines, _heading_boundary(level)))
+    candidates.append(_split_on(lines, _bold_line_boundary))
+    candidates.append(_split_on(lines, _top_level_item_boundary))
+
+    for sections in candidates:
+        # A single H1 title followed by sections is common; skip a split that only finds the title.
+        if MIN_SECTIONS_FOR_PARALLEL <= len(sections) <= MAX_SECTIONS:
+            return sections
+
+    for sections in candidates:
+        if len(sections) > MAX_SECTIONS:
+            return merge_sections(sections, MAX_SECTIONS)
+
+    return [{"title": "Full Post", "body": detailed_plan.strip()}]
+
+
+def merge_sections(sections: list[dict], max_sections: int) -> list[dict]:
+    """Merges neighbouring sections so that at most max_sections remain."""
+    if len(sections) <= max_sections:
+        return sections
+    group_size = -(-len(sections) // max_sections)
+    merged = []
+    for start in range(0, len(sections), group_size):
+        group = sections[start:start + group_size]
+        merged.append({
+            "title": " / ".join(s["title"] for s in group),
+            "body": "\n\n".join(s["body"] for s in group),
+        })
+    return merged
+
+
+def build_plan_outline(sections: list[dict]) -> str:
+    return "\n".join(f"{i + 1}. {s['title']}" for i, s in enumerate(sections))
+
+
+def _strip_code_fences(text: str) -> str:
+    stripped = text.strip()
+    match = re.match(r"^```[a-zA-Z]*\n(.*)\n```$", stripped, re.DOTALL)
+    return match.group(1).strip() if match else stripped
+
+
+@traced("prompt")
+def stitch_sections(section_texts: list[str]) -> str:
+    """
+    Local stitch pass: joins independently written sections into one Markdown post.
+    Strips code fences, keeps only the first H1 (later ones become H2) and drops a
+    heading that merely repeats the heading the previous section ended with.
+    """
+    stitched_parts = []
+    seen_h1 = False
+    previous_heading = None
+    for raw_text in section_texts:
+        text = _strip_code_fences(raw_text)
+        if not text:
+            continue
+
+        output_lines = []
+        for line in text.splitlines():
+            heading_match = MD_HEADING_RE.match(line.strip())
+            if heading_match:
+                title = heading_match.group(2).strip()
+                normalized_title = _clean_title(title).lower()
+                if not output_lines and normalized_title == previous_heading:
+                    continue
+                if len(heading_match.group(1)) == 1:
+                    if seen_h1:
+                        line = "## " + title
+                    seen_h1 = True
+                previous_heading = normalized_title
+            output_lines.append(line)
+
+        section_text = "\n".join(output_lines).strip()
+        if section_text:
+            stitched_parts.append(section_text)
+
+    return "\n\n".join(stitched_parts)
+
+
+def split_draft_into_sections(draft: str) -> list[dict]:
+    """
+    Splits a Markdown post into its H1/H2 sections ({"title", "body"}, the body starting with
+    the heading line). Text before the first heading joins the first section.
+    """
+    return _split_on(_strip_code_fences(draft).splitlines(), _heading_boundary(2))
+
+
+@traced("prompt")
+def split_plan_into_research_queries(preliminary_plan: str, max_queries: int) -> list[str]:
+    """
+    Splits Agent 1's preliminary plan into at most max_queries independent research
+    sub-questions. Top-level discussion points are grouped in order so that each
+    sub-question covers a contiguous part of the plan.
+    """
+    lines = preliminary_plan.strip().splitlines()
+    points = []
+    for boundary in (_heading_boundary(3), _bold_line_boundary, _top_level_item_boundary):
+        points = _split_on(lines, boundary)
+        if len(points) >= 2:
+            break
+    if len(points) < 2 or max_queries < 2:
+        return [preliminary_plan.strip()]
+
+    group_count = min(max_queries, len(points))
+    base_size, remainder = divmod(len(points), group_count)
+    queries = []
+    start = 0
+    for group_index in range(group_count):
+        end = start + base_size + (1 if group_index < remainder else 0)
+        queries.append("\n".join(point["body"] for point in points[start:end]))
+        start = end
+    return queries
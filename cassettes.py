@@ -0,0 +1,171 @@
+import os
+import sys
+import gzip
+import json
+import time
+
+from llm_cache import NON_KEY_PARAMS
+
+# --- LLM Record / Replay Cassettes ---
+# LLM_CASSETTE_MODE=record saves every LLM request and its full response (including the
+# research citations and annotations) to a gzipped JSON-lines cassette, one per script run.
+# LLM_CASSETTE_MODE=replay serves the responses from the cassette instead of calling the
+# provider: no network, no rate limits and no cost, so a parse or rendering problem can be
+# reproduced and fixed by rerunning the script. A request is matched by its content hash
+# first and otherwise by its position among the stage's recorded calls (so a changed prompt
+# still gets the response recorded for it); a request with no match fails with
+# CassetteMissError. `seo analyze|plan|generate --record/--replay [PATH]` set the mode too.
+CASSETTE_MODE = os.getenv("LLM_CASSETTE_MODE", "off").strip().lower()  # off | record | replay
+CASSETTE_PATH = os.getenv("LLM_CASSETTE", "").strip()  # Default: .seo_cache/cassettes/<script>.cassette.jsonl.gz
+CASSETTE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".seo_cache", "cassettes")
+CASSETTE_SUFFIX = ".cassette.jsonl.gz"
+CASSETTE_MODES = ("off", "record", "replay")
+
+
+class CassetteMissError(LookupError):
+    """Replay mode got a request that the cassette has no response for."""
+
+
+def enable(mode: str, path: str | None = None):
+    """Sets the cassette mode (and optionally the file) for the following runs."""
+    global CASSETTE_MODE, CASSETTE_PATH
+    if mode not in CASSETTE_MODES:
+        raise ValueError(f"Unknown cassette mode '{mode}'; choose from {list(CASSETTE_MODES)}.")
+    CASSETTE_MODE = mode
+    if path:
+        CASSETTE_PATH = path
+
+
+def default_path(script_name: str) -> str:
+    return os.path.join(CASSETTE_DIR, script_name + CASSETTE_SUFFIX)
+
+
+def _jsonable(value):
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    if isinstance(value, dict):
+        return {k: _jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return str(value)
+
+
+def load_entries(path: str) -> list[dict]:
+    entries = []
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue  # A line cut short by a crash.
+    except EOFError:
+        pass  # The last gzip member was cut short; the complete ones were read.
+    return entries
+
+
+class Cassette:
+    """One cassette file, opened for recording (truncated) or replaying (loaded into memory)."""
+
+    def __init__(self, path: str, mode: str):
+        self.path = path
+        self.mode = mode
+        self.recorded = 0
+        self.replayed = 0
+        self.fuzzy_matches = 0
+        self._entries = []
+        self._by_key = {}
+        self._by_stage = {}
+        self._used = set()
+        if mode == "record":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            open(path, "wb").close()
+        else:
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"Cassette {path} not found; record one first with LLM_CASSETTE_MODE=record.")
+            self._entries = load_entries(path)
+            for index, entry in enumerate(self._entries):
+                self._by_key.setdefault(entry["key"], []).append(index)
+                self._by_stage.setdefault((entry.get("stage"), entry.get("model")), []).append(index)
+
+    @classmethod
+    def for_script(cls, script_name: str) -> "Cassette | None":
+        """The cassette configured for a script run, or None when cassettes are off."""
+        if CASSETTE_MODE == "off":
+            return None
+        path = CASSETTE_PATH or default_path(script_name)
+        cassette = cls(path, CASSETTE_MODE)
+        if CASSETTE_MODE == "record":
+            print(f"Recording LLM calls to cassette {path}.")
+        else:
+            print(f"Replaying LLM calls from cassette {path} ({len(cassette._entries)} recorded responses).")
+        return cassette
+
+    def record(self, key: str, stage: str | None, request_kwargs: dict, response_dict: dict, routed_to: str | None = None):
+        """Appends a call. request_kwargs is the request as configured; routed_to is the model that actually served it, if the router chose another one."""
+        entry = {
+            "key": key,
+            "ts": round(time.time(), 3),
+            "stage": stage,
+            "model": request_kwargs.get("model"),
+            "request": _jsonable({k: v for k, v in request_kwargs.items() if k not in NON_KEY_PARAMS and v is not None}),
+            "response": _jsonable(response_dict),
+        }
+        if routed_to:
+            entry["routed_to"] = routed_to
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        # One gzip member per call: the cassette stays readable if the run is interrupted.
+        with gzip.open(self.path, "at", encoding="utf-8") as f:
+            f.write(line)
+        self.recorded += 1
+
+    def replay(self, key: str, stage: str | None, model: str | None) -> dict:
+        """The recorded response for the request. Raises CassetteMissError if there is none left."""
+        index = next((i for i in self._by_key.get(key, []) if i not in self._used), None)
+        if index is None:
+            index = next((i for i in self._by_stage.get((stage, model), []) if i not in self._used), None)
+            if index is None:
+                raise CassetteMissError(f"No recorded response left in {self.path} for stage '{stage}' and model '{model}' ({key[:12]}).")
+            self.fuzzy_matches += 1
+            print(f"Cassette: request for stage '{stage}' changed since recording; replaying the next response recorded for it.")
+        self._used.add(index)
+        self.replayed += 1
+        return self._entries[index]["response"]
+
+    def stats(self) -> dict:
+        return {"path": self.path, "mode": self.mode, "recorded": self.recorded, "replayed": self.replayed, "fuzzy_matches": self.fuzzy_matches}
+
+
+def main(argv: list[str]) -> int:
+    """Usage: python cassettes.py list [path] | show <path> <n>"""
+    command = argv[0] if argv else "list"
+    if command == "list":
+        paths = argv[1:]
+        if not paths and os.path.isdir(CASSETTE_DIR):
+            paths = sorted(os.path.join(CASSETTE_DIR, name) for name in os.listdir(CASSETTE_DIR) if name.endswith(CASSETTE_SUFFIX))
+        if not paths:
+            print(f"No cassettes in {CASSETTE_DIR}.")
+        for path in paths:
+            entries = load_entries(path)
+            print(f"{path}: {len(entries)} calls, {os.path.getsize(path) / 1024:.1f} KB")
+            for n, entry in enumerate(entries):
+                content = ((entry["response"].get("choices") or [{}])[0].get("message") or {}).get("content") or ""
+                print(f"  {n:>3}  {entry.get('stage') or 'unnamed':<28} {entry.get('model') or '':<50} {len(content):>7} chars  {entry['key'][:12]}")
+        return 0
+    if command == "show" and len(argv) == 3:
+        entries = load_entries(argv[1])
+        try:
+            entry = entries[int(argv[2])]
+        except (ValueError, IndexError):
+            print(f"No call #{argv[2]} in {argv[1]} ({len(entries)} calls).")
+            return 1
+        print(json.dumps(entry, indent=2, ensure_ascii=False))
+        return 0
+    print(main.__doc__)
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,184 @@
+import re
+import sys
+import time
+from urllib.parse import urlsplit, urlunsplit
+
+# Matches [1], [12] and grouped markers such as [1, 2] or [3,4,5].
+CITATION_MARKER_RE = re.compile(r"\[(\d+(?:\s*,\s*\d+)*)\]")
+# A trailing fragment that may still become a marker once more streamed text arrives.
+PARTIAL_MARKER_RE = re.compile(r"\[[\d,\s]*$")
+SOURCE_MARKER_FORMAT = " - source: {url}"
+
+
+def normalize_url(url: str) -> str:
+    """Key used to deduplicate sources: lowercase scheme/host, no fragment, no trailing slash."""
+    parts = urlsplit(url.strip())
+    path = parts.path.rstrip("/")
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, parts.query, ""))
+
+
+def extract_sources(raw_response: dict) -> list[dict]:
+    """
+    Reads the citation list of a chat completion response, in order, as [{"url", "title"}].
+    Supports the top-level 'citations' list (strings or objects with a 'url') and
+    'url_citation' entries in choices[0].message.annotations.
+    """
+    sources = []
+    citations = raw_response.get("citations")
+    if isinstance(citations, list):
+        for citation in citations:
+            if isinstance(citation, str) and citation.strip():
+                sources.append({"url": citation.strip(), "title": ""})
+            elif isinstance(citation, dict) and citation.get("url"):
+                sources.append({"url": citation["url"].strip(), "title": citation.get("title") or ""})
+    if sources:
+        return sources
+
+    choices = raw_response.get("choices") or [{}]
+    message = (choices[0] or {}).get("message") or {}
+    annotations = message.get("annotations")
+    if isinstance(annotations, list):
+        for annotation in annotations:
+            if isinstance(annotation, dict) and annotation.get("type") == "url_citation":
+                url_data = annotation.get("url_citation")
+                if isinstance(url_data, dict) and url_data.get("url"):
+                    sources.append({"url": url_data["url"].strip(), "title": url_data.get("title") or ""})
+    return sources
+
+
+class CitationResolver:
+    """
+    Resolves bracketed [n] citation markers to ` - source: URL` markers in a single regex pass.
+    Several responses can be added to one resolver: their sources are merged into one
+    deduplicated, consistently numbered list (self.sources) that later stages can reuse.
+    """
+
+    def __init__(self, marker_format: str = SOURCE_MARKER_FORMAT):
+        self.marker_format = marker_format
+        self.sources = []
+        self._index_by_key = {}
+
+    def add_sources(self, sources: list[dict]) -> list[int]:
+        """Registers a response's sources and returns the merged 1-based number for each local position."""
+        numbers = []
+        for source in sources:
+            key = normalize_url(source["url"])
+            if key not in self._index_by_key:
+                self.sources.append({"number": len(self.sources) + 1, "url": source["url"], "title": source.get("title", "")})
+                self._index_by_key[key] = len(self.sources)
+            elif source.get("title") and not self.sources[self._index_by_key[key] - 1]["title"]:
+                self.sources[self._index_by_key[key] - 1]["title"] = source["title"]
+            numbers.append(self._index_by_key[key])
+        return numbers
+
+    def _replacement(self, local_numbers: list[int], renumber_only: bool):
+        def _replace(match):
+            replaced = []
+            for part in match.group(1).split(","):
+                local_number = int(part)
+                if not 1 <= local_number <= len(local_numbers):
+                    return match.group(0)
+                merged_number = local_numbers[local_number - 1]
+                if merged_number not in replaced:
+                    replaced.append(merged_number)
+            if renumber_only:
+                return "".join(f"[{n}]" for n in replaced)
+            return "".join(self.marker_format.format(url=self.sources[n - 1]["url"]) for n in replaced)
+        return _replace
+
+    def resolve(self, text: str, sources: list[dict], renumber_only: bool = False) -> str:
+        """
+        Rewrites every marker of `text` (whose [n] refer to `sources`) in one pass.
+        With renumber_only=True markers are kept but renumbered to the merged list.
+        Markers that point outside the source list are left untouched.
+        """
+        local_numbers = self.add_sources(sources)
+        if not local_numbers:
+            return text
+        return CITATION_MARKER_RE.sub(self._replacement(local_numbers, renumber_only), text)
+
+    def resolve_response(self, raw_response: dict) -> str:
+        text = raw_response["choices"][0]["message"]["content"] or ""
+        return self.resolve(text, extract_sources(raw_response))
+
+    def stream(self) -> "StreamingCitationResolver":
+        return StreamingCitationResolver(self)
+
+
+class StreamingCitationResolver:
+    """
+    Resolves markers while a streamed response arrives. Text is emitted as soon as it
+    cannot be part of a marker; a trailing partial marker such as "[1" is held back
+    until the next chunk. Sources may arrive with any chunk (OpenRouter repeats them).
+    """
+
+    def __init__(self, resolver: CitationResolver):
+        self.resolver = resolver
+        self._pending = ""
+        self._local_numbers = []
+
+    def feed(self, text_chunk: str, sources: list[dict] | None = None) -> str:
+        if sources and len(sources) > len(self._local_numbers):
+            self._local_numbers = self.resolver.add_sources(sources)
+        text = self._pending + (text_chunk or "")
+        partial = PARTIAL_MARKER_RE.search(text)
+        if partial:
+            self._pending = text[partial.start():]
+            text = text[:partial.start()]
+        else:
+            self._pending = ""
+        return self._resolve(text)
+
+    def flush(self) -> str:
+        text, self._pending = self._pending, ""
+        return self._resolve(text)
+
+    def _resolve(self, text: str) -> str:
+        if not self._local_numbers or not text:
+            return text
+        return CITATION_MARKER_RE.sub(self.resolver._replacement(self._local_numbers, False), text)
+
+
+def _legacy_fix_links(text: str, urls: list[str]) -> str:
+    """The previous per-citation re.sub loop, kept only for benchmarking."""
+    for i, url in enumerate(urls):
+        text = re.sub(re.escape(f"[{i+1}]"), f" - source: {url}", text)
+    return text
+
+
+def run_benchmark(citation_count: int = 150, paragraphs: int = 4000) -> dict:
+    """Compares the legacy loop with the single-pass resolver on a large synthetic research text."""
+    urls = [f"https://example{i}.com/article/{i}" for i in range(citation_count)]
+    body = "\n".join(
+        f"Finding {p} about dental care is supported by research [{p % citation_count + 1}][{(p * 7) % citation_count + 1}]."
+        for p in range(paragraphs)
+    )
+    sources = [{"url": url, "title": ""} for url in urls]
+
+    start = time.perf_counter()
+    legacy_output = _legacy_fix_links(body, urls)
+    legacy_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    resolved_output = CitationResolver().resolve(body, sources)
+    resolver_ms = (time.perf_counter() - start) * 1000
+
+    expected_links = body.count("][") + body.count("].")
+    return {
+        "citations": citation_count,
+        "text_chars": len(body),
+        "legacy_ms": round(legacy_ms, 2),
+        "resolver_ms": round(resolver_ms, 2),
+        "legacy_links": legacy_output.count(" - source: "),
+        "resolver_links": resolved_output.count(" - source: "),
+        "expected_links": expected_links,
+        "outputs_match": legacy_output == resolved_output,
+    }
+
+
+if __name__ == "__main__":
+    # Usage: python citations.py [citation_count] [paragraphs]
+    count_arg = int(sys.argv[1]) if len(sys.argv) > 1 else 150
+    paragraphs_arg = int(sys.argv[2]) if len(sys.argv) > 2 else 4000
+    for name, value in run_benchmark(count_arg, paragraphs_arg).items():
+        print(f"{name}: {value}")
@@ -0,0 +1,177 @@
+import os
+import time
+import asyncio
+from collections import deque
+from email.utils import parsedate_to_datetime
+
+# --- Configuration ---
+CONCURRENCY_INITIAL = float(os.getenv("CONCURRENCY_INITIAL", "4"))
+CONCURRENCY_MIN = float(os.getenv("CONCURRENCY_MIN", "1"))
+CONCURRENCY_MAX = float(os.getenv("CONCURRENCY_MAX", "32"))
+DECREASE_FACTOR = 0.5  # Multiplicative cut on 429s, overload responses and timeouts.
+LATENCY_DECREASE_FACTOR = 0.8  # Gentler cut when only the latency p95 rises.
+LATENCY_TOLERANCE = 2.0  # A window p95 above this multiple of the baseline p95 counts as congestion.
+LATENCY_WINDOW = 20  # Successful calls per latency evaluation.
+DEFAULT_RETRY_AFTER_SECONDS = 5.0  # Pause after a 429 that carries no Retry-After header.
+
+OVERLOAD_STATUS_CODES = {408, 429, 503, 504, 529}
+
+
+def _percentile(values, percentile: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(percentile * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def is_overload_error(exc: Exception) -> bool:
+    """True for errors that mean the provider is saturated (429/503/529) or too slow (timeouts)."""
+    if getattr(exc, "status_code", None) in OVERLOAD_STATUS_CODES:
+        return True
+    return isinstance(exc, (asyncio.TimeoutError, TimeoutError)) or "Timeout" in type(exc).__name__
+
+
+def retry_after_seconds(exc: Exception) -> float | None:
+    """Reads a Retry-After header (seconds or HTTP date) from a provider error, if present."""
+    headers = getattr(exc, "litellm_response_headers", None)
+    if headers is None:
+        response = getattr(exc, "response", None)
+        headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after") or headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD concurrency limit for one model. The limit grows by one for every `limit`
+    successful calls (one step per round of in-flight requests), is halved on overload
+    errors and cut by 20% when the p95 latency of the last window rises well above the
+    baseline. A Retry-After from the provider pauses all new calls to the model.
+    """
+
+    def __init__(self, model: str):
+        self.model = model
+        self.limit = min(max(CONCURRENCY_INITIAL, CONCURRENCY_MIN), CONCURRENCY_MAX)
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.increases = 0
+        self.decreases = 0
+        self.blocked_until = 0.0
+        self.last_decrease_at = 0.0
+        self.baseline_p95 = None
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._condition = None
+
+    def _get_condition(self) -> asyncio.Condition:
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    async def acquire(self) -> float:
+        """Waits for a free slot and returns the call's start time, to be passed to release()."""
+        condition = self._get_condition()
+        while True:
+            pause = self.blocked_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+                continue
+            async with condition:
+                if self.blocked_until > time.monotonic():
+                    continue
+                if self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    self.max_in_flight = max(self.max_in_flight, self.in_flight)
+                    return time.monotonic()
+                await condition.wait()
+
+    async def release(self, started_at: float, error: BaseException | None = None):
+        """
+        Frees the slot and feeds the outcome back into the limit. Calls that were already in
+        flight when the limit was last cut do not cut it again, so one burst of 429s
+        halves the limit once instead of collapsing it to the minimum.
+        """
+        condition = self._get_condition()
+        async with condition:
+            self.in_flight -= 1
+            if error is not None:
+                if is_overload_error(error):
+                    if started_at >= self.last_decrease_at:
+                        self._decrease(DECREASE_FACTOR, type(error).__name__)
+                    delay = retry_after_seconds(error)
+                    if delay is None and getattr(error, "status_code", None) == 429:
+                        delay = DEFAULT_RETRY_AFTER_SECONDS
+                    if delay is not None:
+                        self._pause(delay)
+            else:
+                self._on_success(time.monotonic() - started_at)
+            condition.notify_all()
+
+    def _on_success(self, latency_seconds: float):
+        self._latencies.append(latency_seconds)
+        if len(self._latencies) == LATENCY_WINDOW:
+            window_p95 = _percentile(self._latencies, 0.95)
+            self._latencies.clear()
+            if self.baseline_p95 is None:
+                self.baseline_p95 = window_p95
+            elif window_p95 > self.baseline_p95 * LATENCY_TOLERANCE:
+                self._decrease(LATENCY_DECREASE_FACTOR, f"p95 {window_p95:.1f}s vs baseline {self.baseline_p95:.1f}s")
+                return
+            else:
+                # Slow-moving baseline so that gradual provider changes are followed.
+                self.baseline_p95 = 0.9 * self.baseline_p95 + 0.1 * window_p95
+        if self.in_flight + 1 >= int(self.limit) and self.limit < CONCURRENCY_MAX:
+            # Only grow while the current limit is actually being used.
+            previous = int(self.limit)
+            self.limit = min(CONCURRENCY_MAX, self.limit + 1 / self.limit)
+            if int(self.limit) > previous:
+                self.increases += 1
+
+    def _decrease(self, factor: float, reason: str):
+        previous = self.limit
+        self.limit = max(CONCURRENCY_MIN, self.limit * factor)
+        self.decreases += 1
+        self.last_decrease_at = time.monotonic()
+        print(f"Concurrency for '{self.model}' reduced from {previous:.1f} to {self.limit:.1f} ({reason}).")
+
+    def _pause(self, seconds: float):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        print(f"Pausing new calls to '{self.model}' for {seconds:.1f}s (Retry-After).")
+
+    def stats(self) -> dict:
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "increases": self.increases,
+            "decreases": self.decreases,
+            "baseline_p95_seconds": round(self.baseline_p95, 2) if self.baseline_p95 is not None else None,
+        }
+
+
+class AdaptiveConcurrencyController:
+    """Holds one AdaptiveConcurrencyLimiter per model."""
+
+    def __init__(self):
+        self.limiters = {}
+
+    def for_model(self, model: str) -> AdaptiveConcurrencyLimiter:
+        if model not in self.limiters:
+            self.limiters[model] = AdaptiveConcurrencyLimiter(model)
+        return self.limiters[model]
+
+    def current_limits(self) -> dict:
+        """Current concurrency limit per model, e.g. for metrics export."""
+        return {model: limiter.limit for model, limiter in self.limiters.items()}
+
+    def stats(self) -> dict:
+        return {model: limiter.stats() for model, limiter in self.limiters.items()}
@@ -0,0 +1,216 @@
+import os
+import re
+
+from blog_sections import MD_HEADING_RE
+from tracing import traced
+
+# --- Local Content-Quality Gate ---
+# Checks a written post section by section without any LLM call: reading grade, coverage of
+# the keywords the plan assigned to the section, keyword density, keywords in the headings,
+# and links (source markers of the plan kept, not too many links). blog_post_generator.py
+# sends only the sections that fail back to the section writer, with the problems found, so
+# a weak draft costs a few section calls instead of a second full post.
+QUALITY_GATE_ENABLED = os.getenv("QUALITY_GATE", "1").strip().lower() not in ("0", "false", "no", "off")
+QUALITY_MAX_GRADE = float(os.getenv("QUALITY_MAX_GRADE", "9"))  # Flesch-Kincaid grade; the prompts ask for year 5, with headroom.
+QUALITY_MIN_KEYWORD_COVERAGE = float(os.getenv("QUALITY_MIN_KEYWORD_COVERAGE", "0.5"))  # Share of the section's keywords used.
+QUALITY_MAX_KEYWORD_DENSITY = float(os.getenv("QUALITY_MAX_KEYWORD_DENSITY", "3"))  # Percent of words, per keyword.
+QUALITY_MAX_LINKS_PER_SECTION = int(os.getenv("QUALITY_MAX_LINKS_PER_SECTION", "12"))
+QUALITY_MAX_REWRITES = int(os.getenv("QUALITY_MAX_REWRITES", "1"))  # Rewrite rounds for failing sections.
+# Share of failing sections above which the whole post is written again instead (single-pass mode).
+QUALITY_FULL_REWRITE_SHARE = float(os.getenv("QUALITY_FULL_REWRITE_SHARE", "0.75"))
+INTRO_WORDS = 100  # The primary keyword must appear within the first INTRO_WORDS words.
+MIN_WORDS_FOR_GRADE = 30
+
+MD_LINK_RE = re.compile(r"\[([^\]]*)\]\((https?://[^)\s]+)[^)]*\)")
+URL_RE = re.compile(r"https?://[^\s)\]>\"']+")
+WORD_RE = re.compile(r"[A-Za-z]+(?:'[A-Za-z]+)*|\d+(?:[.,]\d+)*")
+SENTENCE_END_RE = re.compile(r"[.!?]+(?=\s|$)")
+
+
+def parse_keywords(keywords: str) -> list[str]:
+    """The cluster's comma-separated keywords."""
+    return [keyword.strip() for keyword in (keywords or "").split(",") if keyword.strip()]
+
+
+def _keyword_pattern(keyword: str) -> re.Pattern:
+    # One extra word is allowed between the keyword's words ("dental cleaning in San Diego").
+    words = [re.escape(word) for word in re.findall(r"\w+", keyword.lower())]
+    return re.compile(r"\b" + r"\W+(?:\w+\W+)?".join(words) + r"\b")
+
+
+def count_keyword(text: str, keyword: str) -> int:
+    if not re.search(r"\w", keyword):
+        return 0
+    return len(_keyword_pattern(keyword).findall(text.lower()))
+
+
+def _url(url: str) -> str:
+    return url.rstrip(".,;:")
+
+
+def _plain_text(markdown: str) -> str:
+    """Section text without headings, link targets, source markers and Markdown markup."""
+    lines = []
+    for line in markdown.splitlines():
+        if MD_HEADING_RE.match(line.strip()):
+            continue
+        line = MD_LINK_RE.sub(r"\1", line)
+        line = re.sub(r"\s*-\s*source:\s*\S+", "", line)
+        line = URL_RE.sub("", line)
+        line = re.sub(r"^\s*(?:[-*+]|\d+[.)])\s+", "", line)
+        lines.append(re.sub(r"[*_`#>|]", " ", line))
+    return "\n".join(lines)
+
+
+def _syllables(word: str) -> int:
+    word = word.lower()
+    if word[0].isdigit():
+        return 1
+    groups = len(re.findall(r"[aeiouy]+", word))
+    if word.endswith("e") and not word.endswith(("le", "ee")) and groups > 1:
+        groups -= 1
+    return max(1, groups)
+
+
+def reading_grade(text: str) -> float | None:
+    """Flesch-Kincaid grade of the plain text, or None when it is too short to judge."""
+    words = WORD_RE.findall(text)
+    if len(words) < MIN_WORDS_FOR_GRADE:
+        return None
+    # A line without end punctuation (a bullet, a table row) still ends a sentence.
+    sentences = sum(max(1, len(SENTENCE_END_RE.findall(line))) for line in text.splitlines() if WORD_RE.search(line))
+    syllables = sum(_syllables(word) for word in words)
+    return round(0.39 * len(words) / sentences + 11.8 * syllables / len(words) - 15.59, 1)
+
+
+def _first_heading(markdown: str) -> tuple[int, str] | None:
+    for line in markdown.splitlines():
+        match = MD_HEADING_RE.match(line.strip())
+        if match:
+            return len(match.group(1)), match.group(2)
+    return None
+
+
+def assigned_keywords(plan_text: str, keywords: list[str]) -> list[str]:
+    """The cluster keywords the plan mentions for a section (not counting those only inside a longer keyword)."""
+    text = plan_text.lower()
+    found = set()
+    for keyword in sorted(keywords, key=len, reverse=True):
+        if re.search(r"\w", keyword) and _keyword_pattern(keyword).search(text):
+            found.add(keyword)
+            text = _keyword_pattern(keyword).sub(" | ", text)
+    return [keyword for keyword in keywords if keyword in found]
+
+
+def check_section(text: str, plan_text: str | None, keywords: list[str], primary_keyword: str, is_intro: bool = False) -> dict:
+    """
+    Measures one written section. `plan_text` is the section's part of the detailed plan
+    (None when the section has no matching plan section). Returns the measurements and
+    the list of problems, written as instructions for the writer.
+    """
+    plain = _plain_text(text)
+    words = len(WORD_RE.findall(plain))
+    problems = []
+
+    grade = reading_grade(plain)
+    if grade is not None and grade > QUALITY_MAX_GRADE:
+        problems.append(f"The reading level is grade {grade}; write for a year 5 reader (grade {QUALITY_MAX_GRADE:g} or lower) with shorter sentences and simpler words.")
+
+    expected = assigned_keywords(plan_text, keywords) if plan_text else []
+    if is_intro and primary_keyword and primary_keyword not in expected:
+        expected.insert(0, primary_keyword)
+    missing = [keyword for keyword in expected if not count_keyword(plain, keyword)]
+    coverage = round(1 - len(missing) / len(expected), 2) if expected else None
+    if coverage is not None and coverage < QUALITY_MIN_KEYWORD_COVERAGE:
+        problems.append(f"These keywords from the plan are missing: {', '.join(missing)}.")
+
+    densest, density = None, 0.0
+    for keyword in keywords:
+        count = count_keyword(plain, keyword)
+        if count > 1 and words and 100 * count / words > density:
+            densest, density = keyword, round(100 * count / words, 1)
+    if densest and density > QUALITY_MAX_KEYWORD_DENSITY:
+        allowed = max(1, int(words * QUALITY_MAX_KEYWORD_DENSITY / 100))
+        problems.append(f"The keyword '{densest}' makes up {density}% of the words; use it at most {allowed} times and use synonyms instead.")
+
+    heading = _first_heading(text)
+    heading_keyword = None
+    if is_intro and primary_keyword:
+        heading_keyword = heading is not None and heading[0] == 1 and count_keyword(heading[1], primary_keyword) > 0
+        if not heading_keyword:
+            problems.append(f"The H1 title must contain the primary keyword '{primary_keyword}'.")
+        if not count_keyword(" ".join(WORD_RE.findall(plain)[:INTRO_WORDS]), primary_keyword):
+            problems.append(f"Place the primary keyword '{primary_keyword}' within the first {INTRO_WORDS} words of the introduction.")
+    elif expected:
+        heading_keyword = heading is not None and any(count_keyword(heading[1], keyword) for keyword in expected)
+        if not heading_keyword:
+            problems.append(f"The section heading should contain one of its keywords: {', '.join(expected)}.")
+
+    links = len(MD_LINK_RE.findall(text)) + len(URL_RE.findall(MD_LINK_RE.sub("", text)))
+    found_urls = {_url(url) for url in URL_RE.findall(text)}
+    missing_sources = sorted({_url(url) for url in URL_RE.findall(plan_text or "")} - found_urls)
+    if missing_sources:
+        problems.append(f"Keep the ` - source: URL` markers of the plan; these sources are missing: {', '.join(missing_sources)}.")
+    if links > QUALITY_MAX_LINKS_PER_SECTION:
+        problems.append(f"The section has {links} links; keep at most {QUALITY_MAX_LINKS_PER_SECTION}.")
+
+    return {
+        "title": heading[1] if heading else "",
+        "words": words,
+        "grade": grade,
+        "keywords": expected,
+        "missing_keywords": missing,
+        "keyword_coverage": coverage,
+        "densest_keyword": densest,
+        "keyword_density": density,
+        "heading_keyword": heading_keyword,
+        "links": links,
+        "missing_sources": missing_sources,
+        "problems": problems,
+    }
+
+
+@traced("prompt")
+def check_sections(section_texts: list[str], plan_texts: list[str | None], keywords: str, primary_keyword: str) -> list[dict]:
+    """Checks every section of a post in one pass; the first section is the introduction."""
+    keyword_list = parse_keywords(keywords)
+    if primary_keyword and primary_keyword not in keyword_list:
+        keyword_list.append(primary_keyword)
+    return [check_section(text, plan_text, keyword_list, primary_keyword, is_intro=index == 0)
+            for index, (text, plan_text) in enumerate(zip(section_texts, plan_texts))]
+
+
+def match_plan_sections(draft_sections: list[dict], plan_sections: list[dict]) -> list[dict | None]:
+    """
+    The plan section of each draft section: by position when both have the same number of
+    sections, otherwise the plan section whose title shares the most words (None if none does).
+    """
+    if len(draft_sections) == len(plan_sections):
+        return list(plan_sections)
+
+    def _title_words(title: str) -> set:
+        return {word for word in re.findall(r"\w+", title.lower()) if len(word) > 2}
+
+    matches = []
+    for draft_section in draft_sections:
+        draft_words = _title_words(draft_section["title"])
+        scored = [(len(draft_words & _title_words(plan_section["title"])), index) for index, plan_section in enumerate(plan_sections)]
+        score, index = max(scored, default=(0, 0))
+        matches.append(plan_sections[index] if score else None)
+    return matches
+
+
+def format_report(reports: list[dict]) -> str:
+    lines = []
+    for index, report in enumerate(reports):
+        grade = "-" if report["grade"] is None else report["grade"]
+        coverage = "-" if report["keyword_coverage"] is None else f"{report['keyword_coverage']:.0%}"
+        status = "FAIL" if report["problems"] else "ok"
+        lines.append(f"  {index + 1:>2}. {status:<4} grade {grade}, keywords {coverage}, max density {report['keyword_density']}%, "
+                     f"{report['links']} links, {report['words']} words - {report['title'][:60]}")
+    return "\n".join(lines)
+
+
+def summarize(reports: list[dict]) -> str:
+    failed = sum(1 for report in reports if report["problems"])
+    return f"{failed} of {len(reports)} sections failed the quality gate"
@@ -0,0 +1,279 @@
+import os
+import time
+import signal
+import struct
+import asyncio
+import ctypes
+import ctypes.util
+import importlib
+from dotenv import load_dotenv
+
+import tracing
+from state_store import StateStore, TABLE_SPECS
+
+# --- Daemon Mode ---
+# Runs the pipeline continuously in one process: the scripts' modules, LLM clients, rate
+# limiter and concurrency limits stay loaded between runs. Changes to the input CSVs are
+# picked up through inotify (polling when inotify is not available) and each stage runs
+# whenever the state store has work for it. Only one stage runs at a time, downstream
+# stages first, so new URLs and clusters are not produced faster than they are consumed.
+DAEMON_STAGES = [s.strip() for s in os.getenv("DAEMON_STAGES", "analyzer,planner,generator").split(",") if s.strip()]
+DAEMON_POLL_SECONDS = float(os.getenv("DAEMON_POLL_SECONDS", "10"))  # Polling fallback interval.
+DAEMON_RESCAN_SECONDS = float(os.getenv("DAEMON_RESCAN_SECONDS", "300"))  # Periodic check, e.g. for expired leases.
+DAEMON_MAX_PENDING_CLUSTERS = int(os.getenv("DAEMON_MAX_PENDING_CLUSTERS", "20"))  # Planner pauses above this backlog.
+DAEMON_WATCH_MODE = os.getenv("DAEMON_WATCH_MODE", "auto").strip().lower()  # auto | inotify | poll
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+STATE_DB_PATH = os.path.join(SCRIPT_DIR, "seo_state.sqlite3")
+
+# Stage name -> script module and the state tables (and so CSV files) it takes its work from.
+STAGES = {
+    "generator": {"module": "blog_post_generator", "tables": ["clusters"]},
+    "planner": {"module": "keyword_planner", "tables": ["competitor_analysis", "clusters"]},
+    "analyzer": {"module": "analyzer", "tables": ["competitor_urls", "posted"]},
+}
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+INOTIFY_EVENT_HEADER = struct.Struct("iIII")
+
+
+class InotifyWatcher:
+    """Watches a directory with Linux inotify (through libc) and reports changed file names."""
+
+    def __init__(self, directory: str, on_change):
+        libc_name = ctypes.util.find_library("c")
+        if not libc_name:
+            raise OSError("libc not found")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self._libc, "inotify_init1"):
+            raise OSError("inotify is not available on this platform")
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        # The scripts replace CSV files atomically (IN_MOVED_TO); editors and Excel write in place (IN_CLOSE_WRITE).
+        if self._libc.inotify_add_watch(self._fd, os.fsencode(directory), IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+            os.close(self._fd)
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {directory}")
+        self._on_change = on_change
+
+    def start(self):
+        asyncio.get_running_loop().add_reader(self._fd, self._read_events)
+
+    def _read_events(self):
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset + INOTIFY_EVENT_HEADER.size <= len(data):
+            _, _, _, name_length = INOTIFY_EVENT_HEADER.unpack_from(data, offset)
+            offset += INOTIFY_EVENT_HEADER.size
+            name = data[offset:offset + name_length].rstrip(b"\0").decode("utf-8", "replace")
+            offset += name_length
+            if name:
+                self._on_change(name)
+
+    def stop(self):
+        asyncio.get_running_loop().remove_reader(self._fd)
+        os.close(self._fd)
+
+
+class PollingWatcher:
+    """Fallback watcher: compares the files' mtime and size every DAEMON_POLL_SECONDS."""
+
+    def __init__(self, directory: str, file_names: list[str], on_change):
+        self.directory = directory
+        self.file_names = file_names
+        self._on_change = on_change
+        self._task = None
+        self._fingerprints = {name: self._fingerprint(name) for name in file_names}
+
+    def _fingerprint(self, name: str):
+        try:
+            stat = os.stat(os.path.join(self.directory, name))
+            return stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
+
+    def start(self):
+        self._task = asyncio.create_task(self._poll())
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(DAEMON_POLL_SECONDS)
+            for name in self.file_names:
+                fingerprint = self._fingerprint(name)
+                if fingerprint != self._fingerprints[name]:
+                    self._fingerprints[name] = fingerprint
+                    self._on_change(name)
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+
+
+class PipelineDaemon:
+    def __init__(self, stages: list[str]):
+        unknown = [stage for stage in stages if stage not in STAGES]
+        if unknown:
+            raise ValueError(f"Unknown DAEMON_STAGES {unknown}; choose from {list(STAGES)}.")
+        # Downstream stages first: finishing clusters takes priority over planning new ones.
+        self.stages = [stage for stage in STAGES if stage in stages]
+        self.store = StateStore(STATE_DB_PATH, csv_dir=SCRIPT_DIR)
+        self.modules = {}
+        self.changed = asyncio.Event()
+        self.stopping = False
+        self.current_run = None
+        self.deferred_tables = set()  # CSVs edited while a stage was running, merged after the run.
+        # A stage whose last run made no progress (e.g. every pending URL failed) is not retried
+        # until one of its inputs changes or DAEMON_RESCAN_SECONDS have passed.
+        self.stalled_until = {}
+        self.runs = {stage: 0 for stage in self.stages}
+        self.analysis_rows_planned = len(self.store.rows("competitor_analysis"))
+
+    def _on_file_change(self, name: str):
+        tables = [table for table, spec in TABLE_SPECS.items() if spec["csv_name"] == name]
+        if not tables:
+            return
+        if self.current_run is not None:
+            # The running stage reads and exports its tables itself; merging here would race with it.
+            self.deferred_tables.add(tables[0])
+            return
+        self._sync_table(tables[0])
+        self.changed.set()
+
+    def _sync_table(self, table: str):
+        # CSV exports by the scripts themselves are already in the store; only a CSV edited by
+        # hand is merged here, and only that lifts a stage's stall.
+        if self.store.sync_from_csv(table):
+            for stage in self.stages:
+                if table in STAGES[stage]["tables"]:
+                    self.stalled_until.pop(stage, None)
+
+    def _sync_deferred_tables(self):
+        tables, self.deferred_tables = self.deferred_tables, set()
+        for table in sorted(tables):
+            self._sync_table(table)
+        if tables:
+            self.changed.set()
+
+    def _claimable_clusters(self) -> int:
+        leased = {lease["item_key"] for lease in self.store.active_leases("clusters")}
+        key_column = TABLE_SPECS["clusters"]["key"]
+        return sum(1 for row in self.store.rows("clusters", status_in=("no", "")) if row[key_column] not in leased)
+
+    def pending_work(self, stage: str) -> int:
+        """Number of items the stage would process now (0 when it has nothing to do or is held back)."""
+        for table in STAGES[stage]["tables"]:
+            self.store.sync_from_csv(table)
+        if stage == "generator":
+            return self._claimable_clusters()
+        if stage == "planner":
+            new_rows = len(self.store.rows("competitor_analysis")) - self.analysis_rows_planned
+            if new_rows > 0 and self._claimable_clusters() >= DAEMON_MAX_PENDING_CLUSTERS:
+                return 0  # Backpressure: the generator backlog is already large enough.
+            return max(0, new_rows)
+        return len(self.store.rows("competitor_urls", status_in=("no",))) + len(self.store.rows("posted", status_in=("no", "")))
+
+    def _module_for(self, stage: str):
+        if stage not in self.modules:
+            module = importlib.import_module(STAGES[stage]["module"])
+            # Runs share the daemon's state store instead of each opening (and leaking) its own;
+            # their agents and runners are kept by adk_store.get_runner between runs.
+            module.state_store = self.store
+            if stage == "generator":
+                # One cluster per run, so a shutdown request is honoured between clusters.
+                module.MAX_CLUSTERS_PER_RUN = 1
+            self.modules[stage] = module
+        return self.modules[stage]
+
+    def next_stage(self) -> tuple[str, int] | None:
+        now = time.monotonic()
+        for stage in self.stages:
+            if self.stalled_until.get(stage, 0) > now:
+                continue
+            pending = self.pending_work(stage)
+            if pending:
+                return stage, pending
+        return None
+
+    async def run_stage(self, stage: str, pending: int):
+        print(f"\n=== Daemon: running {stage} ({pending} pending) ===")
+        if stage == "planner":
+            self.analysis_rows_planned = len(self.store.rows("competitor_analysis"))
+        module = self._module_for(stage)
+        self.current_run = asyncio.create_task(module.main())
+        try:
+            with tracing.profiled(STAGES[stage]["module"]), tracing.span(STAGES[stage]["module"], "script"):
+                await self.current_run
+        except asyncio.CancelledError:
+            if not self.stopping:
+                raise
+            print(f"Daemon: {stage} run cancelled.")
+        except Exception as e:
+            print(f"Daemon: {stage} run failed: {e}")
+        finally:
+            self.current_run = None
+            tracing.write_trace(STAGES[stage]["module"])
+        self._sync_deferred_tables()
+        self.runs[stage] += 1
+        if stage != "planner" and self.pending_work(stage) >= pending:
+            print(f"Daemon: {stage} made no progress; retrying after an input change or in {DAEMON_RESCAN_SECONDS:.0f}s.")
+            self.stalled_until[stage] = time.monotonic() + DAEMON_RESCAN_SECONDS
+
+    def request_stop(self):
+        if self.stopping:
+            print("Daemon: second stop signal, cancelling the current run.")
+            if self.current_run:
+                self.current_run.cancel()
+            return
+        self.stopping = True
+        print("Daemon: stopping after the current run (send the signal again to cancel it).")
+        self.changed.set()
+
+    def _create_watcher(self):
+        watched = sorted({TABLE_SPECS[table]["csv_name"] for stage in self.stages for table in STAGES[stage]["tables"]})
+        if DAEMON_WATCH_MODE != "poll":
+            try:
+                watcher = InotifyWatcher(SCRIPT_DIR, self._on_file_change)
+                print(f"Daemon: watching {watched} with inotify.")
+                return watcher
+            except OSError as e:
+                if DAEMON_WATCH_MODE == "inotify":
+                    raise
+                print(f"Daemon: inotify unavailable ({e}); polling every {DAEMON_POLL_SECONDS:.0f}s.")
+        else:
+            print(f"Daemon: polling {watched} every {DAEMON_POLL_SECONDS:.0f}s.")
+        return PollingWatcher(SCRIPT_DIR, watched, self._on_file_change)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, self.request_stop)
+        watcher = self._create_watcher()
+        watcher.start()
+        print(f"Daemon started for stages {self.stages} (pid {os.getpid()}).")
+        try:
+            while not self.stopping:
+                self.changed.clear()
+                found = self.next_stage()
+                if found:
+                    await self.run_stage(*found)
+                    continue
+                try:
+                    await asyncio.wait_for(self.changed.wait(), timeout=DAEMON_RESCAN_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            watcher.stop()
+            self.store.close()
+        print(f"Daemon stopped. Runs per stage: {self.runs}")
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    if not os.getenv("OPENROUTER_API_KEY"):
+        print("Error: OPENROUTER_API_KEY not found in environment variables. Please set it in a .env file.")
+        exit(1)
+    asyncio.run(PipelineDaemon(DAEMON_STAGES).run())
@@ -0,0 +1,163 @@
+import os
+import json
+import time
+import asyncio
+from collections import deque
+
+import metrics
+
+# --- Configuration ---
+# HEDGE_STAGES lists the stages that may hedge, optionally with an alternate model for the
+# duplicate request, e.g. "OnlineResearchPerplexity,BlogWriter=openrouter/openai/gpt-4o".
+# Stage names are the agent names used in the scripts' logs (see llm_gateway.stage()).
+HEDGE_BUDGET_PERCENT = float(os.getenv("HEDGE_BUDGET_PERCENT", "10"))  # Max hedges as % of hedge-eligible calls.
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "0.95"))
+HEDGE_DEFAULT_DELAY_SECONDS = float(os.getenv("HEDGE_DEFAULT_DELAY_SECONDS", "180"))  # Used until enough samples exist.
+HEDGE_MIN_SAMPLES = 5
+LATENCY_HISTORY_SIZE = 50
+DEFAULT_LATENCY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".seo_cache", "stage_latencies.json")
+
+
+def _parse_hedge_stages(value: str) -> dict:
+    stages = {}
+    for item in value.split(","):
+        stage, _, alternate_model = item.strip().partition("=")
+        if stage.strip():
+            stages[stage.strip()] = alternate_model.strip() or None
+    return stages
+
+
+HEDGE_STAGES = _parse_hedge_stages(os.getenv("HEDGE_STAGES", ""))
+
+
+def _percentile(values, percentile: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(percentile * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class StageLatencyTracker:
+    """
+    Recent call latencies per stage, persisted to a small JSON file so that the hedge
+    delay of a stage is known on the next run. Each script runs a stage only a few times
+    per invocation, so an in-memory history alone would never reach HEDGE_MIN_SAMPLES.
+    """
+
+    def __init__(self, path: str = DEFAULT_LATENCY_PATH):
+        self.path = path
+        self.latencies = {}
+        for stage, values in self._read_file().items():
+            self.latencies[stage] = deque(values, maxlen=LATENCY_HISTORY_SIZE)
+
+    def _read_file(self) -> dict:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def record(self, stage: str, latency_seconds: float):
+        self.latencies.setdefault(stage, deque(maxlen=LATENCY_HISTORY_SIZE)).append(round(latency_seconds, 3))
+        # Merge with what other processes wrote since this file was loaded; last writer wins per stage.
+        data = self._read_file()
+        data[stage] = list(self.latencies[stage])
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            temp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            print(f"Warning: Could not save stage latencies to {self.path}: {e}")
+
+    def hedge_delay(self, stage: str) -> float:
+        values = self.latencies.get(stage)
+        if not values or len(values) < HEDGE_MIN_SAMPLES:
+            return HEDGE_DEFAULT_DELAY_SECONDS
+        return _percentile(values, HEDGE_PERCENTILE)
+
+
+class RequestHedger:
+    """
+    Sends a duplicate request when a call of a hedge-enabled stage is still running after
+    the stage's observed p95 latency, keeps whichever response arrives first and cancels
+    the other. Hedges are capped at HEDGE_BUDGET_PERCENT of the stage calls seen so far.
+    """
+
+    def __init__(self, latency_tracker: StageLatencyTracker | None = None):
+        self.tracker = latency_tracker or StageLatencyTracker()
+        self.eligible_calls = 0
+        self.hedges_fired = 0
+        self.hedges_won = 0
+        self.skipped_for_budget = 0
+
+    def is_enabled_for(self, stage: str | None) -> bool:
+        return stage is not None and stage in HEDGE_STAGES
+
+    def _budget_allows_hedge(self) -> bool:
+        # One hedge is always allowed so that a single slow call in a short run can still be hedged.
+        return self.hedges_fired < max(1, self.eligible_calls * HEDGE_BUDGET_PERCENT / 100)
+
+    async def call(self, stage: str, call_model, request_kwargs: dict):
+        """Runs call_model(request_kwargs), hedging it according to the stage's settings."""
+        self.eligible_calls += 1
+        start = time.monotonic()
+        primary = asyncio.ensure_future(call_model(request_kwargs))
+        delay = self.tracker.hedge_delay(stage)
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+        except asyncio.CancelledError:
+            primary.cancel()
+            raise
+        if done:
+            self.tracker.record(stage, time.monotonic() - start)
+            return primary.result()
+
+        if not self._budget_allows_hedge():
+            self.skipped_for_budget += 1
+            try:
+                return await primary
+            finally:
+                self.tracker.record(stage, time.monotonic() - start)
+
+        alternate_model = HEDGE_STAGES.get(stage) or request_kwargs.get("model")
+        print(f"Stage '{stage}' still running after {delay:.1f}s (p{HEDGE_PERCENTILE * 100:.0f}). "
+              f"Sending a hedged request to '{alternate_model}'.")
+        self.hedges_fired += 1
+        metrics.count("hedges")
+        hedge = asyncio.ensure_future(call_model({**request_kwargs, "model": alternate_model}))
+        pending = {primary, hedge}
+        winner = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                finished = [task for task in done if not task.cancelled() and task.exception() is None]
+                if finished:
+                    winner = finished[0]
+                    break
+            if winner is None:
+                # Both failed: surface the primary request's error.
+                return primary.result()
+        finally:
+            losers = [task for task in (primary, hedge) if not task.done()]
+            for task in losers:
+                task.cancel()
+            # Wait for the cancellation so the loser's concurrency slot is released before returning.
+            await asyncio.gather(*losers, return_exceptions=True)
+            # The primary's latency is censored when the hedge wins; record what was observed.
+            self.tracker.record(stage, time.monotonic() - start)
+
+        if winner is hedge:
+            self.hedges_won += 1
+            print(f"Hedged request for stage '{stage}' finished first.")
+        return winner.result()
+
+    def stats(self) -> dict:
+        return {
+            "eligible_calls": self.eligible_calls,
+            "hedges_fired": self.hedges_fired,
+            "hedges_won": self.hedges_won,
+            "hedge_win_rate": round(self.hedges_won / self.hedges_fired, 3) if self.hedges_fired else 0.0,
+            "skipped_for_budget": self.skipped_for_budget,
+        }
@@ -0,0 +1,359 @@
+import html
+import math
+import re
+from urllib.parse import urlparse
+
+from tracing import traced
+
+# --- Template Configuration ---
+# Mirrors the WordPress layout described in PROMPT_AGENT_6_HTML_CONVERSION and the
+# files already published from generated_blog_posts/.
+CONTAINER_STYLE = "background-color: #333333; color: #ffffff; font-family: Arial, sans-serif; line-height: 1.6; padding: 20px;"
+HEADING_STYLE = "border-bottom: 2px solid #00c2ff; padding-bottom: 5px; color: #ffffff;"
+READING_TIME_STYLE = "color: #ffffff; font-size: 20px !important;"
+STYLE_BLOCK_LINES = [
+    "<style>",
+    "    p, .wp-block-paragraph, ul.wp-block-list, li {",
+    "        color: #ffffff !important;",
+    "        font-size: 20px !important;",
+    "    }",
+    "    a {",
+    "        color: #00c2ff !important;",
+    "        text-decoration: underline !important;",
+    "    }",
+    "</style>",
+]
+SECTION_BREAK = "<br><br>"
+INDENT = "    "
+
+WORDS_PER_MINUTE = 200
+TOC_MAX_LEVEL = 2
+TOC_HEADING_TEXTS = {"table of contents", "table of content", "contents"}
+
+# --- Markdown Patterns ---
+HEADING_RE = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+BULLET_RE = re.compile(r"^(\s*)[-*+]\s+(.*)$")
+ORDERED_RE = re.compile(r"^(\s*)\d+[.)]\s+(.*)$")
+RULE_RE = re.compile(r"^\s*([-*_])(\s*\1){2,}\s*$")
+TABLE_SEPARATOR_RE = re.compile(r"^\s*\|?\s*:?-{3,}:?\s*(\|\s*:?-{3,}:?\s*)*\|?\s*$")
+READING_TIME_RE = re.compile(r"^\**\s*estimated reading time\s*:", re.IGNORECASE)
+
+URL_CHARS = r"[^\s\[\]()<>\"']+"
+MD_LINK_RE = re.compile(r"\[([^\]]+)\]\((https?://[^\s)]+)\)")
+SOURCE_MARKER_RE = re.compile(r"\s+-\s+source:\s*(https?://" + URL_CHARS + r")", re.IGNORECASE)
+BRACKET_URL_RE = re.compile(r"\s*\[(https?://" + URL_CHARS + r")\]")
+BARE_URL_RE = re.compile(r"(?<![\"'=>])(https?://" + URL_CHARS + r")")
+BOLD_RE = re.compile(r"\*\*(.+?)\*\*|__(.+?)__")
+ITALIC_RE = re.compile(r"(?<![*\w])\*(?!\s)(.+?)(?<!\s)\*(?![*\w])|(?<![_\w])_(?!\s)(.+?)(?<!\s)_(?![_\w])")
+CODE_RE = re.compile(r"`([^`]+)`")
+TRAILING_PUNCTUATION = ".,;:!?"
+
+
+def slugify(text: str) -> str:
+    """Builds a WordPress-style heading id (lowercase words joined by hyphens)."""
+    text = re.sub(r"<[^>]+>", "", text)
+    text = html.unescape(text).lower()
+    text = re.sub(r"[^a-z0-9\s-]", "", text)
+    text = re.sub(r"[\s-]+", "-", text).strip("-")
+    return text or "section"
+
+
+def _unique_slug(text: str, used_slugs: set) -> str:
+    base_slug = slugify(text)
+    slug = base_slug
+    counter = 2
+    while slug in used_slugs:
+        slug = f"{base_slug}-{counter}"
+        counter += 1
+    used_slugs.add(slug)
+    return slug
+
+
+def _split_trailing_punctuation(url: str) -> tuple[str, str]:
+    stripped = url.rstrip(TRAILING_PUNCTUATION)
+    return stripped, url[len(stripped):]
+
+
+def _source_label(url: str, source_titles: dict | None = None) -> str:
+    if source_titles and source_titles.get(url):
+        return source_titles[url]
+    host = urlparse(url).netloc.lower()
+    return host[4:] if host.startswith("www.") else (host or url)
+
+
+def _anchor(url: str, label: str) -> str:
+    return f'<a href="{html.escape(url, quote=True)}">{label}</a>'
+
+
+def render_inline(text: str, source_titles: dict | None = None) -> str:
+    """
+    Converts inline Markdown (bold, italics, code, links) to HTML.
+    Handles the citation formats produced earlier in the pipeline:
+    ` - source: URL` (research citations), `[URL]` (internal links from Agent 5),
+    `[text](URL)` Markdown links and bare URLs.
+    Research citations are labelled with source_titles[url] when known, else the domain.
+    """
+    placeholders = []
+
+    def _stash(fragment: str) -> str:
+        placeholders.append(fragment)
+        return f"\x00{len(placeholders) - 1}\x00"
+
+    def _md_link(match):
+        return _stash(_anchor(match.group(2), html.escape(match.group(1), quote=False)))
+
+    def _source_marker(match):
+        url, trailing = _split_trailing_punctuation(match.group(1))
+        return " - source: " + _stash(_anchor(url, html.escape(_source_label(url, source_titles), quote=False))) + trailing
+
+    def _bracket_url(match):
+        return " " + _stash(_anchor(match.group(1), "[source]"))
+
+    def _bare_url(match):
+        url, trailing = _split_trailing_punctuation(match.group(1))
+        return _stash(_anchor(url, html.escape(url, quote=False))) + trailing
+
+    def _code(match):
+        return _stash(f"<code>{html.escape(match.group(1), quote=False)}</code>")
+
+    text = CODE_RE.sub(_code, text)
+    text = MD_LINK_RE.sub(_md_link, text)
+    text = SOURCE_MARKER_RE.sub(_source_marker, text)
+    text = BRACKET_URL_RE.sub(_bracket_url, text)
+    text = BARE_URL_RE.sub(_bare_url, text)
+
+    text = html.escape(text, quote=False)
+    text = BOLD_RE.sub(lambda m: f"<strong>{m.group(1) or m.group(2)}</strong>", text)
+    text = ITALIC_RE.sub(lambda m: f"<em>{m.group(1) or m.group(2)}</em>", text)
+
+    return re.sub(r"\x00(\d+)\x00", lambda m: placeholders[int(m.group(1))], text)
+
+
+def _strip_inline_markup(text: str) -> str:
+    """Plain text of a heading or line (TOC labels, heading ids): link labels kept, URLs dropped."""
+    text = MD_LINK_RE.sub(r"\1", text)
+    text = SOURCE_MARKER_RE.sub("", text)
+    text = BRACKET_URL_RE.sub("", text)
+    text = BARE_URL_RE.sub("", text)
+    text = re.sub(r"[*_`]", "", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _split_table_row(line: str) -> list[str]:
+    return [cell.strip() for cell in line.strip().strip("|").split("|")]
+
+
+def _strip_code_fences(markdown_text: str) -> str:
+    stripped = markdown_text.strip()
+    fence_match = re.match(r"^```[a-zA-Z]*\n(.*)\n```$", stripped, re.DOTALL)
+    return fence_match.group(1) if fence_match else stripped
+
+
+def parse_markdown_blocks(markdown_text: str) -> list[dict]:
+    """
+    Splits the writer's Markdown into a flat list of blocks:
+    heading, paragraph, list, table, blockquote and reading_time.
+    """
+    blocks = []
+    paragraph_lines = []
+    lines = _strip_code_fences(markdown_text).replace("\r\n", "\n").split("\n")
+
+    def _flush_paragraph():
+        if paragraph_lines:
+            blocks.append({"type": "paragraph", "text": " ".join(paragraph_lines)})
+            paragraph_lines.clear()
+
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        stripped = line.strip()
+
+        if not stripped:
+            _flush_paragraph()
+            i += 1
+            continue
+
+        if RULE_RE.match(stripped):
+            _flush_paragraph()
+            i += 1
+            continue
+
+        heading_match = HEADING_RE.match(stripped)
+        if heading_match:
+            _flush_paragraph()
+            blocks.append({"type": "heading", "level": len(heading_match.group(1)), "text": heading_match.group(2)})
+            i += 1
+            continue
+
+        if READING_TIME_RE.match(stripped):
+            _flush_paragraph()
+            blocks.append({"type": "reading_time", "text": _strip_inline_markup(stripped)})
+            i += 1
+            continue
+
+        bullet_match = BULLET_RE.match(line)
+        ordered_match = ORDERED_RE.match(line)
+        if bullet_match or ordered_match:
+            _flush_paragraph()
+            ordered = bool(ordered_match) and not bullet_match
+            items = []
+            while i < len(lines):
+                item_line = lines[i]
+                item_match = ORDERED_RE.match(item_line) if ordered else BULLET_RE.match(item_line)
+                if item_match:
+                    items.append(item_match.group(2).strip())
+                elif item_line.strip() and items and item_line.startswith((" ", "\t")):
+                    items[-1] += " " + item_line.strip()
+                else:
+                    break
+                i += 1
+            blocks.append({"type": "list", "ordered": ordered, "items": items})
+            continue
+
+        if stripped.startswith("|") and i + 1 < len(lines) and TABLE_SEPARATOR_RE.match(lines[i + 1]):
+            _flush_paragraph()
+            header = _split_table_row(stripped)
+            rows = []
+            i += 2
+            while i < len(lines) and lines[i].strip().startswith("|"):
+                rows.append(_split_table_row(lines[i]))
+                i += 1
+            blocks.append({"type": "table", "header": header, "rows": rows})
+            continue
+
+        if stripped.startswith(">"):
+            _flush_paragraph()
+            quote_lines = []
+            while i < len(lines) and lines[i].strip().startswith(">"):
+                quote_lines.append(lines[i].strip().lstrip(">").strip())
+                i += 1
+            blocks.append({"type": "blockquote", "text": " ".join(q for q in quote_lines if q)})
+            continue
+
+        paragraph_lines.append(stripped)
+        i += 1
+
+    _flush_paragraph()
+    return blocks
+
+
+def _drop_existing_toc(blocks: list[dict]) -> list[dict]:
+    """Removes a writer-supplied table of contents; a linked one is generated instead."""
+    result = []
+    skipping_level = None
+    for block in blocks:
+        if block["type"] == "heading":
+            if skipping_level is not None and block["level"] <= skipping_level:
+                skipping_level = None
+            if _strip_inline_markup(block["text"]).lower().rstrip(":") in TOC_HEADING_TEXTS:
+                skipping_level = block["level"]
+                continue
+        if skipping_level is None:
+            result.append(block)
+    return result
+
+
+def estimate_reading_time(markdown_text: str) -> int:
+    word_count = len(re.findall(r"\w+", re.sub(r"https?://\S+", "", markdown_text)))
+    return max(1, math.ceil(word_count / WORDS_PER_MINUTE))
+
+
+def _render_heading(block: dict, source_titles: dict | None) -> str:
+    return (
+        f'<h{block["level"]} id="{block["id"]}" class="wp-block-heading" style="{HEADING_STYLE}">'
+        f'{render_inline(block["text"], source_titles)}</h{block["level"]}>'
+    )
+
+
+def _render_list(block: dict, item_indent: str, source_titles: dict | None) -> list[str]:
+    tag = "ol" if block["ordered"] else "ul"
+    lines = [f'<{tag} class="wp-block-list">']
+    lines.extend(f"{item_indent}<li>{render_inline(item, source_titles)}</li>" for item in block["items"])
+    lines.append(f"</{tag}>")
+    return lines
+
+
+def _render_table(block: dict, source_titles: dict | None) -> list[str]:
+    lines = ['<figure class="wp-block-table"><table>', f"{INDENT}<thead><tr>"]
+    lines.extend(f"{INDENT * 2}<th>{render_inline(cell, source_titles)}</th>" for cell in block["header"])
+    lines.append(f"{INDENT}</tr></thead>")
+    lines.append(f"{INDENT}<tbody>")
+    for row in block["rows"]:
+        cells = "".join(f"<td>{render_inline(cell, source_titles)}</td>" for cell in row)
+        lines.append(f"{INDENT * 2}<tr>{cells}</tr>")
+    lines.append(f"{INDENT}</tbody>")
+    lines.append("</table></figure>")
+    return lines
+
+
+def _render_toc(headings: list[dict]) -> list[str]:
+    lines = [
+        '<div class="wp-block-yoast-seo-table-of-contents yoast-table-of-contents">',
+        f'{INDENT}<h2 style="{HEADING_STYLE}">Table of contents</h2>',
+        f"{INDENT}<ul>",
+    ]
+    for heading in headings:
+        label = html.escape(_strip_inline_markup(heading["text"]), quote=False)
+        lines.append(f'{INDENT * 2}<li><a href="#{heading["id"]}" data-level="{heading["level"]}">{label}</a></li>')
+    lines.append(f"{INDENT}</ul>")
+    lines.append("</div>")
+    return lines
+
+
+@traced("render")
+def render_blog_post_html(markdown_text: str, include_toc: bool = True, source_titles: dict | None = None) -> str:
+    """
+    Renders the final Markdown blog post (with research and internal-link URLs)
+    into the WordPress HTML template that Agent 6 used to produce.
+    source_titles optionally maps research URLs to the link text shown for them.
+    Raises ValueError if the input has no renderable content.
+    """
+    if not markdown_text or not markdown_text.strip():
+        raise ValueError("Cannot render an empty blog post.")
+
+    blocks = _drop_existing_toc(parse_markdown_blocks(markdown_text))
+    if not blocks:
+        raise ValueError("No renderable Markdown blocks found in blog post.")
+
+    used_slugs = set()
+    for block in blocks:
+        if block["type"] == "heading":
+            block["id"] = _unique_slug(_strip_inline_markup(block["text"]), used_slugs)
+
+    if not any(block["type"] == "reading_time" for block in blocks):
+        minutes = estimate_reading_time(markdown_text)
+        reading_time_block = {"type": "reading_time", "text": f"Estimated reading time: {minutes} minute{'s' if minutes != 1 else ''}"}
+        insert_at = 1 if blocks[0]["type"] == "heading" and blocks[0]["level"] == 1 else 0
+        blocks.insert(insert_at, reading_time_block)
+
+    toc_headings = [b for b in blocks if b["type"] == "heading" and b["level"] <= TOC_MAX_LEVEL]
+    if include_toc and len(toc_headings) > 1:
+        reading_time_index = next(i for i, b in enumerate(blocks) if b["type"] == "reading_time")
+        blocks.insert(reading_time_index + 1, {"type": "toc", "headings": toc_headings})
+
+    rendered_blocks = []
+    for block in blocks:
+        block_type = block["type"]
+        if block_type == "heading":
+            rendered_blocks.append([_render_heading(block, source_titles)])
+        elif block_type == "reading_time":
+            rendered_blocks.append([f'<p class="estimated-reading-time" style="{READING_TIME_STYLE}">{html.escape(block["text"], quote=False)}</p>'])
+        elif block_type == "toc":
+            rendered_blocks.append(_render_toc(block["headings"]))
+        elif block_type == "list":
+            rendered_blocks.append(_render_list(block, INDENT, source_titles))
+        elif block_type == "table":
+            rendered_blocks.append(_render_table(block, source_titles))
+        elif block_type == "blockquote":
+            rendered_blocks.append([f"<blockquote><p>{render_inline(block['text'], source_titles)}</p></blockquote>"])
+        else:
+            rendered_blocks.append([f"<p>{render_inline(block['text'], source_titles)}</p>"])
+
+    output_lines = [f'<div style="{CONTAINER_STYLE}">']
+    output_lines.extend(INDENT + line for line in STYLE_BLOCK_LINES)
+    for index, block_lines in enumerate(rendered_blocks):
+        if index > 0:
+            output_lines.append(INDENT + SECTION_BREAK)
+        output_lines.extend(INDENT + line for line in block_lines)
+    output_lines.append("</div>")
+    return "\n".join(output_lines)
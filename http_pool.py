@@ -0,0 +1,108 @@
+import os
+import asyncio
+import importlib.util
+
+import httpx
+
+# --- Shared HTTP Connection Pool ---
+# One pooled, keep-alive httpx.AsyncClient per process, used by every LLM call and by the
+# analyzer's page fetches. OpenRouter calls (direct and from ADK agents) get it through
+# llm_gateway as LiteLLM's HTTP handler, calls LiteLLM makes with the OpenAI SDK get it as
+# litellm.aclient_session, and llm_batch.py's batch jobs use it directly. Connections and
+# TLS sessions are kept open between calls instead of being set up again, and HTTP/2 is
+# used where the server supports it (needs the h2 package), so concurrent calls to one
+# provider share a few connections. get_stats() reports how many requests reused an open
+# connection.
+HTTP_POOL_ENABLED = os.getenv("HTTP_POOL", "1").strip().lower() not in ("0", "false", "no", "off")
+HTTP_POOL_MAX_CONNECTIONS = int(os.getenv("HTTP_POOL_MAX_CONNECTIONS", "100"))
+HTTP_POOL_MAX_KEEPALIVE = int(os.getenv("HTTP_POOL_MAX_KEEPALIVE", "40"))
+HTTP_POOL_KEEPALIVE_SECONDS = float(os.getenv("HTTP_POOL_KEEPALIVE_SECONDS", "120"))
+HTTP_POOL_HTTP2 = os.getenv("HTTP_POOL_HTTP2", "1").strip().lower() not in ("0", "false", "no", "off")
+HTTP_CONNECT_TIMEOUT_SECONDS = float(os.getenv("HTTP_CONNECT_TIMEOUT_SECONDS", "10"))
+HTTP_READ_TIMEOUT_SECONDS = float(os.getenv("HTTP_READ_TIMEOUT_SECONDS", "600"))  # Long generations stream nothing for minutes.
+
+_client = None
+_client_loop = None
+_handler = None
+_stats = {"requests": 0, "new_connections": 0, "tls_handshakes": 0, "http2_responses": 0, "clients_created": 0}
+
+
+async def _trace(event_name: str, info: dict):
+    # httpcore trace events of the connection that serves the request.
+    if event_name == "connection.connect_tcp.complete":
+        _stats["new_connections"] += 1
+    elif event_name == "connection.start_tls.complete":
+        _stats["tls_handshakes"] += 1
+
+
+async def _on_request(request: httpx.Request):
+    _stats["requests"] += 1
+    request.extensions["trace"] = _trace
+
+
+async def _on_response(response: httpx.Response):
+    if response.http_version == "HTTP/2":
+        _stats["http2_responses"] += 1
+
+
+def http2_available() -> bool:
+    return HTTP_POOL_HTTP2 and importlib.util.find_spec("h2") is not None
+
+
+def get_client() -> httpx.AsyncClient:
+    """
+    The pooled client of the running event loop. A client is tied to the loop it was created
+    in, so a new one is created if a process runs a second event loop.
+    """
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client_loop is not loop or _client.is_closed:
+        _client = httpx.AsyncClient(
+            http2=http2_available(),
+            limits=httpx.Limits(max_connections=HTTP_POOL_MAX_CONNECTIONS, max_keepalive_connections=HTTP_POOL_MAX_KEEPALIVE,
+                                keepalive_expiry=HTTP_POOL_KEEPALIVE_SECONDS),
+            timeout=httpx.Timeout(HTTP_READ_TIMEOUT_SECONDS, connect=HTTP_CONNECT_TIMEOUT_SECONDS),
+            follow_redirects=True,
+            event_hooks={"request": [_on_request], "response": [_on_response]},
+        )
+        _client_loop = loop
+        _stats["clients_created"] += 1
+    return _client
+
+
+def install():
+    """Makes LiteLLM send its requests through the pooled client (called by llm_gateway.configure)."""
+    if not HTTP_POOL_ENABLED:
+        return
+    import litellm
+
+    litellm.aclient_session = get_client()
+
+
+def litellm_handler():
+    """LiteLLM's AsyncHTTPHandler around the pooled client, passed as `client` to OpenRouter calls."""
+    from litellm.llms.custom_httpx.http_handler import AsyncHTTPHandler
+
+    global _handler
+    client = get_client()
+    if _handler is None or _handler.client is not client:
+        _handler = AsyncHTTPHandler(timeout=client.timeout)
+        _handler.client = client
+    return _handler
+
+
+async def aclose():
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
+
+
+def get_stats() -> dict:
+    reused = max(0, _stats["requests"] - _stats["new_connections"])
+    return {
+        **_stats,
+        "reused_connections": reused,
+        "reuse_rate": round(reused / _stats["requests"], 3) if _stats["requests"] else 0.0,
+        "http2": http2_available(),
+    }
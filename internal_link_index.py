@@ -0,0 +1,233 @@
+import os
+import csv
+import json
+import math
+import re
+import sys
+import time
+import hashlib
+from collections import Counter
+
+# --- Configuration ---
+INDEX_VERSION = 1
+DEFAULT_TOP_K = 8
+SUMMARY_CHAR_LIMIT = 600
+CHARS_PER_TOKEN_ESTIMATE = 4
+
+# BM25 parameters and per-field weights (a field's tokens are counted `weight` times).
+BM25_K1 = 1.5
+BM25_B = 0.75
+FIELD_WEIGHTS = {"Topic": 3, "Keywords": 3, "Summary": 1}
+
+REQUIRED_POSTED_HEADERS = ["Topic", "Keywords", "Summary", "URL", "Analysed"]
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = {
+    "a", "about", "after", "all", "also", "an", "and", "any", "are", "as", "at", "be", "because", "been",
+    "before", "being", "between", "both", "but", "by", "can", "could", "do", "does", "for", "from", "has",
+    "have", "how", "if", "in", "into", "is", "it", "its", "may", "more", "most", "not", "of", "on", "or",
+    "other", "our", "out", "over", "should", "so", "such", "than", "that", "the", "their", "them", "then",
+    "there", "these", "they", "this", "those", "through", "to", "up", "use", "was", "we", "what", "when",
+    "which", "while", "who", "why", "will", "with", "you", "your", "br", "http", "https", "www", "com",
+}
+
+
+def tokenize(text: str) -> list[str]:
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS and len(t) > 1]
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate used for prompt-size reporting (about 4 characters per token)."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN_ESTIMATE)
+
+
+def format_posted_entry(entry: dict) -> str:
+    """Formats one Posted.csv row the way the Agent 5 prompt expects it."""
+    summary = entry.get("Summary", "N/A").replace('\n', ' ')
+    if len(summary) > SUMMARY_CHAR_LIMIT:
+        summary = summary[:SUMMARY_CHAR_LIMIT].rsplit(' ', 1)[0] + " ..."
+    return f"- URL: {entry['URL']}\n  Topic: {entry.get('Topic', 'N/A')}\n  Keywords: {entry.get('Keywords', 'N/A')}\n  Summary: {summary}\n"
+
+
+def _file_fingerprint(csv_path: str) -> dict:
+    stat = os.stat(csv_path)
+    with open(csv_path, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    return {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "sha256": digest}
+
+
+class InternalLinkIndex:
+    """
+    BM25 index over the analysed rows of Posted.csv (Topic, Keywords and Summary).
+    The index is persisted as JSON and rebuilt only when Posted.csv changes
+    (checked by mtime/size first, then by content hash).
+    """
+
+    def __init__(self, posted_csv_path: str, index_path: str):
+        self.posted_csv_path = posted_csv_path
+        self.index_path = index_path
+        self.documents = []
+        self.doc_term_freqs = []
+        self.doc_lengths = []
+        self.postings = {}
+        self.avg_doc_length = 0.0
+        self.fingerprint = None
+        self.loaded_from_disk = False
+
+    # --- Building and persistence ---
+    def load_or_build(self) -> "InternalLinkIndex":
+        current_fingerprint = None
+        stored = self._read_index_file()
+        if stored:
+            stored_fp = stored.get("fingerprint", {})
+            stat = os.stat(self.posted_csv_path)
+            if stored_fp.get("mtime_ns") == stat.st_mtime_ns and stored_fp.get("size") == stat.st_size:
+                self._load_state(stored)
+                self.loaded_from_disk = True
+                return self
+            current_fingerprint = _file_fingerprint(self.posted_csv_path)
+            if stored_fp.get("sha256") == current_fingerprint["sha256"]:
+                self._load_state(stored)
+                self.fingerprint = current_fingerprint
+                self.loaded_from_disk = True
+                self._write_index_file()
+                return self
+
+        self.build(current_fingerprint)
+        self._write_index_file()
+        return self
+
+    def build(self, fingerprint: dict | None = None):
+        self.fingerprint = fingerprint or _file_fingerprint(self.posted_csv_path)
+        self.documents = []
+        with open(self.posted_csv_path, 'r', newline='', encoding='utf-8') as csvfile:
+            reader = csv.DictReader(csvfile)
+            if not reader.fieldnames or not all(h in reader.fieldnames for h in REQUIRED_POSTED_HEADERS):
+                raise ValueError(f"{self.posted_csv_path} is missing required headers. Expected: {REQUIRED_POSTED_HEADERS}. Found: {reader.fieldnames}")
+            for row in reader:
+                url = row.get("URL", "").strip()
+                if url and row.get("Analysed", "").strip().lower() == 'yes':
+                    self.documents.append({
+                        "URL": url,
+                        "Topic": row.get("Topic", "N/A"),
+                        "Keywords": row.get("Keywords", "N/A"),
+                        "Summary": row.get("Summary", "N/A"),
+                    })
+
+        self.doc_term_freqs = []
+        self.doc_lengths = []
+        self.postings = {}
+        for doc_id, doc in enumerate(self.documents):
+            term_freqs = Counter()
+            for field, weight in FIELD_WEIGHTS.items():
+                for token in tokenize(doc.get(field, "")):
+                    term_freqs[token] += weight
+            self.doc_term_freqs.append(dict(term_freqs))
+            self.doc_lengths.append(sum(term_freqs.values()))
+            for term in term_freqs:
+                self.postings.setdefault(term, []).append(doc_id)
+        self.avg_doc_length = (sum(self.doc_lengths) / len(self.doc_lengths)) if self.doc_lengths else 0.0
+
+    def _load_state(self, stored: dict):
+        self.fingerprint = stored["fingerprint"]
+        self.documents = stored["documents"]
+        self.doc_term_freqs = stored["doc_term_freqs"]
+        self.doc_lengths = stored["doc_lengths"]
+        self.avg_doc_length = stored["avg_doc_length"]
+        self.postings = {}
+        for doc_id, term_freqs in enumerate(self.doc_term_freqs):
+            for term in term_freqs:
+                self.postings.setdefault(term, []).append(doc_id)
+
+    def _read_index_file(self) -> dict | None:
+        if not os.path.exists(self.index_path):
+            return None
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+            if stored.get("version") != INDEX_VERSION or stored.get("posted_csv_path") != os.path.abspath(self.posted_csv_path):
+                return None
+            return stored
+        except (OSError, ValueError) as e:
+            print(f"Warning: Could not read internal link index '{self.index_path}': {e}. Rebuilding.")
+            return None
+
+    def _write_index_file(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.index_path)), exist_ok=True)
+        temp_path = self.index_path + ".tmp"
+        payload = {
+            "version": INDEX_VERSION,
+            "posted_csv_path": os.path.abspath(self.posted_csv_path),
+            "fingerprint": self.fingerprint,
+            "documents": self.documents,
+            "doc_term_freqs": self.doc_term_freqs,
+            "doc_lengths": self.doc_lengths,
+            "avg_doc_length": self.avg_doc_length,
+        }
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(payload, f)
+        os.replace(temp_path, self.index_path)
+
+    # --- Querying ---
+    def search(self, query_text: str, top_k: int = DEFAULT_TOP_K) -> list[tuple[float, dict]]:
+        """Returns up to top_k (score, document) pairs ranked by BM25 against query_text."""
+        if not self.documents or top_k <= 0:
+            return []
+        doc_count = len(self.documents)
+        avg_doc_length = self.avg_doc_length or 1.0
+        scores = {}
+        for term in set(tokenize(query_text)):
+            doc_ids = self.postings.get(term)
+            if not doc_ids:
+                continue
+            idf = math.log(1 + (doc_count - len(doc_ids) + 0.5) / (len(doc_ids) + 0.5))
+            for doc_id in doc_ids:
+                tf = self.doc_term_freqs[doc_id][term]
+                length_norm = 1 - BM25_B + BM25_B * (self.doc_lengths[doc_id] / avg_doc_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * (tf * (BM25_K1 + 1)) / (tf + BM25_K1 * length_norm)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        return [(score, self.documents[doc_id]) for doc_id, score in ranked]
+
+
+def prompt_size_report(index: InternalLinkIndex, query_text: str, top_k: int = DEFAULT_TOP_K) -> dict:
+    """Compares the Agent 5 linking-data size and assembly time for the full dump vs. top-k retrieval."""
+    start = time.perf_counter()
+    full_text = "\n".join(
+        f"- URL: {d['URL']}\n  Topic: {d['Topic']}\n  Keywords: {d['Keywords']}\n  Summary: {d['Summary'].replace(chr(10), ' ')}\n"
+        for d in index.documents
+    )
+    full_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    selected_text = "\n".join(format_posted_entry(doc) for _, doc in index.search(query_text, top_k))
+    top_k_ms = (time.perf_counter() - start) * 1000
+
+    return {
+        "posts_indexed": len(index.documents),
+        "posts_selected": min(top_k, len(index.documents)),
+        "full_dump_tokens": estimate_tokens(full_text),
+        "top_k_tokens": estimate_tokens(selected_text),
+        "full_dump_ms": round(full_ms, 3),
+        "top_k_ms": round(top_k_ms, 3),
+    }
+
+
+if __name__ == "__main__":
+    # Usage: python internal_link_index.py [draft_file_or_query_text] [top_k]
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    posted_csv = os.path.join(script_dir, "Posted.csv")
+    index_file = os.path.join(script_dir, ".seo_cache", "internal_link_index.json")
+
+    query_arg = sys.argv[1] if len(sys.argv) > 1 else "dental cleaning San Diego"
+    if os.path.isfile(query_arg):
+        with open(query_arg, 'r', encoding='utf-8') as f:
+            query_arg = f.read()
+    k = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_TOP_K
+
+    load_start = time.perf_counter()
+    link_index = InternalLinkIndex(posted_csv, index_file).load_or_build()
+    load_ms = (time.perf_counter() - load_start) * 1000
+    print(f"Index {'loaded from disk' if link_index.loaded_from_disk else 'built'} in {load_ms:.1f} ms ({len(link_index.documents)} posts).")
+    for result_score, result_doc in link_index.search(query_arg, k):
+        print(f"{result_score:7.3f}  {result_doc['Topic']}  ->  {result_doc['URL']}")
+    print(json.dumps(prompt_size_report(link_index, query_arg, k), indent=2))
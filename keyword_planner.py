@@ -1,5 +1,4 @@
 import os
-import asyncio
 import csv
 import re
 from collections import Counter
@@ -9,21 +8,25 @@ import litellm
 from google.adk.agents import Agent
 from google.adk.models.lite_llm import LiteLlm
 from google.adk.runners import Runner
-from google.adk.sessions import InMemorySessionService
-from google.adk.artifacts.in_memory_artifact_service import InMemoryArtifactService
 from google.genai import types as genai_types
 
+import llm_gateway
+from llm_gateway import PipelineLiteLLMClient
+from adk_store import get_runner
+from state_store import StateStore
+import tracing
+from tracing import traced
+
 # --- Configuration ---
 load_dotenv()
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 
-if not OPENROUTER_API_KEY:
-    print("Error: OPENROUTER_API_KEY not found in environment variables. Please set it in a .env file.")
-    exit(1)
-
 BASE_FILE_PATH = "."
 COMPETITOR_ANALYSIS_CSV_PATH = os.path.join(BASE_FILE_PATH, "Competitor Analysis.csv")
 CLUSTERS_CSV_PATH = os.path.join(BASE_FILE_PATH, "Clusters.csv")
+STATE_DB_PATH = os.path.join(BASE_FILE_PATH, "seo_state.sqlite3")
+
+state_store = None  # StateStore opened in main()
 
 CLUSTER_CSV_HEADERS = ["Cluster", "Intent", "Keywords", "Primary Keyword", "Completed"]
 
@@ -58,23 +61,19 @@ Create the keyword plan in desired format.
 
 # --- Helper Functions ---
 
+@traced("csv")
 def get_top_competitor_keywords(top_n=5) -> list[str]:
-    """Reads Competitor Analysis.csv and returns the top N most frequent unique keywords."""
+    """Returns the top N most frequent unique keywords of the competitor analysis."""
     all_keywords_flat = []
     try:
-        with open(COMPETITOR_ANALYSIS_CSV_PATH, 'r', newline='', encoding='utf-8') as csvfile:
-            reader = csv.DictReader(csvfile)
-            if "Keywords" not in reader.fieldnames:
-                print(f"Warning: 'Keywords' column not found in {COMPETITOR_ANALYSIS_CSV_PATH}. Cannot extract competitor keywords.")
-                return []
-            for row in reader:
-                keywords_str = row.get("Keywords", "")
-                if keywords_str:
-                    keywords_list = [kw.strip() for kw in keywords_str.split(',') if kw.strip()]
-                    all_keywords_flat.extend(keywords_list)
+        for row in state_store.rows("competitor_analysis"):
+            keywords_str = row.get("Keywords", "")
+            if keywords_str:
+                keywords_list = [kw.strip() for kw in keywords_str.split(',') if kw.strip()]
+                all_keywords_flat.extend(keywords_list)
 
         if not all_keywords_flat:
-            print(f"No keywords found in {COMPETITOR_ANALYSIS_CSV_PATH}.")
+            print(f"No keywords found in the competitor analysis ({COMPETITOR_ANALYSIS_CSV_PATH}).")
             return []
 
         keyword_counts = Counter(all_keywords_flat)
@@ -82,11 +81,8 @@ def get_top_competitor_keywords(top_n=5) -> list[str]:
         print(f"Top {len(most_common_keywords)} competitor keywords found: {most_common_keywords}")
         return most_common_keywords
 
-    except FileNotFoundError:
-        print(f"Error: {COMPETITOR_ANALYSIS_CSV_PATH} not found. Cannot extract competitor keywords.")
-        return []
     except Exception as e:
-        print(f"Error reading competitor keywords from {COMPETITOR_ANALYSIS_CSV_PATH}: {e}")
+        print(f"Error reading competitor keywords from the state store: {e}")
         return []
 
 def initialize_clusters_csv():
@@ -103,29 +99,27 @@ def initialize_clusters_csv():
     else:
         print(f"{CLUSTERS_CSV_PATH} already exists.")
 
-def write_clusters_to_csv(cluster_data_list: list[dict]):
-    """Appends a list of cluster data dictionaries to Clusters.csv."""
+@traced("csv")
+def write_clusters(cluster_data_list: list[dict]):
+    """Appends a list of cluster data dictionaries to the clusters table and refreshes Clusters.csv."""
     if not cluster_data_list:
         print("No cluster data to write.")
         return
 
     try:
-        with open(CLUSTERS_CSV_PATH, 'a', newline='', encoding='utf-8') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=CLUSTER_CSV_HEADERS)
-            if os.path.getsize(CLUSTERS_CSV_PATH) <= len(",".join(CLUSTER_CSV_HEADERS)) + 5:
-                 pass
-
-            for cluster_dict in cluster_data_list:
-                row_to_write = {header: cluster_dict.get(header, "") for header in CLUSTER_CSV_HEADERS}
-                if "Completed" not in cluster_dict:
-                    row_to_write["Completed"] = ""
-                writer.writerow(row_to_write)
-        print(f"Successfully wrote {len(cluster_data_list)} rows to {CLUSTERS_CSV_PATH}")
-    except IOError as e:
-        print(f"Error writing to {CLUSTERS_CSV_PATH}: {e}")
+        rows_to_write = []
+        for cluster_dict in cluster_data_list:
+            row_to_write = {header: cluster_dict.get(header, "") for header in CLUSTER_CSV_HEADERS}
+            if "Completed" not in cluster_dict:
+                row_to_write["Completed"] = ""
+            rows_to_write.append(row_to_write)
+        state_store.append("clusters", rows_to_write)
+        print(f"Successfully saved {len(cluster_data_list)} clusters.")
+        state_store.export_tables(["clusters"])
     except Exception as e:
-        print(f"An unexpected error occurred while writing to {CLUSTERS_CSV_PATH}: {e}")
+        print(f"An unexpected error occurred while saving clusters to {CLUSTERS_CSV_PATH}: {e}")
 
+@traced("parse")
 def parse_llm_table_output(markdown_table: str) -> list[dict]:
     """Parses the LLM's markdown table output into a list of dictionaries."""
     parsed_data = []
@@ -176,16 +170,17 @@ async def run_llm_prompt(runner: Runner, session_id: str, full_prompt_text: str,
     print(f"\nRunning prompt for agent '{agent_name}'...")
     
     try:
-        async for event in runner.run_async(session_id=session_id, user_id='keyword_planner_user', new_message=content):
-            if event.is_final_response():
-                if event.content and event.content.parts:
-                    agent_final_text = event.content.parts[0].text
-                elif event.actions and event.actions.escalate and event.error_message:
-                    agent_final_text = f"Agent escalated with error: {event.error_message}"
-                    print(f"Error: Agent '{agent_name}' escalated: {event.error_message}")
-                else:
-                    print(f"Warning: Final response from agent '{agent_name}' had no parsable content. Event: {event}")
-                break
+        with llm_gateway.stage(agent_name), tracing.span(agent_name, "agent"):
+            async for event in runner.run_async(session_id=session_id, user_id='keyword_planner_user', new_message=content):
+                if event.is_final_response():
+                    if event.content and event.content.parts:
+                        agent_final_text = event.content.parts[0].text
+                    elif event.actions and event.actions.escalate and event.error_message:
+                        agent_final_text = f"Agent escalated with error: {event.error_message}"
+                        print(f"Error: Agent '{agent_name}' escalated: {event.error_message}")
+                    else:
+                        print(f"Warning: Final response from agent '{agent_name}' had no parsable content. Event: {event}")
+                    break
         if not agent_final_text:
             print(f"Error: Agent '{agent_name}' did not produce final text.")
     except Exception as e:
@@ -196,43 +191,43 @@ async def run_llm_prompt(runner: Runner, session_id: str, full_prompt_text: str,
 # --- Main Logic ---
 async def main():
     print("Starting Keyword Planning Process...")
+    if not OPENROUTER_API_KEY:
+        print("Error: OPENROUTER_API_KEY not found in environment variables. Please set it in a .env file.")
+        return
 
-    global COMPETITOR_ANALYSIS_CSV_PATH, CLUSTERS_CSV_PATH
+    global COMPETITOR_ANALYSIS_CSV_PATH, CLUSTERS_CSV_PATH, STATE_DB_PATH, state_store
     
     script_dir = os.path.dirname(os.path.abspath(__file__))
 
     COMPETITOR_ANALYSIS_CSV_PATH = os.path.join(script_dir, "Competitor Analysis.csv")
     CLUSTERS_CSV_PATH = os.path.join(script_dir, "Clusters.csv")
+    STATE_DB_PATH = os.path.join(script_dir, "seo_state.sqlite3")
 
     print(f"Script execution directory: {os.path.abspath(script_dir)}")
     print(f"Using Competitor Analysis CSV: {os.path.abspath(COMPETITOR_ANALYSIS_CSV_PATH)}")
     print(f"Using Clusters Output CSV: {os.path.abspath(CLUSTERS_CSV_PATH)}")
 
     initialize_clusters_csv()
+    if state_store is None:  # The daemon keeps one store open across runs.
+        state_store = StateStore(STATE_DB_PATH, csv_dir=script_dir)
+    state_store.sync_from_csv("competitor_analysis")
+    state_store.sync_from_csv("clusters")
+    # Re-running the planner is meant to produce fresh ideas, so caching is opt-in here (LLM_CACHE_KEYWORD_PLANNER=1).
+    llm_gateway.configure("keyword_planner", use_cache_by_default=False)
     
     top_keywords = get_top_competitor_keywords(top_n=5)
 
-    keyword_model = LiteLlm(
-        model="openrouter/" + KEYWORD_MODEL_NAME,
-        api_key=OPENROUTER_API_KEY,
-    )
-    
-    planner_agent = Agent(
+    runner = get_runner('keyword_planner_app', lambda: Agent(
         name="seo_keyword_planner_agent",
-        model=keyword_model,
+        model=LiteLlm(
+            model="openrouter/" + KEYWORD_MODEL_NAME,
+            api_key=OPENROUTER_API_KEY,
+            llm_client=PipelineLiteLLMClient(),
+        ),
         instruction="",
         tools=[],
-    )
-
-    session_service = InMemorySessionService()
-    artifact_service = InMemoryArtifactService()
-    session = session_service.create_session(user_id='keyword_planner_user', app_name='keyword_planner_app')
-    runner = Runner(
-        app_name='keyword_planner_app',
-        agent=planner_agent,
-        session_service=session_service,
-        artifact_service=artifact_service
-    )
+    ))
+    session = runner.session_service.create_session(user_id='keyword_planner_user', app_name='keyword_planner_app')
 
     print("\n--- Step 1: Generating Initial Pillar & Cluster Ideas ---")
     pillar_cluster_output = await run_llm_prompt(runner, session.id, PROMPT_1_PILLAR_CLUSTER_GENERATION, "PillarClusterGenerator")
@@ -290,12 +285,16 @@ The table should contain the finalized cluster information.
     parsed_clusters = parse_llm_table_output(final_table_output)
 
     if parsed_clusters:
-        write_clusters_to_csv(parsed_clusters)
+        write_clusters(parsed_clusters)
     else:
-        print("No clusters parsed from the LLM output. CSV not updated.")
+        print("No clusters parsed from the LLM output. Clusters not updated.")
         print("Please check the raw output from 'TableFormatter' above to see if it provided a valid table.")
 
+    llm_gateway.print_llm_stats()
     print("\nKeyword Planning Process Finished.")
 
 if __name__ == "__main__":
-    asyncio.run(main()) 
\ No newline at end of file
+    if not OPENROUTER_API_KEY:
+        print("Error: OPENROUTER_API_KEY not found in environment variables. Please set it in a .env file.")
+        exit(1)
+    tracing.run_script("keyword_planner", main)
\ No newline at end of file
@@ -0,0 +1,143 @@
+import os
+import io
+import json
+import time
+import asyncio
+
+from openai import AsyncOpenAI
+
+import http_pool
+
+# --- Provider Batch Jobs ---
+# Runs chat completion requests as one batch job through an OpenAI-compatible Files and
+# Batches API: the requests are written as JSONL, uploaded, submitted with a 24h completion
+# window and polled until the provider has finished them. Batch requests are cheaper and
+# are queued against the provider's separate batch limits, so bulk work does not use the
+# per-minute headroom (or the shared rate limiter) that live generation runs depend on.
+# The job is saved in .seo_cache/batches/<name>.json as soon as it is submitted: a run
+# that stops before the job finishes resumes polling the same job instead of submitting
+# the requests again. The calls go through the OpenAI SDK on http_pool's client: LiteLLM's
+# files and batches functions open a new client per call and never close it.
+BATCH_DIR = os.getenv("LLM_BATCH_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".seo_cache", "batches"))
+BATCH_POLL_SECONDS = float(os.getenv("LLM_BATCH_POLL_SECONDS", "30"))
+BATCH_MAX_WAIT_SECONDS = float(os.getenv("LLM_BATCH_MAX_WAIT_SECONDS", "0"))  # 0: wait until the job ends.
+BATCH_ENDPOINT = "/v1/chat/completions"
+BATCH_FINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+
+def _job_path(name: str) -> str:
+    return os.path.join(BATCH_DIR, f"{name}.json")
+
+
+def load_job(name: str) -> dict | None:
+    """The saved job of an earlier run that has not been collected yet, or None."""
+    try:
+        with open(_job_path(name), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _save_job(name: str, job: dict):
+    os.makedirs(BATCH_DIR, exist_ok=True)
+    temp_path = f"{_job_path(name)}.{os.getpid()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(job, f, indent=2)
+    os.replace(temp_path, _job_path(name))
+
+
+def finish_job(name: str):
+    """Forgets the saved job once its results have been applied."""
+    try:
+        os.remove(_job_path(name))
+    except FileNotFoundError:
+        pass
+
+
+def _client(api_base: str, api_key: str) -> AsyncOpenAI:
+    return AsyncOpenAI(base_url=api_base, api_key=api_key, http_client=http_pool.get_client())
+
+
+def build_request_line(custom_id: str, model: str, messages: list[dict], **params) -> dict:
+    return {"custom_id": custom_id, "method": "POST", "url": BATCH_ENDPOINT, "body": {"model": model, "messages": messages, **params}}
+
+
+async def submit_job(name: str, request_lines: list[dict], items: dict, api_base: str, api_key: str) -> dict:
+    """
+    Uploads the request lines and creates the batch. `items` maps each custom_id to what the
+    caller needs to apply its result later; it is saved with the job.
+    """
+    jsonl = "".join(json.dumps(line, ensure_ascii=False) + "\n" for line in request_lines).encode("utf-8")
+    os.makedirs(BATCH_DIR, exist_ok=True)
+    with open(os.path.join(BATCH_DIR, f"{name}.input.jsonl"), "wb") as f:
+        f.write(jsonl)  # Kept for inspection; the upload below sends the same bytes.
+
+    client = _client(api_base, api_key)
+    uploaded = await client.files.create(file=(f"{name}.jsonl", io.BytesIO(jsonl), "application/jsonl"), purpose="batch")
+    batch = await client.batches.create(
+        completion_window="24h", endpoint=BATCH_ENDPOINT, input_file_id=uploaded.id, metadata={"job": name},
+    )
+    job = {"name": name, "batch_id": batch.id, "input_file_id": uploaded.id, "api_base": api_base,
+           "submitted_at": time.time(), "requests": len(request_lines), "items": items}
+    _save_job(name, job)
+    print(f"Submitted batch {batch.id} with {len(request_lines)} requests ({len(jsonl) / 1024:.0f} KB) to {api_base}.")
+    return job
+
+
+async def wait_for_job(job: dict, api_key: str, poll_seconds: float = BATCH_POLL_SECONDS, max_wait_seconds: float = BATCH_MAX_WAIT_SECONDS):
+    """Polls the batch until it ends. Returns the batch, or None if max_wait_seconds passed first."""
+    client = _client(job["api_base"], api_key)
+    started = time.monotonic()
+    last_status = None
+    while True:
+        batch = await client.batches.retrieve(job["batch_id"])
+        counts = getattr(batch, "request_counts", None)
+        progress = f" ({counts.completed + counts.failed}/{counts.total} done)" if counts and counts.total else ""
+        if batch.status != last_status or progress:
+            print(f"Batch {batch.id}: {batch.status}{progress}.")
+            last_status = batch.status
+        if batch.status in BATCH_FINAL_STATUSES:
+            return batch
+        if max_wait_seconds and time.monotonic() - started >= max_wait_seconds:
+            print(f"Batch {batch.id} is still {batch.status}; its results will be collected by the next run.")
+            return None
+        await asyncio.sleep(poll_seconds)
+
+
+async def _file_lines(file_id: str | None, api_base: str, api_key: str) -> list[dict]:
+    if not file_id:
+        return []
+    content = await _client(api_base, api_key).files.content(file_id)
+    lines = []
+    for line in content.content.decode("utf-8").splitlines():
+        if line.strip():
+            lines.append(json.loads(line))
+    return lines
+
+
+async def collect_results(job: dict, batch, api_key: str) -> dict:
+    """
+    Downloads the output and error files of a finished batch.
+    Returns {custom_id: {"content": str | None, "usage": dict | None, "error": str | None}}.
+    """
+    results = {}
+    output_lines = await _file_lines(getattr(batch, "output_file_id", None), job["api_base"], api_key)
+    error_lines = await _file_lines(getattr(batch, "error_file_id", None), job["api_base"], api_key)
+    for line in output_lines + error_lines:
+        response = line.get("response") or {}
+        body = response.get("body") or {}
+        error = line.get("error")
+        if not error and response.get("status_code", 200) >= 400:
+            error = (body.get("error") or {}).get("message") or f"HTTP {response.get('status_code')}"
+        content = None
+        if not error:
+            try:
+                content = body["choices"][0]["message"]["content"]
+            except (KeyError, IndexError, TypeError):
+                error = "Response has no message content"
+        if isinstance(error, dict):
+            error = error.get("message") or json.dumps(error)
+        results[line.get("custom_id")] = {"content": content, "usage": body.get("usage"), "error": error}
+    for custom_id in job["items"]:
+        results.setdefault(custom_id, {"content": None, "usage": None, "error": f"No result (batch {batch.status})"})
+    return results
@@ -0,0 +1,164 @@
+import os
+import json
+import time
+import zlib
+import hashlib
+
+# --- Configuration ---
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".seo_cache", "llm_responses")
+DEFAULT_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_MB", "512")) * 1024 * 1024
+CACHE_ENTRY_SUFFIX = ".json.z"
+CACHE_FORMAT_VERSION = 1
+
+# Request parameters that do not change the model output and must not be part of the key.
+NON_KEY_PARAMS = {"api_key", "api_base", "base_url", "timeout", "request_timeout", "client", "metadata", "num_retries", "max_retries"}
+
+
+def cache_enabled_for(script_name: str, default: bool = True) -> bool:
+    """
+    Resolves whether a script uses the response cache.
+    LLM_CACHE_<SCRIPT_NAME> (e.g. LLM_CACHE_ANALYZER=0) overrides LLM_CACHE, which overrides `default`.
+    """
+    for env_name in (f"LLM_CACHE_{script_name.upper()}", "LLM_CACHE"):
+        value = os.getenv(env_name)
+        if value is not None and value.strip():
+            return value.strip().lower() not in ("0", "false", "no", "off")
+    return default
+
+
+def _json_default(obj):
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump()
+    if hasattr(obj, "__dict__"):
+        return vars(obj)
+    return str(obj)
+
+
+def request_cache_key(request_kwargs: dict) -> str:
+    """Content hash of the model, messages and output-affecting parameters of a completion request."""
+    keyed = {k: v for k, v in request_kwargs.items() if k not in NON_KEY_PARAMS and v is not None}
+    canonical = json.dumps({"v": CACHE_FORMAT_VERSION, "request": keyed}, sort_keys=True, default=_json_default, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    Content-addressed on-disk cache of completion responses.
+    Each entry is a zlib-compressed JSON file named by its request hash. Reads refresh the
+    file's mtime, and writes evict the least recently used entries once the directory
+    exceeds max_bytes, so the cache can be shared by several scripts and processes.
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self._total_bytes = None
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + CACHE_ENTRY_SUFFIX)
+
+    def get(self, key: str) -> dict | None:
+        path = self._entry_path(key)
+        try:
+            with open(path, "rb") as f:
+                payload = json.loads(zlib.decompress(f.read()).decode("utf-8"))
+            os.utime(path, None)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (OSError, ValueError, zlib.error) as e:
+            print(f"Warning: Discarding unreadable LLM cache entry {key[:12]}: {e}")
+            self._remove(path)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return payload
+
+    def put(self, key: str, response_dict: dict):
+        path = self._entry_path(key)
+        data = zlib.compress(json.dumps(response_dict, default=_json_default, ensure_ascii=False).encode("utf-8"), 6)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Warning: Could not write LLM cache entry {key[:12]}: {e}")
+            return
+        self.writes += 1
+        if self._total_bytes is not None:
+            self._total_bytes += len(data)
+        self._evict_if_needed()
+
+    def _remove(self, path: str) -> int:
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+            return size
+        except OSError:
+            return 0
+
+    def _scan_entries(self) -> list[tuple[float, int, str]]:
+        entries = []
+        if not os.path.isdir(self.cache_dir):
+            return entries
+        for shard in os.scandir(self.cache_dir):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith(CACHE_ENTRY_SUFFIX):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def _evict_if_needed(self):
+        if self._total_bytes is None:
+            self._total_bytes = sum(size for _, size, _ in self._scan_entries())
+        if self._total_bytes <= self.max_bytes:
+            return
+        entries = sorted(self._scan_entries())
+        self._total_bytes = sum(size for _, size, _ in entries)
+        target_bytes = int(self.max_bytes * 0.9)
+        for _, _, path in entries:
+            if self._total_bytes <= target_bytes:
+                break
+            self._total_bytes -= self._remove(path)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "writes": self.writes,
+            "evictions": self.evictions,
+        }
+
+    def clear(self) -> int:
+        removed = 0
+        for _, _, path in self._scan_entries():
+            if self._remove(path):
+                removed += 1
+        self._total_bytes = 0
+        return removed
+
+
+if __name__ == "__main__":
+    # Usage: python llm_cache.py [clear]
+    import sys
+    cache = LLMResponseCache()
+    if len(sys.argv) > 1 and sys.argv[1] == "clear":
+        print(f"Removed {cache.clear()} cached responses from {cache.cache_dir}.")
+    else:
+        cached_entries = cache._scan_entries()
+        total_mb = sum(size for _, size, _ in cached_entries) / (1024 * 1024)
+        oldest = min((mtime for mtime, _, _ in cached_entries), default=None)
+        print(f"{len(cached_entries)} cached responses, {total_mb:.2f} MB of {cache.max_bytes / (1024 * 1024):.0f} MB in {cache.cache_dir}")
+        if oldest:
+            print(f"Least recently used entry: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(oldest))}")
@@ -0,0 +1,323 @@
+import litellm
+from google.adk.models.lite_llm import LiteLLMClient
+
+import os
+import time
+import contextvars
+from contextlib import contextmanager
+
+from llm_cache import LLMResponseCache, request_cache_key, cache_enabled_for
+from concurrency import AdaptiveConcurrencyController
+from resilience import ResilientCaller, is_retryable_error
+from hedging import RequestHedger, HEDGE_STAGES
+from singleflight import SingleFlight
+from prompt_cache import with_cache_breakpoint, cached_prompt_tokens
+from model_router import ModelRouter, MODEL_ROUTES, MODEL_PINS, DECISIONS_LOG_NAME
+from rate_limiter import TokenBucketRateLimiter, estimate_request_tokens
+from cassettes import Cassette, CassetteMissError
+import http_pool
+import metrics
+import tracing
+
+# --- Shared LLM Call Path ---
+# Every LLM call made by analyzer.py, keyword_planner.py and blog_post_generator.py goes
+# through acompletion() below: direct litellm calls use it as a drop-in replacement for
+# litellm.acompletion, and ADK agents reach it through PipelineLiteLLMClient.
+
+ADAPTIVE_CONCURRENCY_ENABLED = os.getenv("ADAPTIVE_CONCURRENCY", "1").strip().lower() not in ("0", "false", "no", "off")
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT", "1").strip().lower() not in ("0", "false", "no", "off")
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT", "1").strip().lower() not in ("0", "false", "no", "off")
+
+_script_name = "seo"
+_response_cache = None
+_rate_limiter = None
+_concurrency = None
+_resilience = ResilientCaller()
+_hedger = None
+_single_flight = SingleFlight() if SINGLE_FLIGHT_ENABLED else None
+_cassette = None
+_router = None
+_current_stage = contextvars.ContextVar("llm_stage", default=None)
+
+
+def configure(script_name: str, use_cache_by_default: bool = True):
+    """
+    Called by each script before its first LLM call. Rate limiter, concurrency limits and
+    hedger and model router are created once per process, so a long-running process
+    (daemon.py) that runs the scripts repeatedly keeps what they learned.
+    """
+    global _script_name, _response_cache, _rate_limiter, _concurrency, _hedger, _cassette, _router
+    _script_name = script_name
+    metrics.start_run(script_name)
+    http_pool.install()
+    _cassette = Cassette.for_script(script_name)
+    if _rate_limiter is None and RATE_LIMIT_ENABLED:
+        _rate_limiter = TokenBucketRateLimiter()
+    if _concurrency is None and ADAPTIVE_CONCURRENCY_ENABLED:
+        _concurrency = AdaptiveConcurrencyController()
+    if _hedger is None and HEDGE_STAGES:
+        _hedger = RequestHedger()
+    if _router is None and (MODEL_ROUTES or any(MODEL_PINS.values())):
+        _router = ModelRouter(health_check=_circuit_closed)
+    if cache_enabled_for(script_name, use_cache_by_default):
+        _response_cache = LLMResponseCache()
+        print(f"LLM response cache enabled for '{script_name}' ({_response_cache.cache_dir}).")
+    else:
+        _response_cache = None
+        print(f"LLM response cache disabled for '{script_name}'.")
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Names the pipeline stage for LLM calls made inside the block (also in tasks started
+    from it). Per-call suffixes such as "BlogWriter[section 2]" are dropped.
+    """
+    token = _current_stage.set(name.split("[")[0].strip())
+    try:
+        yield
+    finally:
+        _current_stage.reset(token)
+
+
+def current_stage() -> str | None:
+    return _current_stage.get()
+
+
+def _circuit_closed(model: str) -> bool:
+    breaker = _resilience.breakers.get(model)
+    return breaker is None or breaker.state != "open"
+
+
+def _is_cacheable(response) -> bool:
+    try:
+        return bool(response.choices) and bool(response.choices[0].message.content)
+    except (AttributeError, IndexError):
+        return False
+
+
+def _usage_tokens(response) -> int | None:
+    usage = getattr(response, "usage", None)
+    return getattr(usage, "total_tokens", None) if usage else None
+
+
+def _response_cost(response) -> float | None:
+    """Provider cost of a response in USD as estimated by LiteLLM, or None for models it has no price for."""
+    cost = (getattr(response, "_hidden_params", None) or {}).get("response_cost")
+    if cost is None:
+        try:
+            cost = litellm.completion_cost(completion_response=response)
+        except Exception:
+            return None
+    return cost
+
+
+async def _send_request(request_kwargs: dict):
+    """Sends one request to the provider, within the shared per-model rate limit."""
+    request_kwargs = with_cache_breakpoint(request_kwargs)
+    model = request_kwargs.get("model") or ""
+    if http_pool.HTTP_POOL_ENABLED and model.startswith("openrouter/") and "client" not in request_kwargs:
+        # LiteLLM sends OpenRouter requests with its own HTTP handler rather than the OpenAI SDK.
+        request_kwargs = {**request_kwargs, "client": http_pool.litellm_handler()}
+    if _rate_limiter is not None:
+        estimated_tokens = estimate_request_tokens(request_kwargs)
+        with tracing.span("rate_limit.wait", "wait", model=model):
+            await _rate_limiter.acquire(model, estimated_tokens)
+    # Latencies and provider errors of routed stages are what the model router decides on.
+    routed_stage = current_stage() if _router is not None and _router.is_routed(current_stage()) and not request_kwargs.get("stream") else None
+    started = time.monotonic()
+    try:
+        with tracing.span("network", "network", model=model):
+            response = await litellm.acompletion(**request_kwargs)
+    except Exception as e:
+        if routed_stage and is_retryable_error(e):
+            _router.record(routed_stage, model, None)
+        raise
+    if routed_stage:
+        _router.record(routed_stage, model, time.monotonic() - started)
+    if not request_kwargs.get("stream"):
+        if _rate_limiter is not None:
+            await _rate_limiter.record_usage(model, estimated_tokens, _usage_tokens(response))
+        metrics.count("provider_calls")
+        cost = _response_cost(response)
+        if cost is not None:
+            metrics.count("cost_usd", cost)
+    return response
+
+
+async def _send_within_concurrency_limit(request_kwargs: dict):
+    """Sends one request within the adaptive concurrency limit of its model."""
+    if _concurrency is None:
+        return await _send_request(request_kwargs)
+    limiter = _concurrency.for_model(request_kwargs.get("model") or "")
+    with tracing.span("concurrency.wait", "wait", model=limiter.model):
+        started_at = await limiter.acquire()
+    try:
+        response = await _send_request(request_kwargs)
+    except BaseException as e:
+        await limiter.release(started_at, error=e)
+        raise
+    await limiter.release(started_at)
+    return response
+
+
+async def _call_with_resilience(request_kwargs: dict):
+    """Sends a request with retries, the model's circuit breaker and its fallback model."""
+    return await _resilience.call(_send_within_concurrency_limit, request_kwargs)
+
+
+async def _call_provider(request_kwargs: dict):
+    """Sends a request, hedging it when its stage is listed in HEDGE_STAGES."""
+    stage_name = current_stage()
+    if _hedger is not None and not request_kwargs.get("stream") and _hedger.is_enabled_for(stage_name):
+        return await _hedger.call(stage_name, _call_with_resilience, request_kwargs)
+    return await _call_with_resilience(request_kwargs)
+
+
+async def _cached_call(cache_key: str, request_kwargs: dict):
+    if _response_cache is None:
+        return await _call_provider(request_kwargs)
+
+    cached_payload = _response_cache.get(cache_key)
+    if cached_payload is not None:
+        print(f"LLM cache hit for model '{request_kwargs.get('model')}' ({cache_key[:12]}).")
+        metrics.annotate(cache="hit")
+        return litellm.ModelResponse(**cached_payload)
+
+    metrics.annotate(cache="miss")
+    response = await _call_provider(request_kwargs)
+    if _is_cacheable(response):
+        _response_cache.put(cache_key, response.model_dump())
+    return response
+
+
+async def acompletion(**request_kwargs):
+    """
+    Drop-in replacement for litellm.acompletion. Identical concurrent requests share one
+    call, repeated requests are served from the response cache and the rest go through
+    hedging, resilience, concurrency and rate limits. Stages listed in MODEL_ROUTES are
+    sent to the fastest healthy model allowed for them. Every call is recorded in metrics,
+    and in the cassette when recording; when replaying, the cassette answers instead.
+    """
+    stage_name, configured_model = current_stage(), request_kwargs.get("model")
+    # Cassettes are keyed by the request as configured: replay skips the router, whose choice varies between runs.
+    configured_request, model = request_kwargs, configured_model
+    if _router is not None and configured_model and not (_cassette is not None and _cassette.mode == "replay"):
+        model = _router.choose(stage_name, configured_model, _script_name)
+        request_kwargs = {**request_kwargs, "model": model}
+    with metrics.track_call(_script_name, stage_name, model) as call, tracing.span(f"llm {stage_name or ''}".strip(), "llm", model=model):
+        if model != configured_model:
+            call["routed_from"] = configured_model
+        if _cassette is not None and _cassette.mode == "replay":
+            response = _replayed_response(stage_name, request_kwargs)
+        else:
+            response = await _coalesced_call(request_kwargs)
+            if _cassette is not None and not request_kwargs.get("stream"):
+                _cassette.record(request_cache_key(configured_request), stage_name, configured_request, response.model_dump(),
+                                 routed_to=model if model != configured_model else None)
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            call["prompt_tokens"] = getattr(usage, "prompt_tokens", None)
+            call["completion_tokens"] = getattr(usage, "completion_tokens", None)
+            call["cached_tokens"] = cached_prompt_tokens(usage)
+            call["served_model"] = getattr(response, "model", None)
+        return response
+
+
+def _replayed_response(stage_name: str | None, request_kwargs: dict):
+    if request_kwargs.get("stream"):
+        raise CassetteMissError("Streamed LLM calls are not recorded in cassettes.")
+    payload = _cassette.replay(request_cache_key(request_kwargs), stage_name, request_kwargs.get("model"))
+    metrics.annotate(cache="replay")
+    return litellm.ModelResponse(**payload)
+
+
+async def _coalesced_call(request_kwargs: dict):
+    if request_kwargs.get("stream"):
+        return await _call_provider(request_kwargs)
+
+    cache_key = request_cache_key(request_kwargs)
+    if _single_flight is None:
+        return await _cached_call(cache_key, request_kwargs)
+
+    response, shared = await _single_flight.do(cache_key, lambda: _cached_call(cache_key, request_kwargs))
+    if shared:
+        print(f"Coalesced identical in-flight request for model '{request_kwargs.get('model')}' ({cache_key[:12]}).")
+        metrics.annotate(coalesced=True)
+        # Each caller gets its own copy so that ADK post-processing of one cannot affect the other.
+        return litellm.ModelResponse(**response.model_dump())
+    return response
+
+
+class PipelineLiteLLMClient(LiteLLMClient):
+    """
+    LiteLLMClient for ADK LiteLlm models that routes every call through acompletion().
+    Streamed calls skip the response cache and single-flight and are not recorded in cassettes.
+    """
+
+    async def acompletion(self, model, messages, tools, **kwargs):
+        return await acompletion(model=model, messages=messages, tools=tools, **kwargs)
+
+
+def get_stats() -> dict:
+    return {
+        "script": _script_name,
+        "cache": _response_cache.stats() if _response_cache else None,
+        "rate_limit": _rate_limiter.stats() if _rate_limiter else None,
+        "concurrency": _concurrency.stats() if _concurrency else None,
+        "resilience": _resilience.stats(),
+        "hedging": _hedger.stats() if _hedger else None,
+        "single_flight": _single_flight.stats() if _single_flight else None,
+        "cassette": _cassette.stats() if _cassette else None,
+        "routing": _router.stats() if _router else None,
+        "http_pool": http_pool.get_stats() if http_pool.HTTP_POOL_ENABLED else None,
+    }
+
+
+def print_llm_stats():
+    stats = get_stats()
+    if stats["cache"]:
+        cache_stats = stats["cache"]
+        print(f"LLM cache ({_script_name}): {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+              f"(hit rate {cache_stats['hit_rate']:.0%}), {cache_stats['writes']} writes, {cache_stats['evictions']} evictions.")
+    if stats["rate_limit"]:
+        limit_stats = stats["rate_limit"]
+        print(f"Rate limit ({_script_name}): {limit_stats['acquired']} requests, {limit_stats['throttled']} throttled, "
+              f"{limit_stats['total_wait_seconds']}s spent waiting.")
+    for model, limiter_stats in (stats["concurrency"] or {}).items():
+        print(f"Concurrency ({model}): limit {limiter_stats['limit']}, peak {limiter_stats['max_in_flight']} in flight, "
+              f"{limiter_stats['increases']} increases, {limiter_stats['decreases']} decreases.")
+    resilience_stats = stats["resilience"]
+    if resilience_stats["retries"] or resilience_stats["fallbacks"] or resilience_stats["open_circuits"]:
+        print(f"Resilience ({_script_name}): {resilience_stats['retries']} retries, {resilience_stats['fallbacks']} fallbacks, "
+              f"{resilience_stats['short_circuited']} calls skipped by open circuits {resilience_stats['open_circuits'] or ''}.")
+    if stats["hedging"]:
+        hedge_stats = stats["hedging"]
+        print(f"Hedging ({_script_name}): {hedge_stats['hedges_fired']} hedges for {hedge_stats['eligible_calls']} eligible calls, "
+              f"{hedge_stats['hedges_won']} finished first (win rate {hedge_stats['hedge_win_rate']:.0%}), "
+              f"{hedge_stats['skipped_for_budget']} skipped by the hedge budget.")
+    if stats["single_flight"] and stats["single_flight"]["coalesced"]:
+        flight_stats = stats["single_flight"]
+        print(f"Single-flight ({_script_name}): {flight_stats['coalesced']} of {flight_stats['calls'] + flight_stats['coalesced']} "
+              f"requests coalesced with an identical in-flight request.")
+    if stats["cassette"]:
+        cassette_stats = stats["cassette"]
+        if cassette_stats["mode"] == "record":
+            print(f"Cassette ({_script_name}): recorded {cassette_stats['recorded']} LLM calls to {cassette_stats['path']}.")
+        else:
+            print(f"Cassette ({_script_name}): replayed {cassette_stats['replayed']} LLM calls from {cassette_stats['path']} "
+                  f"({cassette_stats['fuzzy_matches']} matched by stage order after a prompt change).")
+    if stats["routing"] and stats["routing"]["decisions"]:
+        routing_stats = stats["routing"]
+        rerouted = sum(count for models in routing_stats["rerouted"].values() for count in models.values())
+        print(f"Model routing ({_script_name}): {rerouted} of {routing_stats['decisions']} routed calls sent to another model "
+              f"{routing_stats['rerouted'] or ''}; decisions logged to {os.path.join(metrics.METRICS_DIR, DECISIONS_LOG_NAME)}.")
+    if stats["http_pool"] and stats["http_pool"]["requests"]:
+        pool_stats = stats["http_pool"]
+        print(f"HTTP pool ({_script_name}): {pool_stats['requests']} requests over {pool_stats['new_connections']} connections "
+              f"(reuse rate {pool_stats['reuse_rate']:.0%}), {pool_stats['tls_handshakes']} TLS handshakes, "
+              f"{pool_stats['http2_responses']} HTTP/2 responses.")
+    metrics.print_run_summary()
+    prometheus_path = metrics.write_prometheus(_script_name, _concurrency.current_limits() if _concurrency else None)
+    if prometheus_path:
+        print(f"LLM metrics written to {os.path.join(metrics.METRICS_DIR, metrics.CALLS_LOG_NAME)} and {prometheus_path}.")
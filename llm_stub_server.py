@@ -0,0 +1,631 @@
+import os
+import re
+import sys
+import json
+import time
+import math
+import random
+import hashlib
+import argparse
+import itertools
+import threading
+from collections import deque
+from email import policy
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- Local OpenRouter Stand-in ---
+# An OpenAI/OpenRouter-compatible chat completions server for offline benchmarks: point the
+# scripts at it with OPENROUTER_API_BASE=http://127.0.0.1:<port>/api/v1. The answers are
+# canned but shaped like the real ones (analysis and cluster tables, plans, research with
+# citations, Markdown posts, HTML), so analyzer.py, keyword_planner.py and
+# blog_post_generator.py run end to end without an account or any cost. Latency (per model),
+# server errors, 429s and a requests-per-minute limit are configurable. GET /stats reports
+# what was served; POST /stats/reset clears it. Used by benchmark.py. The OpenAI Files and
+# Batches endpoints are served too (for llm_batch.py): a batch completes --batch-seconds after
+# it is created, with the injected error rate applied to each of its requests. Prompt caching
+# is simulated for requests with a `cache_control` breakpoint: a prefix seen before is
+# reported as cached tokens and shortens the time to first token.
+STUB_HOST = os.getenv("STUB_HOST", "127.0.0.1")
+STUB_PORT = int(os.getenv("STUB_PORT", "8089"))
+# Latency before the first token: fixed:S, uniform:LOW:HIGH, lognormal:MEDIAN:SIGMA or exponential:MEAN.
+STUB_LATENCY = os.getenv("STUB_LATENCY", "lognormal:0.8:0.5")
+# Per-model overrides, e.g. "perplexity=lognormal:4:0.4;claude=uniform:2:6" (matched as substrings).
+STUB_MODEL_LATENCY = os.getenv("STUB_MODEL_LATENCY", "")
+STUB_SECONDS_PER_TOKEN = float(os.getenv("STUB_SECONDS_PER_TOKEN", "0.001"))  # Generation time per completion token.
+STUB_ERROR_RATE = float(os.getenv("STUB_ERROR_RATE", "0"))  # Share of requests answered with a 5xx error.
+STUB_429_RATE = float(os.getenv("STUB_429_RATE", "0"))  # Share of requests answered with a 429.
+STUB_MAX_RPM = int(os.getenv("STUB_MAX_RPM", "0"))  # Requests per minute before 429s (0: unlimited).
+STUB_ARTICLE_WORDS = int(os.getenv("STUB_ARTICLE_WORDS", "1200"))
+STUB_PLAN_SECTIONS = int(os.getenv("STUB_PLAN_SECTIONS", "6"))
+STUB_CLUSTERS_PER_TABLE = int(os.getenv("STUB_CLUSTERS_PER_TABLE", "5"))
+STUB_CITATIONS = int(os.getenv("STUB_CITATIONS", "4"))
+STUB_BATCH_SECONDS = float(os.getenv("STUB_BATCH_SECONDS", "2"))  # Time from batch creation to completion.
+
+CHARS_PER_TOKEN = 4
+STREAM_CHUNKS = 12
+SERVER_ERRORS = ((500, "Internal server error"), (502, "Bad gateway: upstream provider error"), (503, "Service unavailable"))
+
+FILLER_WORDS = (
+    "dental care patients teeth gums regular checkups help prevent decay and keep your smile healthy over time "
+    "a dentist can explain treatment options costs and recovery so you know what to expect before each visit "
+    "good habits at home such as brushing twice a day flossing and limiting sugary snacks make a real difference"
+).split()
+TOPIC_TERMS = (
+    "teeth whitening", "dental implants", "root canal", "invisalign", "dental crowns", "gum disease",
+    "wisdom teeth", "dental veneers", "tooth extraction", "emergency dentist", "kids dentist", "dental bonding",
+    "teeth cleaning", "dental bridges", "sensitive teeth", "dentures", "tooth pain", "dental x-rays",
+)
+QUALIFIERS = ("cost", "near me", "benefits", "recovery", "aftercare", "vs alternatives", "for seniors", "options", "guide", "faq")
+
+FILES_PATH_RE = re.compile(r"/files(?:/([^/]+))?(/content)?$")
+BATCHES_PATH_RE = re.compile(r"/batches(?:/([^/]+))?(/cancel)?$")
+LATENCY_SPEC_RE = re.compile(r"^(fixed|uniform|lognormal|exponential)((?::[0-9.]+)+)$")
+
+
+def parse_latency(spec: str) -> tuple[str, list[float]]:
+    """'lognormal:0.8:0.5' -> ('lognormal', [0.8, 0.5]). Raises ValueError for an invalid spec."""
+    match = LATENCY_SPEC_RE.match(spec.strip().lower())
+    if not match:
+        raise ValueError(f"Invalid latency '{spec}'; use fixed:S, uniform:LOW:HIGH, lognormal:MEDIAN:SIGMA or exponential:MEAN.")
+    kind, params = match.group(1), [float(p) for p in match.group(2).split(":")[1:]]
+    expected = {"fixed": 1, "uniform": 2, "lognormal": 2, "exponential": 1}[kind]
+    if len(params) != expected:
+        raise ValueError(f"Latency '{spec}' needs {expected} parameter(s).")
+    return kind, params
+
+
+def parse_model_latencies(spec: str) -> list[tuple[str, tuple[str, list[float]]]]:
+    """'perplexity=lognormal:4:0.4;claude=fixed:2' -> [(model substring, latency), ...]."""
+    overrides = []
+    for item in spec.split(";"):
+        if "=" in item:
+            model, latency = item.split("=", 1)
+            overrides.append((model.strip().lower(), parse_latency(latency)))
+    return overrides
+
+
+def sample_latency(latency: tuple[str, list[float]], rng: random.Random) -> float:
+    kind, params = latency
+    if kind == "fixed":
+        return params[0]
+    if kind == "uniform":
+        return rng.uniform(params[0], params[1])
+    if kind == "lognormal":
+        return rng.lognormvariate(math.log(max(params[0], 1e-6)), params[1])
+    return rng.expovariate(1 / params[0]) if params[0] > 0 else 0.0
+
+
+# --- Canned responses ---
+def _message_text(message: dict) -> str:
+    content = message.get("content")
+    if isinstance(content, list):
+        return "\n".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content or ""
+
+
+def _section_after(text: str, marker: str, end_marker: str | None = None) -> str:
+    start = text.find(marker)
+    if start < 0:
+        return ""
+    section = text[start + len(marker):]
+    if end_marker and end_marker in section:
+        section = section[:section.find(end_marker)]
+    return section.strip()
+
+
+def _sentences(rng: random.Random, words: int, keyword: str = "") -> list[str]:
+    sentences = []
+    while words > 0:
+        length = min(words, rng.randint(10, 18))
+        sentence = [rng.choice(FILLER_WORDS) for _ in range(length)]
+        if keyword and rng.random() < 0.3:
+            sentence[rng.randrange(length)] = keyword
+        sentences.append(" ".join(sentence).capitalize() + ".")
+        words -= length
+    return sentences
+
+
+def _paragraphs(rng: random.Random, words: int, keyword: str = "") -> str:
+    sentences = _sentences(rng, words, keyword)
+    return "\n\n".join(" ".join(sentences[i:i + 4]) for i in range(0, len(sentences), 4))
+
+
+def _title_from_url(url: str) -> str:
+    slug = url.rstrip("/").rsplit("/", 1)[-1] or "dental-care"
+    return re.sub(r"[-_]+", " ", slug).strip().title()
+
+
+class CannedResponder:
+    """Picks a response shaped like what the prompt asks for. Deterministic per prompt."""
+
+    def __init__(self, article_words: int, plan_sections: int, clusters_per_table: int, citations: int):
+        self.article_words = article_words
+        self.plan_sections = plan_sections
+        self.clusters_per_table = clusters_per_table
+        self.citations = citations
+        self._cluster_ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def respond(self, model: str, messages: list[dict]) -> tuple[str, str, list[str]]:
+        """Returns (kind, text, citation URLs)."""
+        system = "\n".join(_message_text(m) for m in messages if m.get("role") == "system")
+        user_messages = [m for m in messages if m.get("role") == "user"]
+        prompt = _message_text(user_messages[-1]) if user_messages else ""
+        rng = random.Random(hashlib.sha256((model + system + prompt).encode("utf-8")).digest())
+        keyword = (re.search(r"Primary [Kk]eyword[^\n]*:\s*'?([^'\n]+)'?", prompt) or [None, ""])[1].strip()
+
+        if "Topic, Keywords, Summary" in system + prompt:
+            return "analysis_table", self._analysis_table(prompt, rng), []
+        if "Primary Keyword" in prompt and "markdown table" in prompt:
+            return "cluster_table", self._cluster_table(rng), []
+        if "# Pillar Post" in prompt:
+            return "pillar_plan", self._pillar_plan(rng), []
+        if "research assistant" in system or "online" in model or "search" in model:
+            return "research", *self._research(prompt, rng)
+        if "expert HTML coder" in prompt:
+            return "html", self._html(_section_after(prompt, "Blog Post Content to Convert:", "Generate the HTML code.")), []
+        if "Current DRAFT Blog Post:" in prompt:
+            draft = _section_after(prompt, "Current DRAFT Blog Post:", "Previously Posted Blog Posts")
+            links = re.findall(r"https?://\S+", _section_after(prompt, "Previously Posted Blog Posts"))
+            return "internal_links", self._with_internal_links(draft, links), []
+        if "Blog post:" in prompt and "editor" in prompt:
+            return "stitch", _section_after(prompt, "Blog post:"), []
+        if "Create the preliminary plan" in prompt or "Create the detailed plan" in prompt:
+            return "plan", self._plan(keyword, rng, detailed="detailed" in prompt[-200:]), []
+        section_words = re.search(r"about (\d+) words", prompt)
+        if section_words:
+            opens_post = "opens the blog post" in prompt
+            return "section", self._article(keyword, rng, int(section_words.group(1)), sections=1 if not opens_post else 0, title=opens_post), []
+        return "article", self._article(keyword, rng, self.article_words, sections=self.plan_sections, title=True), []
+
+    def _analysis_table(self, prompt: str, rng: random.Random) -> str:
+        url = (re.search(r"https?://\S+", prompt) or [""])[0]
+        topic = _title_from_url(url)
+        keywords = ", ".join([topic.lower()] + rng.sample(TOPIC_TERMS, 2))
+        summary = "<br>".join(f"- {s}" for s in _sentences(rng, 60))
+        return f"| Topic | Keywords | Summary |\n|---|---|---|\n| {topic} | {keywords} | {summary} |"
+
+    def _cluster_table(self, rng: random.Random) -> str:
+        rows = ["| Cluster | Intent | Keywords | Primary Keyword |", "|---|---|---|---|"]
+        for _ in range(self.clusters_per_table):
+            with self._lock:
+                cluster_id = next(self._cluster_ids)
+            term = rng.choice(TOPIC_TERMS)
+            primary = f"{term} {rng.choice(QUALIFIERS)} {cluster_id}"
+            keywords = ", ".join([primary] + [f"{term} {q}" for q in rng.sample(QUALIFIERS, 4)])
+            rows.append(f"| {term.title()} {cluster_id} | Users researching {term} and what to expect. | {keywords} | {primary} |")
+        return "\n".join(rows)
+
+    def _pillar_plan(self, rng: random.Random) -> str:
+        lines = []
+        for pillar in range(1, 3):
+            lines.append(f"# Pillar Post {pillar}")
+            for cluster in range(1, 4):
+                lines.append(f"## Cluster {cluster} keywords")
+                lines += [f"- {rng.choice(TOPIC_TERMS)} {rng.choice(QUALIFIERS)}" for _ in range(4)]
+        return "\n".join(lines)
+
+    def _research(self, prompt: str, rng: random.Random) -> tuple[str, list[str]]:
+        urls = [f"https://research.example.org/{rng.choice(TOPIC_TERMS).replace(' ', '-')}-{rng.randrange(10**6)}" for _ in range(self.citations)]
+        paragraphs = []
+        for sentence in _sentences(rng, 200):
+            paragraphs.append(f"{sentence} [{rng.randint(1, len(urls))}]" if urls else sentence)
+        return " ".join(paragraphs), urls
+
+    def _plan(self, keyword: str, rng: random.Random, detailed: bool) -> str:
+        lines = []
+        titles = ["Introduction"] + [f"{rng.choice(TOPIC_TERMS).title()} {rng.choice(QUALIFIERS)}" for _ in range(self.plan_sections - 2)] + ["Conclusion"]
+        for title in titles:
+            lines.append(f"## {title}")
+            lines += [f"- {s}" for s in _sentences(rng, 80 if detailed else 30, keyword)]
+        return "\n".join(lines)
+
+    def _article(self, keyword: str, rng: random.Random, words: int, sections: int, title: bool) -> str:
+        parts = [f"# {(keyword or rng.choice(TOPIC_TERMS)).title()}: What You Need to Know"] if title else []
+        chunks = max(sections, 1) + (1 if title else 0)
+        for i in range(chunks):
+            if i > 0 or not title:
+                parts.append(f"## {rng.choice(TOPIC_TERMS).title()} {rng.choice(QUALIFIERS)}")
+            parts.append(_paragraphs(rng, max(words // chunks, 20), keyword))
+        return "\n\n".join(parts)
+
+    def _with_internal_links(self, draft: str, links: list[str]) -> str:
+        paragraphs = draft.split("\n\n")
+        for i, link in enumerate(links[:2]):
+            index = min(len(paragraphs) - 1, 2 + i * 3)
+            paragraphs[index] += f" [{link}]"
+        return "\n\n".join(paragraphs)
+
+    def _html(self, markdown: str) -> str:
+        body = []
+        for block in markdown.split("\n\n"):
+            block = block.strip()
+            heading = re.match(r"^(#{1,6})\s+(.*)$", block)
+            if heading:
+                level = len(heading.group(1))
+                body.append(f'<h{level} style="border-bottom: 2px solid #00c2ff; padding-bottom: 5px; color: #ffffff;">{heading.group(2)}</h{level}>')
+            elif block:
+                body.append(f"<p>{block}</p>")
+        return ('<div style="background-color: #333333; color: #ffffff; font-family: Arial, sans-serif; line-height: 1.6; padding: 20px;"> '
+                + " <br><br> ".join(body) + " </div>")
+
+
+# --- Server ---
+class StubState:
+    """Configuration and counters shared by the request handler threads."""
+
+    def __init__(self, args):
+        self.latency = parse_latency(args.latency)
+        self.model_latencies = parse_model_latencies(args.model_latency)
+        self.seconds_per_token = args.seconds_per_token
+        self.error_rate = args.error_rate
+        self.rate_429 = args.rate_429
+        self.max_rpm = args.max_rpm
+        self.batch_seconds = args.batch_seconds
+        self.responder = CannedResponder(args.article_words, args.plan_sections, args.clusters_per_table, args.citations)
+        self.rng = random.Random(args.seed)
+        self.lock = threading.Lock()
+        self.request_times = deque()
+        self.files = {}
+        self.batches = {}
+        self.cached_prefixes = set()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.stats = {"requests": 0, "in_flight": 0, "peak_in_flight": 0, "by_status": {}, "by_kind": {}, "by_model": {},
+                          "completion_tokens": 0, "cached_tokens": 0, "started": time.time()}
+
+    def latency_for(self, model: str) -> tuple[str, list[float]]:
+        for substring, latency in self.model_latencies:
+            if substring in model.lower():
+                return latency
+        return self.latency
+
+    def admit(self, model: str) -> tuple[int, str] | None:
+        """Decides whether the request fails: returns (status, message) or None."""
+        with self.lock:
+            self.stats["requests"] += 1
+            self.stats["by_model"][model] = self.stats["by_model"].get(model, 0) + 1
+            now = time.monotonic()
+            while self.request_times and self.request_times[0] < now - 60:
+                self.request_times.popleft()
+            if self.max_rpm and len(self.request_times) >= self.max_rpm:
+                return 429, f"Rate limit exceeded: {self.max_rpm} requests per minute"
+            self.request_times.append(now)
+            roll = self.rng.random()
+            if roll < self.rate_429:
+                return 429, "Rate limit exceeded (injected)"
+            if roll < self.rate_429 + self.error_rate:
+                return self.rng.choice(SERVER_ERRORS)
+            return None
+
+    def count(self, status: int, kind: str | None = None, completion_tokens: int = 0):
+        with self.lock:
+            self.stats["by_status"][str(status)] = self.stats["by_status"].get(str(status), 0) + 1
+            if kind:
+                self.stats["by_kind"][kind] = self.stats["by_kind"].get(kind, 0) + 1
+            self.stats["completion_tokens"] += completion_tokens
+
+    def enter(self):
+        with self.lock:
+            self.stats["in_flight"] += 1
+            self.stats["peak_in_flight"] = max(self.stats["peak_in_flight"], self.stats["in_flight"])
+
+    def leave(self):
+        with self.lock:
+            self.stats["in_flight"] -= 1
+
+    def cached_prefix_tokens(self, messages: list[dict]) -> int:
+        """Tokens up to the request's last cache breakpoint if an earlier request sent the same prefix."""
+        breakpoint = None
+        for index, message in enumerate(messages):
+            content = message.get("content")
+            if isinstance(content, list) and any(isinstance(part, dict) and part.get("cache_control") for part in content):
+                breakpoint = index
+        if breakpoint is None:
+            return 0
+        prefix = json.dumps(messages[:breakpoint + 1], sort_keys=True)
+        key = hashlib.sha256(prefix.encode("utf-8")).hexdigest()
+        with self.lock:
+            if key not in self.cached_prefixes:
+                self.cached_prefixes.add(key)
+                return 0
+            tokens = max(1, len(prefix) // CHARS_PER_TOKEN)
+            self.stats["cached_tokens"] += tokens
+            return tokens
+
+    def add_file(self, filename: str, purpose: str, data: bytes) -> dict:
+        with self.lock:
+            file_id = f"file-stub-{len(self.files) + 1}"
+            self.files[file_id] = {"object": {"id": file_id, "object": "file", "bytes": len(data), "created_at": int(time.time()),
+                                              "filename": filename, "purpose": purpose, "status": "processed"}, "data": data}
+            return self.files[file_id]["object"]
+
+    def create_batch(self, input_file_id: str, endpoint: str, completion_window: str, metadata: dict | None) -> dict:
+        now = int(time.time())
+        with self.lock:
+            batch_id = f"batch_stub_{len(self.batches) + 1}"
+            self.batches[batch_id] = {
+                "id": batch_id, "object": "batch", "endpoint": endpoint, "errors": None, "input_file_id": input_file_id,
+                "completion_window": completion_window, "status": "in_progress", "output_file_id": None, "error_file_id": None,
+                "created_at": now, "in_progress_at": now, "expires_at": now + 24 * 3600, "finalizing_at": None,
+                "completed_at": None, "failed_at": None, "expired_at": None, "cancelling_at": None, "cancelled_at": None,
+                "request_counts": {"total": 0, "completed": 0, "failed": 0}, "metadata": metadata,
+            }
+        timer = threading.Timer(self.batch_seconds, self._run_batch, (batch_id,))
+        timer.daemon = True
+        timer.start()
+        return dict(self.batches[batch_id])
+
+    def _run_batch(self, batch_id: str):
+        with self.lock:
+            batch = self.batches[batch_id]
+            if batch["status"] != "in_progress":
+                return
+            data = self.files[batch["input_file_id"]]["data"]
+        output_lines, error_lines = [], []
+        for n, line in enumerate(data.decode("utf-8").splitlines()):
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            body = request.get("body") or {}
+            model = body.get("model") or "unknown"
+            with self.lock:
+                failed = self.rng.random() < self.error_rate
+            if failed:
+                status, message = self.rng.choice(SERVER_ERRORS)
+                error_lines.append({"id": f"batch_req_{n}", "custom_id": request.get("custom_id"),
+                                    "response": {"status_code": status, "request_id": f"req_{n}", "body": {"error": {"message": message, "code": status}}}, "error": None})
+                self.count(status)
+                continue
+            kind, text, _ = self.responder.respond(model, body.get("messages") or [])
+            prompt_tokens = max(1, len(json.dumps(body.get("messages") or [])) // CHARS_PER_TOKEN)
+            completion_tokens = max(1, len(text) // CHARS_PER_TOKEN)
+            completion = {"id": f"chatcmpl-stub-batch-{n}", "object": "chat.completion", "created": int(time.time()), "model": model,
+                          "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                          "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}}
+            output_lines.append({"id": f"batch_req_{n}", "custom_id": request.get("custom_id"),
+                                 "response": {"status_code": 200, "request_id": f"req_{n}", "body": completion}, "error": None})
+            self.count(200, kind, completion_tokens)
+        as_jsonl = lambda lines: "".join(json.dumps(line) + "\n" for line in lines).encode("utf-8")
+        output_file = self.add_file(f"{batch_id}_output.jsonl", "batch_output", as_jsonl(output_lines)) if output_lines else None
+        error_file = self.add_file(f"{batch_id}_error.jsonl", "batch_output", as_jsonl(error_lines)) if error_lines else None
+        with self.lock:
+            if batch["status"] != "in_progress":
+                return  # Cancelled meanwhile.
+            batch.update({
+                "status": "completed", "finalizing_at": int(time.time()), "completed_at": int(time.time()),
+                "output_file_id": output_file and output_file["id"], "error_file_id": error_file and error_file["id"],
+                "request_counts": {"total": len(output_lines) + len(error_lines), "completed": len(output_lines), "failed": len(error_lines)},
+            })
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real API.
+    server_version = "OpenRouterStub/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: dict, headers: dict | None = None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+
+    def do_GET(self):
+        state = self.server.state
+        files_match, batches_match = FILES_PATH_RE.search(self.path), BATCHES_PATH_RE.search(self.path)
+        if self.path.rstrip("/").endswith("/stats"):
+            with state.lock:
+                self._send_json(200, json.loads(json.dumps(state.stats)))
+        elif self.path.rstrip("/").endswith("/models"):
+            with state.lock:
+                models = list(state.stats["by_model"])
+            self._send_json(200, {"object": "list", "data": [{"id": m, "object": "model"} for m in models]})
+        elif files_match and files_match.group(1):
+            file_id, content = files_match.groups()
+            stored = state.files.get(file_id)
+            if not stored:
+                self._send_json(404, {"error": {"message": f"No such file {file_id}", "code": 404}})
+            elif content:
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(len(stored["data"])))
+                self.end_headers()
+                self.wfile.write(stored["data"])
+            else:
+                self._send_json(200, stored["object"])
+        elif batches_match and batches_match.group(1):
+            batch_id = batches_match.group(1)
+            with state.lock:
+                batch = dict(state.batches[batch_id]) if batch_id in state.batches else None
+            if batch:
+                self._send_json(200, batch)
+            else:
+                self._send_json(404, {"error": {"message": f"No such batch {batch_id}", "code": 404}})
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}", "code": 404}})
+
+    def do_POST(self):
+        state = self.server.state
+        length = int(self.headers.get("Content-Length") or 0)
+        raw_body = self.rfile.read(length) if length else b""
+        if self.path.rstrip("/").endswith("/stats/reset"):
+            state.reset()
+            self._send_json(200, {"ok": True})
+            return
+        if FILES_PATH_RE.search(self.path) or BATCHES_PATH_RE.search(self.path):
+            self._batch_api(state, raw_body)
+            return
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}", "code": 404}})
+            return
+        try:
+            request = json.loads(raw_body or b"{}")
+        except ValueError:
+            state.count(400)
+            self._send_json(400, {"error": {"message": "Request body is not valid JSON", "code": 400}})
+            return
+        model = request.get("model") or "unknown"
+        failure = state.admit(model)
+        if failure:
+            status, message = failure
+            state.count(status)
+            self._send_json(status, {"error": {"message": message, "code": status}}, {"Retry-After": "1"} if status == 429 else None)
+            return
+
+        state.enter()
+        try:
+            kind, text, citations = state.responder.respond(model, request.get("messages") or [])
+            prompt_tokens = max(1, len(json.dumps(request.get("messages") or [])) // CHARS_PER_TOKEN)
+            completion_tokens = max(1, len(text) // CHARS_PER_TOKEN)
+            cached_tokens = min(prompt_tokens, state.cached_prefix_tokens(request.get("messages") or []))
+            with state.lock:
+                first_token_seconds = sample_latency(state.latency_for(model), state.rng)
+            # Reading a cached prefix skips most of its prefill time.
+            first_token_seconds *= 1 - 0.5 * cached_tokens / prompt_tokens
+            generation_seconds = completion_tokens * state.seconds_per_token
+            usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+            if cached_tokens:
+                usage["prompt_tokens_details"] = {"cached_tokens": cached_tokens}
+            response_id = f"chatcmpl-stub-{state.stats['requests']}-{threading.get_ident()}"
+            annotations = [{"type": "url_citation", "url_citation": {"url": url, "title": f"Source {i + 1}"}} for i, url in enumerate(citations)]
+            if request.get("stream"):
+                self._stream(model, response_id, text, citations, usage, first_token_seconds, generation_seconds)
+            else:
+                time.sleep(first_token_seconds + generation_seconds)
+                message = {"role": "assistant", "content": text}
+                if annotations:
+                    message["annotations"] = annotations
+                payload = {
+                    "id": response_id, "object": "chat.completion", "created": int(time.time()), "model": model,
+                    "choices": [{"index": 0, "message": message, "finish_reason": "stop"}], "usage": usage,
+                }
+                if citations:
+                    payload["citations"] = citations
+                self._send_json(200, payload)
+            state.count(200, kind, completion_tokens)
+        finally:
+            state.leave()
+
+    def _batch_api(self, state: StubState, raw_body: bytes):
+        files_match, batches_match = FILES_PATH_RE.search(self.path), BATCHES_PATH_RE.search(self.path)
+        if files_match and not files_match.group(1):
+            # multipart/form-data upload with a "purpose" field and a "file" part.
+            message = BytesParser(policy=policy.default).parsebytes(b"Content-Type: " + self.headers.get("Content-Type", "").encode("latin-1") + b"\r\n\r\n" + raw_body)
+            fields = {part.get_param("name", header="content-disposition"): part for part in message.iter_parts()} if message.is_multipart() else {}
+            if "file" not in fields:
+                self._send_json(400, {"error": {"message": "Expected a multipart upload with a 'file' part", "code": 400}})
+                return
+            purpose = (fields["purpose"].get_payload(decode=True) or b"").decode("utf-8") if "purpose" in fields else "batch"
+            self._send_json(200, state.add_file(fields["file"].get_filename() or "upload.jsonl", purpose, fields["file"].get_payload(decode=True) or b""))
+        elif batches_match and not batches_match.group(1):
+            try:
+                request = json.loads(raw_body or b"{}")
+            except ValueError:
+                self._send_json(400, {"error": {"message": "Request body is not valid JSON", "code": 400}})
+                return
+            if request.get("input_file_id") not in state.files:
+                self._send_json(400, {"error": {"message": f"No such file {request.get('input_file_id')}", "code": 400}})
+                return
+            self._send_json(200, state.create_batch(request["input_file_id"], request.get("endpoint", "/v1/chat/completions"),
+                                                    request.get("completion_window", "24h"), request.get("metadata")))
+        elif batches_match and batches_match.group(2):
+            with state.lock:
+                batch = state.batches.get(batches_match.group(1))
+                if batch and batch["status"] == "in_progress":
+                    batch.update({"status": "cancelled", "cancelling_at": int(time.time()), "cancelled_at": int(time.time())})
+                batch = dict(batch) if batch else None
+            if batch:
+                self._send_json(200, batch)
+            else:
+                self._send_json(404, {"error": {"message": f"No such batch {batches_match.group(1)}", "code": 404}})
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}", "code": 404}})
+
+    def _stream(self, model, response_id, text, citations, usage, first_token_seconds, generation_seconds):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        time.sleep(first_token_seconds)
+        piece = max(1, math.ceil(len(text) / STREAM_CHUNKS))
+        base = {"id": response_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model}
+        for start in range(0, len(text), piece):
+            chunk = {**base, "choices": [{"index": 0, "delta": {"role": "assistant", "content": text[start:start + piece]}, "finish_reason": None}]}
+            self._write_chunk(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            time.sleep(generation_seconds / STREAM_CHUNKS)
+        final = {**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "usage": usage}
+        if citations:
+            final["citations"] = citations
+        self._write_chunk(f"data: {json.dumps(final)}\n\n".encode("utf-8"))
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+
+def add_stub_arguments(parser: argparse.ArgumentParser):
+    """Stub options, shared with benchmark.py."""
+    parser.add_argument("--latency", default=STUB_LATENCY, help="Time to first token: fixed:S, uniform:LOW:HIGH, lognormal:MEDIAN:SIGMA or exponential:MEAN.")
+    parser.add_argument("--model-latency", default=STUB_MODEL_LATENCY, help="Per-model latency, e.g. 'perplexity=lognormal:4:0.4;claude=fixed:3'.")
+    parser.add_argument("--seconds-per-token", type=float, default=STUB_SECONDS_PER_TOKEN, help="Generation time per completion token.")
+    parser.add_argument("--error-rate", type=float, default=STUB_ERROR_RATE, help="Share of requests failing with a 5xx error.")
+    parser.add_argument("--rate-429", type=float, default=STUB_429_RATE, help="Share of requests failing with a 429.")
+    parser.add_argument("--max-rpm", type=int, default=STUB_MAX_RPM, help="Requests per minute before 429s (0: unlimited).")
+    parser.add_argument("--article-words", type=int, default=STUB_ARTICLE_WORDS)
+    parser.add_argument("--plan-sections", type=int, default=STUB_PLAN_SECTIONS)
+    parser.add_argument("--clusters-per-table", type=int, default=STUB_CLUSTERS_PER_TABLE)
+    parser.add_argument("--citations", type=int, default=STUB_CITATIONS, help="Citation URLs per research answer.")
+    parser.add_argument("--batch-seconds", type=float, default=STUB_BATCH_SECONDS, help="Time from batch creation to completion.")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for latencies and injected errors.")
+
+
+def stub_argv(args) -> list[str]:
+    """Command line options reproducing the stub options of `args` (for starting the stub as a subprocess)."""
+    argv = ["--latency", args.latency, "--model-latency", args.model_latency, "--seconds-per-token", str(args.seconds_per_token),
+            "--error-rate", str(args.error_rate), "--rate-429", str(args.rate_429), "--max-rpm", str(args.max_rpm),
+            "--article-words", str(args.article_words), "--plan-sections", str(args.plan_sections),
+            "--clusters-per-table", str(args.clusters_per_table), "--citations", str(args.citations),
+            "--batch-seconds", str(args.batch_seconds)]
+    if args.seed is not None:
+        argv += ["--seed", str(args.seed)]
+    return argv
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Local OpenAI/OpenRouter-compatible stand-in server for offline benchmarks.")
+    parser.add_argument("--host", default=STUB_HOST)
+    parser.add_argument("--port", type=int, default=STUB_PORT, help="Port to listen on (0: any free port).")
+    add_stub_arguments(parser)
+    args = parser.parse_args(argv)
+    try:
+        state = StubState(args)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return 2
+    server = ThreadingHTTPServer((args.host, args.port), StubHandler)
+    server.daemon_threads = True
+    server.state = state
+    host, port = server.server_address[:2]
+    # benchmark.py reads this line to find the port.
+    print(f"OpenRouter stub listening on http://{host}:{port}/api/v1", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,244 @@
+import os
+import sys
+import json
+import time
+import contextvars
+from contextlib import contextmanager
+
+# --- LLM Call Metrics ---
+# Every call through llm_gateway.acompletion() is recorded with its stage, model, tokens,
+# estimated cost, latency, retries and cache use: one JSON line per call in llm_calls.jsonl
+# and per-script totals in Prometheus text format (<script>.prom, for node_exporter's
+# textfile collector). `python metrics.py` (or `seo metrics`) summarizes a run.
+METRICS_ENABLED = os.getenv("LLM_METRICS", "1").strip().lower() not in ("0", "false", "no", "off")
+METRICS_DIR = os.getenv(
+    "METRICS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".seo_cache", "metrics")
+)
+CALLS_LOG_NAME = "llm_calls.jsonl"
+LATENCY_BUCKETS = (0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300)
+
+_current_call = contextvars.ContextVar("llm_call_metrics", default=None)
+_run_id = None
+_run_records = []
+_series = {}  # (script, stage, model) -> totals and latency histogram
+
+
+def _percentile(values, percentile: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(percentile * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def start_run(script_name: str) -> str:
+    """Starts a new run (called by llm_gateway.configure); its calls share the returned run id."""
+    global _run_id, _run_records
+    _run_id = f"{script_name}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+    _run_records = []
+    return _run_id
+
+
+def count(field: str, amount: float = 1):
+    """Adds to a counter of the LLM call in progress (retries, fallbacks, hedges, cost_usd, ...)."""
+    call = _current_call.get()
+    if call is not None:
+        call[field] = call.get(field, 0) + amount
+
+
+def annotate(**fields):
+    """Sets fields of the LLM call in progress, e.g. cache="hit"."""
+    call = _current_call.get()
+    if call is not None:
+        call.update(fields)
+
+
+@contextmanager
+def track_call(script: str, stage: str | None, model: str | None):
+    """Measures one LLM call; the yielded dict is filled in by the call path and recorded on exit."""
+    call = {"stage": stage or "unnamed", "model": model or "", "retries": 0, "provider_calls": 0}
+    token = _current_call.set(call)
+    started = time.monotonic()
+    try:
+        yield call
+        call["outcome"] = "ok"
+    except BaseException as e:
+        call["outcome"] = "cancelled" if type(e).__name__ == "CancelledError" else "error"
+        call["error"] = type(e).__name__
+        raise
+    finally:
+        _current_call.reset(token)
+        call["latency_seconds"] = round(time.monotonic() - started, 3)
+        if METRICS_ENABLED:
+            _record(script, call)
+
+
+def _record(script: str, call: dict):
+    if call["provider_calls"] == 0:
+        call["cost_usd"] = 0.0  # Served by the cache or by an identical in-flight request.
+    record = {"ts": round(time.time(), 3), "run_id": _run_id or script, "script": script, **call}
+    if "cost_usd" in record and record["cost_usd"] is not None:
+        record["cost_usd"] = round(record["cost_usd"], 6)
+    _run_records.append(record)
+
+    totals = _series.setdefault((script, record["stage"], record["model"]), {
+        "calls": 0, "errors": 0, "cache_hits": 0, "retries": 0, "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0,
+        "cost_usd": 0.0, "latency_sum": 0.0, "buckets": [0] * len(LATENCY_BUCKETS),
+    })
+    totals["calls"] += 1
+    totals["errors"] += record["outcome"] != "ok"
+    totals["cache_hits"] += record.get("cache") == "hit"
+    totals["retries"] += record["retries"]
+    totals["prompt_tokens"] += record.get("prompt_tokens") or 0
+    totals["cached_tokens"] += record.get("cached_tokens") or 0
+    totals["completion_tokens"] += record.get("completion_tokens") or 0
+    totals["cost_usd"] += record.get("cost_usd") or 0.0
+    totals["latency_sum"] += record["latency_seconds"]
+    for i, bound in enumerate(LATENCY_BUCKETS):
+        if record["latency_seconds"] <= bound:
+            totals["buckets"][i] += 1
+
+    try:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        with open(os.path.join(METRICS_DIR, CALLS_LOG_NAME), "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+    except OSError as e:
+        print(f"Warning: Could not write LLM call metrics: {e}")
+
+
+def _labels(**labels) -> str:
+    escaped = {k: str(v).replace("\\", "\\\\").replace('"', '\\"') for k, v in labels.items()}
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped.items()) + "}"
+
+
+def write_prometheus(script: str, concurrency_limits: dict | None = None) -> str | None:
+    """Writes this process's totals for `script` to <METRICS_DIR>/<script>.prom. Returns the path."""
+    if not METRICS_ENABLED:
+        return None
+    counters = [
+        ("seo_llm_calls_total", "calls", "LLM calls."),
+        ("seo_llm_errors_total", "errors", "LLM calls that failed."),
+        ("seo_llm_cache_hits_total", "cache_hits", "LLM calls served from the response cache."),
+        ("seo_llm_retries_total", "retries", "Retried provider requests."),
+        ("seo_llm_prompt_tokens_total", "prompt_tokens", "Prompt tokens."),
+        ("seo_llm_cached_prompt_tokens_total", "cached_tokens", "Prompt tokens read from the provider's prompt cache."),
+        ("seo_llm_completion_tokens_total", "completion_tokens", "Completion tokens."),
+        ("seo_llm_cost_usd_total", "cost_usd", "Estimated provider cost in USD."),
+    ]
+    series = {(stage, model): totals for (s, stage, model), totals in _series.items() if s == script}
+    lines = []
+    for metric, field, help_text in counters:
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+        for (stage, model), totals in sorted(series.items()):
+            lines.append(f"{metric}{_labels(script=script, stage=stage, model=model)} {totals[field]}")
+    lines += ["# HELP seo_llm_latency_seconds LLM call latency.", "# TYPE seo_llm_latency_seconds histogram"]
+    for (stage, model), totals in sorted(series.items()):
+        for bound, bucket_count in zip(LATENCY_BUCKETS, totals["buckets"]):
+            lines.append(f"seo_llm_latency_seconds_bucket{_labels(script=script, stage=stage, model=model, le=bound)} {bucket_count}")
+        lines.append(f"seo_llm_latency_seconds_bucket{_labels(script=script, stage=stage, model=model, le='+Inf')} {totals['calls']}")
+        lines.append(f"seo_llm_latency_seconds_sum{_labels(script=script, stage=stage, model=model)} {round(totals['latency_sum'], 3)}")
+        lines.append(f"seo_llm_latency_seconds_count{_labels(script=script, stage=stage, model=model)} {totals['calls']}")
+    if concurrency_limits:
+        lines += ["# HELP seo_llm_concurrency_limit Adaptive concurrency limit per model.", "# TYPE seo_llm_concurrency_limit gauge"]
+        for model, limit in sorted(concurrency_limits.items()):
+            lines.append(f"seo_llm_concurrency_limit{_labels(script=script, model=model)} {round(limit, 2)}")
+
+    path = os.path.join(METRICS_DIR, f"{script}.prom")
+    try:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(temp_path, path)
+    except OSError as e:
+        print(f"Warning: Could not write Prometheus metrics to {path}: {e}")
+        return None
+    return path
+
+
+def summarize(records: list[dict], group_by: str) -> list[dict]:
+    """Per-group call counts, tokens, cost and latency p50/p95."""
+    groups = {}
+    for record in records:
+        groups.setdefault(record.get(group_by) or "", []).append(record)
+    rows = []
+    for name, group in groups.items():
+        latencies = [r["latency_seconds"] for r in group]
+        costs = [r.get("cost_usd") for r in group]
+        rows.append({
+            group_by: name,
+            "calls": len(group),
+            "errors": sum(r["outcome"] != "ok" for r in group),
+            "cache_hits": sum(r.get("cache") == "hit" for r in group),
+            "retries": sum(r.get("retries", 0) for r in group),
+            "prompt_tokens": sum(r.get("prompt_tokens") or 0 for r in group),
+            "cached_tokens": sum(r.get("cached_tokens") or 0 for r in group),
+            "completion_tokens": sum(r.get("completion_tokens") or 0 for r in group),
+            "cost_usd": None if all(c is None for c in costs) else round(sum(c or 0 for c in costs), 4),
+            "p50_seconds": _percentile(latencies, 0.5),
+            "p95_seconds": _percentile(latencies, 0.95),
+            "total_seconds": round(sum(latencies), 1),
+        })
+    return sorted(rows, key=lambda row: -row["total_seconds"])
+
+
+def print_summary(records: list[dict], title: str):
+    if not records:
+        print(f"{title}: no LLM calls recorded.")
+        return
+    wall_seconds = max(r["ts"] for r in records) - min(r["ts"] - r["latency_seconds"] for r in records)
+    known_costs = [r["cost_usd"] for r in records if r.get("cost_usd") is not None]
+    print(f"\n{title}: {len(records)} LLM calls over {wall_seconds:.0f}s, estimated cost ${sum(known_costs):.4f}"
+          f"{'' if len(known_costs) == len(records) else ' (cost unknown for some models)'}.")
+    for group_by in ("stage", "model"):
+        print(f"{group_by.capitalize():<40} {'calls':>5} {'err':>4} {'cache':>5} {'retry':>5} {'prompt':>8} {'cached':>8} {'compl':>7} "
+              f"{'cost $':>8} {'p50 s':>7} {'p95 s':>7}")
+        for row in summarize(records, group_by):
+            cost = f"{row['cost_usd']:.4f}" if row["cost_usd"] is not None else "n/a"
+            print(f"{row[group_by][:40]:<40} {row['calls']:>5} {row['errors']:>4} {row['cache_hits']:>5} {row['retries']:>5} "
+                  f"{row['prompt_tokens']:>8} {row['cached_tokens']:>8} {row['completion_tokens']:>7} {cost:>8} {row['p50_seconds']:>7.1f} {row['p95_seconds']:>7.1f}")
+
+
+def print_run_summary():
+    """Summary of the current run's calls (called at the end of each script)."""
+    if METRICS_ENABLED:
+        print_summary(_run_records, f"LLM metrics for run {_run_id}")
+
+
+def load_records(path: str | None = None) -> list[dict]:
+    path = path or os.path.join(METRICS_DIR, CALLS_LOG_NAME)
+    records = []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue  # A line cut short by a crash.
+    except FileNotFoundError:
+        pass
+    return records
+
+
+def main(argv: list[str]) -> int:
+    """Usage: python metrics.py [last|all|list|<run_id>] (default: last)."""
+    selector = argv[0] if argv else "last"
+    records = load_records()
+    run_ids = list(dict.fromkeys(r["run_id"] for r in records))
+    if selector == "list":
+        for run_id in run_ids:
+            run_records = [r for r in records if r["run_id"] == run_id]
+            print(f"{run_id}: {len(run_records)} calls")
+        return 0
+    if selector == "all":
+        print_summary(records, "LLM metrics for all runs")
+        return 0
+    run_id = run_ids[-1] if selector == "last" and run_ids else selector
+    run_records = [r for r in records if r["run_id"] == run_id]
+    if not run_records:
+        print(f"No LLM call metrics found for '{selector}' in {os.path.join(METRICS_DIR, CALLS_LOG_NAME)}.")
+        return 1
+    print_summary(run_records, f"LLM metrics for run {run_id}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,170 @@
+import os
+import json
+import time
+import random
+
+import metrics
+
+# --- Latency-Aware Model Routing ---
+# MODEL_ROUTES lists the models a stage may use instead of the one configured in the script,
+# e.g. "HtmlConverter=openrouter/openai/gpt-4o-mini|openrouter/google/gemini-2.5-flash,
+# PreliminaryPlanner=openrouter/openai/gpt-4o". The configured model is always a candidate.
+# For each call the router picks the fastest healthy candidate from the recent latencies and
+# errors of that stage and model, so one slow upstream model no longer slows every run.
+# MODEL_PINS lists stages that must keep a specific model whatever the routes say: a bare
+# stage name keeps the configured model, "Stage=model" forces that model. Stage names are
+# the agent names used in the logs (see llm_gateway.stage()). Every decision is appended to
+# .seo_cache/metrics/routing.jsonl.
+ROUTER_WINDOW = int(os.getenv("ROUTER_WINDOW", "20"))  # Recent calls per stage and model.
+ROUTER_MAX_AGE_SECONDS = float(os.getenv("ROUTER_MAX_AGE_SECONDS", "3600"))  # Older calls are ignored.
+ROUTER_MIN_SAMPLES = int(os.getenv("ROUTER_MIN_SAMPLES", "3"))  # Calls before a model's latency is trusted.
+ROUTER_MAX_ERROR_RATE = float(os.getenv("ROUTER_MAX_ERROR_RATE", "0.25"))  # Above this a model is unhealthy.
+ROUTER_SWITCH_MARGIN = float(os.getenv("ROUTER_SWITCH_MARGIN", "0.2"))  # Leave the configured model only for a 20% faster one.
+ROUTER_EXPLORE_RATE = float(os.getenv("ROUTER_EXPLORE_RATE", "0.1"))  # Share of calls that try a model with too few samples.
+DEFAULT_STATS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".seo_cache", "model_latencies.json")
+DECISIONS_LOG_NAME = "routing.jsonl"
+
+
+def _parse_routes(value: str) -> dict:
+    routes = {}
+    for item in value.split(","):
+        stage, _, models = item.strip().partition("=")
+        candidates = [model.strip() for model in models.split("|") if model.strip()]
+        if stage.strip() and candidates:
+            routes[stage.strip()] = candidates
+    return routes
+
+
+def _parse_pins(value: str) -> dict:
+    pins = {}
+    for item in value.split(","):
+        stage, _, model = item.strip().partition("=")
+        if stage.strip():
+            pins[stage.strip()] = model.strip() or None
+    return pins
+
+
+MODEL_ROUTES = _parse_routes(os.getenv("MODEL_ROUTES", ""))
+# The analyzer's search model browses the URL and the research model returns the citations.
+MODEL_PINS = _parse_pins(os.getenv("MODEL_PINS", "Analyzer,OnlineResearchPerplexity"))
+
+
+def _percentile(values, percentile: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(percentile * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class ModelRouter:
+    """
+    Chooses the model for each call of a routed stage. Outcomes are kept per stage and model
+    in a small JSON file (like the hedge latencies), so what one run learns about a slow or
+    failing model is used by the next run and by the other scripts.
+    """
+
+    def __init__(self, path: str = DEFAULT_STATS_PATH, health_check=None):
+        self.path = path
+        self.health_check = health_check  # model -> False while its circuit breaker is open.
+        self.samples = self._read_file()
+        self.decisions = 0
+        self.rerouted = {}
+        self.rng = random.Random()
+
+    def _read_file(self) -> dict:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def candidates_for(self, stage: str | None, model: str) -> list[str]:
+        if not self.is_routed(stage):
+            return []
+        return [model] + [candidate for candidate in MODEL_ROUTES[stage] if candidate != model]
+
+    def is_routed(self, stage: str | None) -> bool:
+        return stage is not None and stage in MODEL_ROUTES and stage not in MODEL_PINS
+
+    def _recent(self, stage: str, model: str) -> list:
+        cutoff = time.time() - ROUTER_MAX_AGE_SECONDS
+        return [sample for sample in self.samples.get(f"{stage}|{model}", []) if sample[0] >= cutoff]
+
+    def model_stats(self, stage: str, model: str) -> dict:
+        recent = self._recent(stage, model)
+        latencies = [latency for _, latency in recent if latency is not None]
+        errors = len(recent) - len(latencies)
+        error_rate = errors / len(recent) if recent else 0.0
+        healthy = (len(recent) < ROUTER_MIN_SAMPLES or error_rate <= ROUTER_MAX_ERROR_RATE) and \
+            (self.health_check is None or self.health_check(model))
+        return {
+            "samples": len(recent),
+            "p50_seconds": round(_percentile(latencies, 0.5), 3) if latencies else None,
+            "error_rate": round(error_rate, 3),
+            "healthy": healthy,
+        }
+
+    def choose(self, stage: str | None, model: str, script: str = "") -> str:
+        """The model to send a call of `stage` to; `model` is the one the script configured."""
+        if stage in MODEL_PINS:
+            return MODEL_PINS[stage] or model
+        candidates = self.candidates_for(stage, model)
+        if not candidates:
+            return model
+        stats = {candidate: self.model_stats(stage, candidate) for candidate in candidates}
+        healthy = [candidate for candidate in candidates if stats[candidate]["healthy"]]
+        measured = [candidate for candidate in healthy if stats[candidate]["samples"] >= ROUTER_MIN_SAMPLES and stats[candidate]["p50_seconds"] is not None]
+        untried = [candidate for candidate in healthy if candidate not in measured]
+
+        if untried and (not measured or self.rng.random() < ROUTER_EXPLORE_RATE):
+            # Too few recent calls to judge: the configured model first, then the others now and then.
+            chosen = model if model in untried else self.rng.choice(untried)
+            reason = "explore" if measured else "no data"
+        elif measured:
+            fastest = min(measured, key=lambda candidate: stats[candidate]["p50_seconds"])
+            if model in measured and stats[fastest]["p50_seconds"] > stats[model]["p50_seconds"] * (1 - ROUTER_SWITCH_MARGIN):
+                chosen, reason = model, "configured"
+            else:
+                chosen, reason = fastest, "fastest" if stats[model]["healthy"] else "configured unhealthy"
+        else:
+            chosen, reason = model, "no healthy candidate"
+
+        self.decisions += 1
+        if chosen != model:
+            self.rerouted.setdefault(stage, {}).setdefault(chosen, 0)
+            self.rerouted[stage][chosen] += 1
+            print(f"Routing stage '{stage}' to '{chosen}' instead of '{model}' ({reason}).")
+        self._log_decision(script, stage, model, chosen, reason, stats)
+        return chosen
+
+    def _log_decision(self, script: str, stage: str, model: str, chosen: str, reason: str, stats: dict):
+        if not metrics.METRICS_ENABLED:
+            return
+        record = {"ts": round(time.time(), 3), "script": script, "stage": stage, "configured": model,
+                  "chosen": chosen, "reason": reason, "candidates": stats}
+        try:
+            os.makedirs(metrics.METRICS_DIR, exist_ok=True)
+            with open(os.path.join(metrics.METRICS_DIR, DECISIONS_LOG_NAME), "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+        except OSError as e:
+            print(f"Warning: Could not write the routing decision log: {e}")
+
+    def record(self, stage: str, model: str, latency_seconds: float | None):
+        """Records one provider call of a routed stage; latency None for a failed call."""
+        key = f"{stage}|{model}"
+        self.samples[key] = (self._recent(stage, model) + [[round(time.time(), 3), None if latency_seconds is None else round(latency_seconds, 3)]])[-ROUTER_WINDOW:]
+        # Merge with what other processes wrote since this file was loaded; last writer wins per stage and model.
+        data = self._read_file()
+        data[key] = self.samples[key]
+        self.samples = data
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            temp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            print(f"Warning: Could not save model latencies to {self.path}: {e}")
+
+    def stats(self) -> dict:
+        return {"decisions": self.decisions, "rerouted": self.rerouted}
@@ -0,0 +1,58 @@
+import os
+
+# --- Provider Prompt-Prefix Caching ---
+# The scripts send their fixed instructions first, as the system message (the agent
+# instruction), and the per-call content after it, so repeated calls of a stage start with
+# the same prefix. OpenAI, DeepSeek and Gemini 2.5 models cache such a prefix on their own;
+# Anthropic models only cache up to an explicit breakpoint, which is added here as a
+# `cache_control` marker on the system message just before the request is sent (response
+# cache keys and cassettes are computed without it). Cached prompt tokens are read back from
+# the usage of each response and recorded in the metrics.
+PROMPT_CACHE_ENABLED = os.getenv("PROMPT_CACHE", "1").strip().lower() not in ("0", "false", "no", "off")
+# Models (substrings of the model name) that need explicit cache breakpoints.
+PROMPT_CACHE_BREAKPOINT_MODELS = [m.strip() for m in os.getenv("PROMPT_CACHE_BREAKPOINT_MODELS", "anthropic/,claude").split(",") if m.strip()]
+CACHE_CONTROL = {"type": "ephemeral"}
+
+
+def needs_breakpoint(model: str) -> bool:
+    return PROMPT_CACHE_ENABLED and any(pattern in (model or "").lower() for pattern in PROMPT_CACHE_BREAKPOINT_MODELS)
+
+
+def with_cache_breakpoint(request_kwargs: dict) -> dict:
+    """
+    The request with a cache breakpoint after its leading system messages, for models that
+    need one. ADK sends the agent instruction with the "developer" role, which is sent as a
+    system message here so that the breakpoint is accepted.
+    """
+    messages = request_kwargs.get("messages") or []
+    if not needs_breakpoint(request_kwargs.get("model")) or not messages or messages[0].get("role") not in ("system", "developer"):
+        return request_kwargs
+    last_static = 0
+    while last_static + 1 < len(messages) and messages[last_static + 1].get("role") in ("system", "developer"):
+        last_static += 1
+    message = dict(messages[last_static])
+    content = message.get("content")
+    if isinstance(content, str):
+        if not content.strip():
+            return request_kwargs
+        content = [{"type": "text", "text": content}]
+    elif isinstance(content, list) and content:
+        content = [dict(part) for part in content]
+    else:
+        return request_kwargs
+    content[-1]["cache_control"] = CACHE_CONTROL
+    message["content"] = content
+    message["role"] = "system"
+    static_messages = [{**m, "role": "system"} for m in messages[:last_static]]
+    return {**request_kwargs, "messages": static_messages + [message] + list(messages[last_static + 1:])}
+
+
+def cached_prompt_tokens(usage) -> int | None:
+    """Prompt tokens served from the provider's prompt cache, as reported in the usage (None if not reported)."""
+    if usage is None:
+        return None
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", None) if details is not None else None
+    if cached is None:
+        cached = getattr(usage, "cache_read_input_tokens", None)
+    return cached
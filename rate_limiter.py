@@ -0,0 +1,191 @@
+import os
+import json
+import time
+import asyncio
+import sqlite3
+
+# --- Configuration ---
+# Budgets are per model and shared by every process on the host through one SQLite file,
+# so the analyzer, keyword planner and blog generator can run side by side without
+# exhausting the OpenRouter limits of the shared OPENROUTER_API_KEY.
+DEFAULT_STATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".seo_cache", "rate_limits.sqlite3")
+DEFAULT_REQUESTS_PER_MINUTE = float(os.getenv("RATE_LIMIT_RPM", "60"))
+DEFAULT_TOKENS_PER_MINUTE = float(os.getenv("RATE_LIMIT_TPM", "400000"))
+DEFAULT_COMPLETION_TOKENS = 2000  # Reserved for the response when a request sets no max_tokens.
+
+# Per-model overrides as (requests per minute, tokens per minute). Models are matched by the
+# exact LiteLLM model string first, then by the longest prefix.
+MODEL_RATE_LIMITS = {
+    "openrouter/perplexity/": (20, 200000),
+}
+
+
+def _parse_rate_limit_overrides(value: str) -> dict:
+    """
+    Parses RATE_LIMITS, e.g. "openrouter/openai/gpt-4o=30:300000,openrouter/perplexity/=10:100000".
+    Either part may be left empty to keep the default ("model=:50000").
+    """
+    overrides = {}
+    for item in value.split(","):
+        if "=" not in item:
+            continue
+        model, _, limits = item.strip().partition("=")
+        rpm, _, tpm = limits.partition(":")
+        try:
+            overrides[model.strip()] = (float(rpm) if rpm.strip() else None, float(tpm) if tpm.strip() else None)
+        except ValueError:
+            print(f"Warning: Ignoring invalid RATE_LIMITS entry '{item.strip()}'.")
+    return overrides
+
+
+MODEL_RATE_LIMITS.update(_parse_rate_limit_overrides(os.getenv("RATE_LIMITS", "")))
+
+
+def limits_for_model(model: str) -> tuple[float, float]:
+    """Returns (requests per minute, tokens per minute) for a model."""
+    limits = MODEL_RATE_LIMITS.get(model)
+    if limits is None:
+        prefixes = [prefix for prefix in MODEL_RATE_LIMITS if model.startswith(prefix)]
+        if prefixes:
+            limits = MODEL_RATE_LIMITS[max(prefixes, key=len)]
+    rpm, tpm = limits if limits else (None, None)
+    return (rpm or DEFAULT_REQUESTS_PER_MINUTE, tpm or DEFAULT_TOKENS_PER_MINUTE)
+
+
+def estimate_request_tokens(request_kwargs: dict) -> int:
+    """Rough prompt size (4 characters per token) plus the completion budget of a request."""
+    prompt_chars = len(json.dumps(request_kwargs.get("messages") or [], default=str))
+    if request_kwargs.get("tools"):
+        prompt_chars += len(json.dumps(request_kwargs["tools"], default=str))
+    completion_tokens = request_kwargs.get("max_tokens") or request_kwargs.get("max_completion_tokens") or DEFAULT_COMPLETION_TOKENS
+    return prompt_chars // 4 + int(completion_tokens)
+
+
+class TokenBucketRateLimiter:
+    """
+    Cross-process token buckets, one pair per model: a request bucket and a token bucket,
+    each holding one minute of budget and refilled continuously. Bucket levels live in a
+    SQLite table and every update runs in a BEGIN IMMEDIATE transaction, so concurrent
+    processes serialize on the file lock and see each other's consumption. The updates run
+    in a worker thread: waiting for another process's lock must not stall the event loop.
+    """
+
+    def __init__(self, state_path: str = DEFAULT_STATE_PATH):
+        self.state_path = state_path
+        self.acquired = 0
+        self.throttled = 0
+        self.total_wait_seconds = 0.0
+        os.makedirs(os.path.dirname(state_path), exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                "model TEXT PRIMARY KEY, requests REAL NOT NULL, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.state_path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _try_consume(self, model: str, request_cost: float, token_cost: float) -> float:
+        """Consumes from both buckets if possible. Returns 0, or the seconds to wait before retrying."""
+        rpm, tpm = limits_for_model(model)
+        # A request larger than a whole minute of budget would never fit; let it through on a full bucket.
+        token_cost = min(token_cost, tpm)
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT requests, tokens, updated_at FROM buckets WHERE model = ?", (model,)).fetchone()
+            if row is None:
+                requests_available, tokens_available = rpm, tpm
+            else:
+                elapsed = max(0.0, now - row[2])
+                requests_available = min(rpm, row[0] + elapsed * rpm / 60)
+                tokens_available = min(tpm, row[1] + elapsed * tpm / 60)
+
+            if requests_available >= request_cost and tokens_available >= token_cost:
+                requests_available -= request_cost
+                tokens_available -= token_cost
+                wait_seconds = 0.0
+            else:
+                wait_seconds = max(
+                    (request_cost - requests_available) * 60 / rpm,
+                    (token_cost - tokens_available) * 60 / tpm,
+                    0.01,
+                )
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (model, requests, tokens, updated_at) VALUES (?, ?, ?, ?)",
+                (model, requests_available, tokens_available, now),
+            )
+            conn.execute("COMMIT")
+            return wait_seconds
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    async def acquire(self, model: str, estimated_tokens: int):
+        """Waits until one request and `estimated_tokens` tokens are available for the model."""
+        waited = 0.0
+        while True:
+            wait_seconds = await asyncio.to_thread(self._try_consume, model, 1, estimated_tokens)
+            if wait_seconds == 0:
+                break
+            if waited == 0:
+                self.throttled += 1
+                print(f"Rate limit: waiting for '{model}' budget ({wait_seconds:.1f}s).")
+            await asyncio.sleep(wait_seconds)
+            waited += wait_seconds
+        self.acquired += 1
+        self.total_wait_seconds += waited
+
+    async def record_usage(self, model: str, estimated_tokens: int, actual_tokens: int | None):
+        """Corrects the token bucket once the response reports its real usage."""
+        if not actual_tokens or actual_tokens == estimated_tokens:
+            return
+        await asyncio.to_thread(self._correct_tokens, model, actual_tokens - estimated_tokens)
+
+    def _correct_tokens(self, model: str, extra_tokens: int):
+        _, tpm = limits_for_model(model)
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            # The bucket may go negative: an underestimated request delays the next ones.
+            conn.execute(
+                "UPDATE buckets SET tokens = MIN(?, tokens - ?) WHERE model = ?",
+                (tpm, extra_tokens, model),
+            )
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    def stats(self) -> dict:
+        return {
+            "acquired": self.acquired,
+            "throttled": self.throttled,
+            "total_wait_seconds": round(self.total_wait_seconds, 2),
+        }
+
+    def snapshot(self) -> list[dict]:
+        """Current bucket levels of every model seen on this host."""
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT model, requests, tokens, updated_at FROM buckets ORDER BY model").fetchall()
+        finally:
+            conn.close()
+        return [{"model": r[0], "requests": round(r[1], 2), "tokens": round(r[2]), "updated_at": r[3]} for r in rows]
+
+
+if __name__ == "__main__":
+    # Usage: python rate_limiter.py
+    limiter = TokenBucketRateLimiter()
+    for bucket in limiter.snapshot():
+        rpm, tpm = limits_for_model(bucket["model"])
+        print(f"{bucket['model']}: {bucket['requests']}/{rpm:.0f} requests, {bucket['tokens']}/{tpm:.0f} tokens "
+              f"(updated {time.strftime('%H:%M:%S', time.localtime(bucket['updated_at']))})")
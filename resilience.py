@@ -0,0 +1,223 @@
+import os
+import time
+import random
+import asyncio
+
+import metrics
+from concurrency import retry_after_seconds
+
+# --- Configuration ---
+MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", "4"))  # Attempts per model, including the first.
+BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "1"))
+BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "30"))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("LLM_CIRCUIT_FAILURES", "3"))  # Consecutive failed calls that open a circuit.
+CIRCUIT_COOLDOWN_SECONDS = float(os.getenv("LLM_CIRCUIT_COOLDOWN_SECONDS", "60"))
+
+RETRYABLE_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504, 520, 522, 524, 529}
+FATAL_STATUS_CODES = {400, 401, 402, 403, 404, 413, 422}
+RETRYABLE_ERROR_NAMES = (
+    "RateLimitError", "APIConnectionError", "Timeout", "APITimeoutError", "ServiceUnavailableError",
+    "InternalServerError", "APIError",
+)
+
+
+def _parse_fallback_models(value: str) -> dict:
+    """Parses LLM_FALLBACK_MODELS, e.g. "openrouter/openai/gpt-4o=openrouter/anthropic/claude-3.5-sonnet"."""
+    fallbacks = {}
+    for item in value.split(","):
+        model, _, fallback = item.strip().partition("=")
+        if model and fallback:
+            fallbacks[model.strip()] = fallback.strip()
+    return fallbacks
+
+
+# Keyed by the exact LiteLLM model string or a model prefix (longest prefix wins).
+FALLBACK_MODELS = _parse_fallback_models(os.getenv("LLM_FALLBACK_MODELS", ""))
+
+
+def fallback_model_for(model: str) -> str | None:
+    fallback = FALLBACK_MODELS.get(model)
+    if fallback is None:
+        prefixes = [prefix for prefix in FALLBACK_MODELS if model.startswith(prefix)]
+        if prefixes:
+            fallback = FALLBACK_MODELS[max(prefixes, key=len)]
+    return fallback if fallback != model else None
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling the provider while a model's circuit breaker is open."""
+
+    def __init__(self, model: str, retry_in_seconds: float):
+        super().__init__(f"Circuit breaker open for '{model}' (next probe in {retry_in_seconds:.0f}s).")
+        self.model = model
+        self.retry_in_seconds = retry_in_seconds
+
+
+def is_retryable_error(exc: BaseException) -> bool:
+    """
+    Classifies a provider error. Rate limits, timeouts, connection errors and 5xx responses
+    are retryable; bad requests, authentication, missing models and context-length errors
+    are fatal because repeating the same request cannot succeed.
+    """
+    if isinstance(exc, CircuitOpenError):
+        return False
+    status_code = getattr(exc, "status_code", None)
+    if status_code in FATAL_STATUS_CODES:
+        return False
+    if status_code in RETRYABLE_STATUS_CODES:
+        return True
+    if isinstance(exc, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    return type(exc).__name__ in RETRYABLE_ERROR_NAMES
+
+
+def describe_error(exc: BaseException) -> str:
+    """Short label for log messages, e.g. 'retryable RateLimitError'."""
+    if isinstance(exc, CircuitOpenError):
+        return "circuit open"
+    return f"{'retryable' if is_retryable_error(exc) else 'fatal'} {type(exc).__name__}"
+
+
+def backoff_delay(attempt: int, retry_after: float | None = None) -> float:
+    """Full-jitter exponential backoff for the given (1-based) attempt, never shorter than Retry-After."""
+    delay = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** (attempt - 1)))
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, BACKOFF_MAX_SECONDS * 4))
+    return delay
+
+
+class CircuitBreaker:
+    """
+    Per-model circuit breaker. After CIRCUIT_FAILURE_THRESHOLD consecutive failed calls
+    (each already retried) the circuit opens and calls fail immediately. Once the cooldown
+    has passed a single probe call is let through: success closes the circuit, failure
+    opens it again with a doubled cooldown, and a probe that is cancelled or hits a fatal
+    error hands the probe to the next call.
+    """
+
+    def __init__(self, model: str):
+        self.model = model
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.cooldown_seconds = CIRCUIT_COOLDOWN_SECONDS
+        self.times_opened = 0
+        self.short_circuited = 0
+
+    def before_call(self) -> bool:
+        """Raises CircuitOpenError while the circuit is open. Returns True if this call is the probe."""
+        if self.state == "closed":
+            return False
+        remaining = self.opened_at + self.cooldown_seconds - time.monotonic()
+        if self.state == "open" and remaining <= 0:
+            self.state = "half_open"
+            print(f"Circuit breaker for '{self.model}' half-open: sending a probe request.")
+            return True
+        self.short_circuited += 1
+        raise CircuitOpenError(self.model, max(0.0, remaining))
+
+    def release_probe(self):
+        """
+        The probe ended without telling whether the model recovered (cancelled, e.g. by a
+        hedge, or a fatal error for that request): the circuit goes back to open with its
+        cooldown already over, so the next call is sent as a new probe.
+        """
+        if self.state == "half_open":
+            self.state = "open"
+
+    def record_success(self):
+        if self.state != "closed":
+            print(f"Circuit breaker for '{self.model}' closed.")
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.cooldown_seconds = CIRCUIT_COOLDOWN_SECONDS
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self.state == "half_open":
+            self.cooldown_seconds = min(self.cooldown_seconds * 2, CIRCUIT_COOLDOWN_SECONDS * 16)
+            self._open()
+        elif self.state == "closed" and self.consecutive_failures >= CIRCUIT_FAILURE_THRESHOLD:
+            self._open()
+
+    def _open(self):
+        self.state = "open"
+        self.opened_at = time.monotonic()
+        self.times_opened += 1
+        print(f"Circuit breaker for '{self.model}' opened after {self.consecutive_failures} consecutive failures "
+              f"(cooldown {self.cooldown_seconds:.0f}s).")
+
+
+class ResilientCaller:
+    """Retries, circuit breakers and fallback models around a provider call."""
+
+    def __init__(self):
+        self.breakers = {}
+        self.retries = 0
+        self.fallbacks = 0
+        self.fatal_errors = 0
+
+    def breaker_for(self, model: str) -> CircuitBreaker:
+        if model not in self.breakers:
+            self.breakers[model] = CircuitBreaker(model)
+        return self.breakers[model]
+
+    async def _call_model(self, send_request, request_kwargs: dict):
+        model = request_kwargs.get("model") or ""
+        breaker = self.breaker_for(model)
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            probing = breaker.before_call()
+            resolved = False
+            try:
+                try:
+                    response = await send_request(request_kwargs)
+                except Exception as e:
+                    if not is_retryable_error(e):
+                        self.fatal_errors += 1
+                        raise
+                    if probing or attempt == MAX_ATTEMPTS:
+                        breaker.record_failure()
+                        resolved = True
+                        raise
+                    delay = backoff_delay(attempt, retry_after_seconds(e))
+                    self.retries += 1
+                    metrics.count("retries")
+                    print(f"LLM call to '{model}' failed ({describe_error(e)}: {e}). "
+                          f"Retrying in {delay:.1f}s (attempt {attempt + 1}/{MAX_ATTEMPTS}).")
+                    await asyncio.sleep(delay)
+                    continue
+                breaker.record_success()
+                resolved = True
+                return response
+            finally:
+                # Every other way out of a probe (fatal error, cancellation) must not leave the circuit half-open.
+                if probing and not resolved:
+                    breaker.release_probe()
+
+    async def call(self, send_request, request_kwargs: dict):
+        """
+        Calls send_request(request_kwargs), retrying retryable errors with jittered
+        exponential backoff. When the model keeps failing or its circuit is open, the
+        request is sent once more to its configured fallback model, if any.
+        """
+        try:
+            return await self._call_model(send_request, request_kwargs)
+        except Exception as e:
+            if not (isinstance(e, CircuitOpenError) or is_retryable_error(e)):
+                raise
+            fallback_model = fallback_model_for(request_kwargs.get("model") or "")
+            if not fallback_model:
+                raise
+            print(f"Falling back from '{request_kwargs.get('model')}' to '{fallback_model}' ({describe_error(e)}).")
+            self.fallbacks += 1
+            metrics.count("fallbacks")
+            return await self._call_model(send_request, {**request_kwargs, "model": fallback_model})
+
+    def stats(self) -> dict:
+        return {
+            "retries": self.retries,
+            "fallbacks": self.fallbacks,
+            "fatal_errors": self.fatal_errors,
+            "open_circuits": [model for model, breaker in self.breakers.items() if breaker.state != "closed"],
+            "short_circuited": sum(breaker.short_circuited for breaker in self.breakers.values()),
+        }
@@ -0,0 +1,237 @@
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+
+# --- Unified Command Line ---
+# `seo <command>` runs the pipeline scripts. Only the standard library is imported here: each
+# command imports the script it runs when it is invoked, so `seo --help` and `seo status` start
+# without loading google.adk, litellm or google.genai (or even asyncio) and without an API key.
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+HEAVY_MODULES = ("google.adk", "google.genai", "litellm", "asyncio")
+STARTUP_BUDGET_MS = float(os.getenv("SEO_STARTUP_BUDGET_MS", "100"))
+
+
+def _require_api_key(args=None) -> bool:
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    if getattr(args, "replay", None) is not None:
+        # Replayed runs make no provider calls; the scripts only check that a key is set.
+        os.environ.setdefault("OPENROUTER_API_KEY", "replay")
+    if getattr(args, "batch", False):
+        # Batch jobs go to the provider's own batch endpoint (llm_batch.py), with its own key.
+        if not (os.getenv("LLM_BATCH_API_KEY") or os.getenv("OPENAI_API_KEY")):
+            print("Error: LLM_BATCH_API_KEY (or OPENAI_API_KEY) not found in environment variables. Please set it in a .env file.")
+            return False
+        return True
+    if not os.getenv("OPENROUTER_API_KEY"):
+        print("Error: OPENROUTER_API_KEY not found in environment variables. Please set it in a .env file.")
+        return False
+    return True
+
+
+def _configure_tracing(args):
+    import tracing
+
+    if args.trace:
+        tracing.enable_tracing()
+    if args.profile:
+        tracing.enable_profiling()
+    if args.record is not None or args.replay is not None:
+        import cassettes
+
+        if args.record is not None:
+            cassettes.enable("record", args.record)
+        else:
+            cassettes.enable("replay", args.replay)
+    return tracing
+
+
+def _run_script(args, module_name: str, **overrides) -> int:
+    if not _require_api_key(args):
+        return 1
+    import importlib
+
+    tracing = _configure_tracing(args)
+    module = importlib.import_module(module_name)
+    for name, value in overrides.items():
+        if value is not None:
+            setattr(module, name, value)
+    tracing.run_script(module_name, module.main)
+    return 0
+
+
+def cmd_analyze(args) -> int:
+    return _run_script(args, "analyzer", ANALYZER_MODE="batch" if args.batch else None)
+
+
+def cmd_plan(args) -> int:
+    return _run_script(args, "keyword_planner")
+
+
+def cmd_generate(args) -> int:
+    return _run_script(args, "blog_post_generator", MAX_CLUSTERS_PER_RUN=args.max_clusters, REGENERATE_CLUSTER=args.cluster)
+
+
+def cmd_daemon(args) -> int:
+    if not _require_api_key(args):
+        return 1
+    import asyncio
+
+    _configure_tracing(args)
+    from daemon import PipelineDaemon, DAEMON_STAGES
+
+    stages = args.stages.split(",") if args.stages else DAEMON_STAGES
+    asyncio.run(PipelineDaemon([stage.strip() for stage in stages if stage.strip()]).run())
+    return 0
+
+
+def cmd_status(args) -> int:
+    from state_store import StateStore, TABLE_SPECS, print_status
+
+    tables = args.tables or list(TABLE_SPECS)
+    unknown = [table for table in tables if table not in TABLE_SPECS]
+    if unknown:
+        print(f"Unknown tables {unknown}; choose from {list(TABLE_SPECS)}.")
+        return 1
+    store = StateStore(os.path.join(SCRIPT_DIR, "seo_state.sqlite3"), csv_dir=SCRIPT_DIR)
+    try:
+        for table in tables:
+            store.sync_from_csv(table)
+        print_status(store, tables)
+    finally:
+        store.close()
+    return 0
+
+
+def cmd_metrics(args) -> int:
+    import metrics
+
+    return metrics.main([args.run])
+
+
+def cmd_cassettes(args) -> int:
+    import cassettes
+
+    return cassettes.main(args.options)
+
+
+def cmd_bench(args) -> int:
+    import benchmark
+
+    return benchmark.main(args.options)
+
+
+def cmd_stub_server(args) -> int:
+    import llm_stub_server
+
+    return llm_stub_server.main(args.options)
+
+
+# Runs in a fresh interpreter: times importing this module and running `seo status`, then
+# reports which heavy modules ended up loaded.
+_STARTUP_PROBE = """
+import io, sys, json, time, contextlib
+start = time.perf_counter()
+import seo_cli
+with contextlib.redirect_stdout(io.StringIO()):
+    seo_cli.main(["status"])
+elapsed_ms = (time.perf_counter() - start) * 1000
+print(json.dumps({"ms": elapsed_ms, "heavy": [m for m in seo_cli.HEAVY_MODULES if m in sys.modules]}))
+"""
+
+
+def cmd_startup_check(args) -> int:
+    """Import-time benchmark: fails when `seo status` gets slower than the budget or loads heavy modules."""
+    import subprocess
+
+    timings, heavy = [], set()
+    for _ in range(args.runs):
+        started = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-c", _STARTUP_PROBE], cwd=SCRIPT_DIR, capture_output=True, text=True, check=True
+        )
+        process_ms = (time.perf_counter() - started) * 1000
+        probe = json.loads(result.stdout.strip().splitlines()[-1])
+        timings.append((probe["ms"], process_ms))
+        heavy.update(probe["heavy"])
+    median_ms = statistics.median(t[0] for t in timings)
+    median_process_ms = statistics.median(t[1] for t in timings)
+    print(f"`seo status` startup: median {median_ms:.1f} ms in-process, {median_process_ms:.1f} ms including "
+          f"interpreter start ({args.runs} runs, budget {args.budget_ms:.0f} ms).")
+    failed = False
+    if heavy:
+        print(f"FAIL: heavy modules imported at startup: {sorted(heavy)}")
+        failed = True
+    if median_ms > args.budget_ms:
+        print(f"FAIL: startup exceeds the {args.budget_ms:.0f} ms budget.")
+        failed = True
+    return 1 if failed else 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="seo", description="SEO content pipeline: analyze, plan and generate blog posts.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_options = argparse.ArgumentParser(add_help=False)
+    run_options.add_argument("--trace", action="store_true", help="Write a Chrome trace of the run to .seo_cache/traces/.")
+    run_options.add_argument("--profile", action="store_true", help="Run under cProfile and write a report to .seo_cache/traces/.")
+    cassette = run_options.add_mutually_exclusive_group()
+    cassette.add_argument("--record", nargs="?", const="", default=None, metavar="CASSETTE",
+                          help="Record every LLM call to a cassette (default .seo_cache/cassettes/<script>.cassette.jsonl.gz).")
+    cassette.add_argument("--replay", nargs="?", const="", default=None, metavar="CASSETTE",
+                          help="Serve LLM calls from a recorded cassette, without network access or an API key.")
+
+    analyze = commands.add_parser("analyze", parents=[run_options], help="Analyze competitor and posted URLs (analyzer.py).")
+    analyze.add_argument("--batch", action="store_true", help="Submit the pending URLs as one provider batch job, or collect the job already submitted (ANALYZER_MODE=batch).")
+    analyze.set_defaults(handler=cmd_analyze)
+    commands.add_parser("plan", parents=[run_options], help="Generate keyword clusters (keyword_planner.py).").set_defaults(handler=cmd_plan)
+
+    generate = commands.add_parser("generate", parents=[run_options], help="Write blog posts for pending clusters (blog_post_generator.py).")
+    generate.add_argument("--max-clusters", type=int, default=None, help="Clusters to process in this run (default: MAX_CLUSTERS_PER_RUN).")
+    generate.add_argument("--cluster", default=None, metavar="PRIMARY_KEYWORD", help="Write this cluster again whatever its status (REGENERATE_CLUSTER).")
+    generate.set_defaults(handler=cmd_generate)
+
+    daemon = commands.add_parser("daemon", parents=[run_options], help="Run continuously, processing new URLs and clusters as they arrive (daemon.py).")
+    daemon.add_argument("--stages", default=None, help="Comma-separated stages (default: DAEMON_STAGES).")
+    daemon.set_defaults(handler=cmd_daemon)
+
+    status = commands.add_parser("status", help="Show pipeline progress and active leases from the state store.")
+    status.add_argument("tables", nargs="*", help="Tables to show (default: all).")
+    status.set_defaults(handler=cmd_status)
+
+    metrics = commands.add_parser("metrics", help="Summarize LLM calls per stage and model (tokens, cost, p50/p95 latency).")
+    metrics.add_argument("run", nargs="?", default="last", help="Run id, 'last' (default), 'all' or 'list'.")
+    metrics.set_defaults(handler=cmd_metrics)
+
+    cassette_list = commands.add_parser("cassettes", help="List recorded LLM cassettes or show one call: cassettes list [PATH] | show PATH N.", add_help=False)
+    cassette_list.set_defaults(handler=cmd_cassettes, passthrough=True)
+
+    bench = commands.add_parser("bench", help="Benchmark the scripts offline against the local OpenRouter stand-in (benchmark.py).", add_help=False)
+    bench.set_defaults(handler=cmd_bench, passthrough=True)
+
+    stub_server = commands.add_parser("stub-server", help="Run the local OpenRouter stand-in server (llm_stub_server.py).", add_help=False)
+    stub_server.set_defaults(handler=cmd_stub_server, passthrough=True)
+
+    startup = commands.add_parser("startup-check", help="Benchmark CLI startup and fail on import-time regressions.")
+    startup.add_argument("--runs", type=int, default=5)
+    startup.add_argument("--budget-ms", type=float, default=STARTUP_BUDGET_MS)
+    startup.set_defaults(handler=cmd_startup_check)
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = build_parser()
+    # `seo bench` and `seo stub-server` hand all their options to the module they run.
+    args, options = parser.parse_known_args(argv)
+    if getattr(args, "passthrough", False):
+        args.options = options
+    elif options:
+        parser.error(f"unrecognized arguments: {' '.join(options)}")
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
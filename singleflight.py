@@ -0,0 +1,53 @@
+import asyncio
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls: while a call for a key is in flight, further
+    calls with the same key wait for its result instead of starting their own. The shared
+    call runs as its own task and is only cancelled once every caller waiting on it has
+    been cancelled, so one cancelled caller does not fail the others.
+    """
+
+    def __init__(self):
+        self._in_flight = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, call_factory) -> tuple[object, bool]:
+        """
+        Returns (result, shared). `call_factory` is only invoked when no call for `key` is
+        in flight; `shared` is True when the result came from another caller's call.
+        """
+        entry = self._in_flight.get(key)
+        shared = entry is not None
+        if shared:
+            self.coalesced += 1
+        else:
+            self.calls += 1
+            entry = {"task": asyncio.ensure_future(call_factory()), "waiters": 0}
+            self._in_flight[key] = entry
+            entry["task"].add_done_callback(lambda _task: self._forget(key, entry))
+
+        entry["waiters"] += 1
+        try:
+            result = await asyncio.shield(entry["task"])
+        except asyncio.CancelledError:
+            if not entry["task"].done() and entry["waiters"] == 1:
+                entry["task"].cancel()
+            raise
+        finally:
+            entry["waiters"] -= 1
+        return result, shared
+
+    def _forget(self, key: str, entry: dict):
+        if self._in_flight.get(key) is entry:
+            del self._in_flight[key]
+
+    def stats(self) -> dict:
+        total = self.calls + self.coalesced
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "coalesced_rate": round(self.coalesced / total, 3) if total else 0.0,
+        }
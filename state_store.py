@@ -0,0 +1,457 @@
+import os
+import csv
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from contextlib import contextmanager
+
+from tracing import traced
+
+# --- Pipeline State Store ---
+# The SQLite database is the source of truth for URL, analysis and cluster status. The CSV
+# files stay the human-facing format: a CSV that was edited by hand (its fingerprint no
+# longer matches the last import/export) is merged into the database before it is read, and
+# the scripts export fresh CSV snapshots after their updates. The merge compares the CSV with
+# the rows of the last import/export, row key by row key, so only what was changed by hand is
+# applied and updates made in the database since then are kept.
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "seo_state.sqlite3")
+# WAL needs shared memory and only works for processes on one host. Workers on several hosts
+# sharing the database over a network filesystem should use STATE_DB_JOURNAL_MODE=DELETE.
+STATE_DB_JOURNAL_MODE = os.getenv("STATE_DB_JOURNAL_MODE", "WAL").strip().upper()
+
+# Table name -> CSV file name, key column (indexed), status column (indexed) and canonical columns.
+TABLE_SPECS = {
+    "competitor_urls": {
+        "csv_name": "Competitor URLs.csv",
+        "key": "URL",
+        "status": "Analysed",
+        "columns": ["URL", "Analysed"],
+    },
+    "competitor_analysis": {
+        "csv_name": "Competitor Analysis.csv",
+        "key": "URL",
+        "status": None,
+        "columns": ["Topic", "Keywords", "Summary", "URL"],
+    },
+    "posted": {
+        "csv_name": "Posted.csv",
+        "key": "URL",
+        "status": "Analysed",
+        "columns": ["Topic", "Keywords", "Summary", "URL", "Analysed"],
+    },
+    "clusters": {
+        "csv_name": "Clusters.csv",
+        "key": "Primary Keyword",
+        "status": "Completed",
+        "columns": ["Cluster", "Intent", "Keywords", "Primary Keyword", "Completed"],
+    },
+}
+
+
+def _sql_name(column: str) -> str:
+    return column.strip().lower().replace(" ", "_")
+
+
+def _quoted(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def csv_fingerprint(csv_path: str) -> dict | None:
+    try:
+        stat = os.stat(csv_path)
+    except OSError:
+        return None
+    with open(csv_path, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    return {"mtime": stat.st_mtime, "size": stat.st_size, "sha256": digest}
+
+
+class StateStore:
+    """
+    Transactional state for the three scripts, one table per CSV file. Rows keep their
+    CSV order (autoincrement id) and any columns beyond the canonical ones (stored as
+    JSON in `extra`). Keys are indexed but not unique, matching the CSV files, where an
+    update applies to every row with the key. The database runs in WAL mode and every
+    write uses BEGIN IMMEDIATE, so several processes can read and update it at once. Within
+    a process the store may be used from worker threads (asyncio.to_thread); its one
+    connection is used by one thread at a time.
+    """
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, csv_dir: str | None = None):
+        self.db_path = db_path
+        self.csv_dir = csv_dir or os.path.dirname(os.path.abspath(db_path))
+        self._conn = sqlite3.connect(db_path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._lock = threading.RLock()
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute(f"PRAGMA journal_mode={STATE_DB_JOURNAL_MODE}")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_schema()
+
+    def _create_schema(self):
+        with self._transaction() as conn:
+            for table, spec in TABLE_SPECS.items():
+                column_sql = ", ".join(f'"{_sql_name(c)}" TEXT NOT NULL DEFAULT \'\'' for c in spec["columns"])
+                conn.execute(
+                    f'CREATE TABLE IF NOT EXISTS "{table}" (id INTEGER PRIMARY KEY AUTOINCREMENT, {column_sql}, '
+                    f"extra TEXT NOT NULL DEFAULT '{{}}')"
+                )
+                key = _sql_name(spec["key"])
+                conn.execute(f'CREATE INDEX IF NOT EXISTS "idx_{table}_{key}" ON "{table}" ("{key}")')
+                if spec["status"]:
+                    status = _sql_name(spec["status"])
+                    conn.execute(f'CREATE INDEX IF NOT EXISTS "idx_{table}_{status}" ON "{table}" (lower(trim("{status}")))')
+            # Leases are keyed by the row's key (not its id), so they survive a CSV re-import.
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS leases ("
+                "table_name TEXT NOT NULL, item_key TEXT NOT NULL, owner TEXT NOT NULL, "
+                "claimed_at REAL NOT NULL, expires_at REAL NOT NULL, claims INTEGER NOT NULL DEFAULT 1, "
+                "PRIMARY KEY (table_name, item_key))"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS csv_sync ("
+                "table_name TEXT PRIMARY KEY, headers TEXT NOT NULL, mtime REAL, size INTEGER, sha256 TEXT, snapshot TEXT)"
+            )
+            if "snapshot" not in [row["name"] for row in conn.execute("PRAGMA table_info(csv_sync)")]:
+                conn.execute("ALTER TABLE csv_sync ADD COLUMN snapshot TEXT")
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def csv_path(self, table: str) -> str:
+        return os.path.join(self.csv_dir, TABLE_SPECS[table]["csv_name"])
+
+    # --- Rows ---
+    def _row_to_dict(self, table: str, row: sqlite3.Row) -> dict:
+        values = {column: row[_sql_name(column)] for column in TABLE_SPECS[table]["columns"]}
+        extra = json.loads(row["extra"] or "{}")
+        for column, value in extra.items():
+            values.setdefault(column, value)
+        return values
+
+    def _split_values(self, table: str, values: dict) -> tuple[dict, dict]:
+        columns = TABLE_SPECS[table]["columns"]
+        known = {_sql_name(c): str(values[c]) for c in columns if c in values and values[c] is not None}
+        extra = {c: str(v) for c, v in values.items() if c not in columns and c is not None and v is not None}
+        return known, extra
+
+    def rows(self, table: str, status_in: tuple[str, ...] | None = None, key: str | None = None, limit: int | None = None) -> list[dict]:
+        """
+        Returns rows as dicts keyed by CSV header, in CSV order. `status_in` filters the
+        table's status column case-insensitively (e.g. ("no", "") for pending rows).
+        """
+        spec = TABLE_SPECS[table]
+        clauses, params = [], []
+        if status_in is not None:
+            status = _sql_name(spec["status"])
+            clauses.append(f'lower(trim("{status}")) IN ({", ".join("?" for _ in status_in)})')
+            params.extend(s.strip().lower() for s in status_in)
+        if key is not None:
+            clauses.append(f'"{_sql_name(spec["key"])}" = ?')
+            params.append(key)
+        sql = f'SELECT * FROM "{table}"'
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY id"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [self._row_to_dict(table, row) for row in rows]
+
+    def _update_rows(self, conn, table: str, key: str, values: dict) -> int:
+        known, extra = self._split_values(table, values)
+        key_column = _sql_name(TABLE_SPECS[table]["key"])
+        if extra:
+            for row in conn.execute(f'SELECT id, extra FROM "{table}" WHERE "{key_column}" = ?', (key,)).fetchall():
+                merged = {**json.loads(row["extra"] or "{}"), **extra}
+                conn.execute(f'UPDATE "{table}" SET extra = ? WHERE id = ?', (json.dumps(merged), row["id"]))
+        if not known:
+            return conn.execute(f'SELECT COUNT(*) FROM "{table}" WHERE "{key_column}" = ?', (key,)).fetchone()[0]
+        assignments = ", ".join(f'"{column}" = ?' for column in known)
+        cursor = conn.execute(f'UPDATE "{table}" SET {assignments} WHERE "{key_column}" = ?', (*known.values(), key))
+        return cursor.rowcount
+
+    def _insert_row(self, conn, table: str, values: dict):
+        known, extra = self._split_values(table, values)
+        columns = list(known) + ["extra"]
+        conn.execute(
+            f'INSERT INTO "{table}" ({", ".join(_quoted(c) for c in columns)}) VALUES ({", ".join("?" for _ in columns)})',
+            (*known.values(), json.dumps(extra)),
+        )
+
+    def update(self, table: str, key: str, values: dict) -> int:
+        """Updates every row with the given key. Returns the number of rows updated."""
+        with self._transaction() as conn:
+            return self._update_rows(conn, table, key, values)
+
+    def upsert(self, table: str, key: str, values: dict) -> bool:
+        """Updates the rows with the given key, or appends a new row. Returns True if rows were updated."""
+        values = {**values, TABLE_SPECS[table]["key"]: key}
+        with self._transaction() as conn:
+            if self._update_rows(conn, table, key, values):
+                return True
+            self._insert_row(conn, table, values)
+            return False
+
+    def append(self, table: str, rows: list[dict]):
+        with self._transaction() as conn:
+            for values in rows:
+                self._insert_row(conn, table, values)
+
+    # --- Work leases ---
+    def claim_next(self, table: str, owner: str, lease_seconds: float, status_in: tuple[str, ...] = ("no", "")) -> dict | None:
+        """
+        Atomically claims the first pending row (status in `status_in`) that has no live lease
+        and returns it with "lease_claims" (how many times it has been claimed, >1 when a
+        lease expired and the row was reclaimed). Returns None when nothing is claimable.
+        """
+        spec = TABLE_SPECS[table]
+        key_column, status_column = _sql_name(spec["key"]), _sql_name(spec["status"])
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                f'SELECT t.* FROM "{table}" t LEFT JOIN leases l '
+                f'ON l.table_name = ? AND l.item_key = t."{key_column}" '
+                f'WHERE lower(trim(t."{status_column}")) IN ({", ".join("?" for _ in status_in)}) '
+                f"AND (l.item_key IS NULL OR l.expires_at < ?) ORDER BY t.id LIMIT 1",
+                (table, *(st.strip().lower() for st in status_in), now),
+            ).fetchone()
+            if row is None:
+                return None
+            key = row[key_column]
+            previous = conn.execute(
+                "SELECT owner, claims FROM leases WHERE table_name = ? AND item_key = ?", (table, key)
+            ).fetchone()
+            claims = previous["claims"] + 1 if previous else 1
+            conn.execute(
+                "INSERT OR REPLACE INTO leases (table_name, item_key, owner, claimed_at, expires_at, claims) VALUES (?, ?, ?, ?, ?, ?)",
+                (table, key, owner, now, now + lease_seconds, claims),
+            )
+        if previous:
+            print(f"Reclaimed '{key}' from expired lease of {previous['owner']}.")
+        return {**self._row_to_dict(table, row), "lease_claims": claims}
+
+    def renew_lease(self, table: str, key: str, owner: str, lease_seconds: float) -> bool:
+        """Heartbeat: extends the lease if `owner` still holds it. Returns False if the lease was lost."""
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE leases SET expires_at = ? WHERE table_name = ? AND item_key = ? AND owner = ?",
+                (time.time() + lease_seconds, table, key, owner),
+            )
+            return cursor.rowcount > 0
+
+    def release_lease(self, table: str, key: str, owner: str):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM leases WHERE table_name = ? AND item_key = ? AND owner = ?", (table, key, owner))
+
+    def active_leases(self, table: str) -> list[dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT item_key, owner, claimed_at, expires_at, claims FROM leases WHERE table_name = ? AND expires_at >= ? ORDER BY claimed_at",
+                (table, time.time()),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    # --- CSV import / export ---
+    def _read_csv(self, csv_path: str) -> tuple[list[str], list[dict]]:
+        with open(csv_path, "r", newline="", encoding="utf-8") as csvfile:
+            reader = csv.DictReader(csvfile)
+            headers = [h for h in (reader.fieldnames or []) if h is not None]
+            csv_rows = [{k: v for k, v in row.items() if k is not None}
+                        for row in reader if any((value or "").strip() for value in row.values() if isinstance(value, str))]
+        return headers, csv_rows
+
+    def _snapshot(self, table: str, rows: list[dict]) -> dict:
+        # The first row of each key, as it is in the CSV; the base for merging the next hand edit.
+        key_column = TABLE_SPECS[table]["key"]
+        snapshot = {}
+        for row in rows:
+            key = row.get(key_column) or ""
+            if key and key not in snapshot:
+                snapshot[key] = {column: "" if value is None else str(value) for column, value in row.items()}
+        return snapshot
+
+    @traced("csv")
+    def import_csv(self, table: str, csv_path: str | None = None) -> int:
+        """Replaces the table's rows with the CSV's non-empty rows. Returns the number of rows imported."""
+        csv_path = csv_path or self.csv_path(table)
+        headers, csv_rows = self._read_csv(csv_path)
+        fingerprint = csv_fingerprint(csv_path)
+        with self._transaction() as conn:
+            conn.execute(f'DELETE FROM "{table}"')
+            for row in csv_rows:
+                self._insert_row(conn, table, row)
+            self._record_sync(conn, table, headers, fingerprint, self._snapshot(table, csv_rows))
+        return len(csv_rows)
+
+    @traced("csv")
+    def merge_csv(self, table: str, csv_path: str | None = None) -> dict:
+        """
+        Merges a CSV edited by hand into the table, row key by row key, against the rows of the
+        last import or export: new keys are appended, fields changed by hand are updated on the
+        rows with that key and keys removed by hand are deleted. Fields the CSV did not change
+        keep their database values. Without a snapshot (a database from before snapshots were
+        kept) only new keys are added. An empty table is imported as is.
+        Returns the numbers of rows "added", "updated" and "deleted".
+        """
+        csv_path = csv_path or self.csv_path(table)
+        key_column = TABLE_SPECS[table]["key"]
+        key_sql = _sql_name(key_column)
+        headers, csv_rows = self._read_csv(csv_path)
+        fingerprint = csv_fingerprint(csv_path)
+        counts = {"added": 0, "updated": 0, "deleted": 0}
+        with self._transaction() as conn:
+            sync = conn.execute("SELECT snapshot FROM csv_sync WHERE table_name = ?", (table,)).fetchone()
+            base = json.loads(sync["snapshot"]) if sync and sync["snapshot"] else None
+            existing_keys = {row[0] for row in conn.execute(f'SELECT "{key_sql}" FROM "{table}"')}
+            if not existing_keys:
+                base = {}
+            elif base is None:
+                print(f"Warning: No snapshot of the last export of '{csv_path}'; only its new rows are added to the state store.")
+
+            seen = set()
+            for row in csv_rows:
+                key = row.get(key_column) or ""
+                if not key:
+                    if not existing_keys:
+                        self._insert_row(conn, table, row)
+                        counts["added"] += 1
+                    continue
+                if key in seen:
+                    if key not in existing_keys:
+                        self._insert_row(conn, table, row)  # Duplicate key rows, as in the CSV.
+                        counts["added"] += 1
+                    continue
+                seen.add(key)
+                if key not in existing_keys:
+                    self._insert_row(conn, table, row)
+                    counts["added"] += 1
+                elif base is not None and key in base:
+                    changed = {column: value for column, value in row.items() if (value or "") != base[key].get(column, "")}
+                    if changed:
+                        counts["updated"] += self._update_rows(conn, table, key, changed)
+            for key in (base or {}):
+                if key not in seen and key in existing_keys:
+                    counts["deleted"] += conn.execute(f'DELETE FROM "{table}" WHERE "{key_sql}" = ?', (key,)).rowcount
+            self._record_sync(conn, table, headers, fingerprint, self._snapshot(table, csv_rows))
+        return counts
+
+    @traced("csv")
+    def export_csv(self, table: str, csv_path: str | None = None) -> int:
+        """
+        Writes a consistent snapshot of the table to its CSV (atomically, via a temporary file),
+        keeping the header order of the last imported CSV. Returns the number of rows written.
+        """
+        csv_path = csv_path or self.csv_path(table)
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                rows = self.rows(table)
+                sync = self._conn.execute("SELECT headers FROM csv_sync WHERE table_name = ?", (table,)).fetchone()
+            finally:
+                self._conn.execute("COMMIT")
+        headers = json.loads(sync["headers"]) if sync else []
+        for column in TABLE_SPECS[table]["columns"] + [c for row in rows for c in row]:
+            if column not in headers:
+                headers.append(column)
+        rows = [{column: row.get(column, "") for column in headers} for row in rows]
+
+        temp_path = f"{csv_path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", newline="", encoding="utf-8") as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=headers)
+            writer.writeheader()
+            writer.writerows(rows)
+        os.replace(temp_path, csv_path)
+        with self._transaction() as conn:
+            self._record_sync(conn, table, headers, csv_fingerprint(csv_path), self._snapshot(table, rows))
+        return len(rows)
+
+    def _record_sync(self, conn, table: str, headers: list[str], fingerprint: dict | None, snapshot: dict):
+        fingerprint = fingerprint or {"mtime": None, "size": None, "sha256": None}
+        conn.execute(
+            "INSERT OR REPLACE INTO csv_sync (table_name, headers, mtime, size, sha256, snapshot) VALUES (?, ?, ?, ?, ?, ?)",
+            (table, json.dumps(headers), fingerprint["mtime"], fingerprint["size"], fingerprint["sha256"], json.dumps(snapshot)),
+        )
+
+    @traced("csv")
+    def sync_from_csv(self, table: str) -> bool:
+        """
+        Merges the table's CSV into the database if it changed since the last import or export
+        (e.g. rows were added by hand). Returns True if the CSV was merged.
+        """
+        csv_path = self.csv_path(table)
+        if not os.path.exists(csv_path):
+            return False
+        with self._lock:
+            sync = self._conn.execute("SELECT mtime, size, sha256 FROM csv_sync WHERE table_name = ?", (table,)).fetchone()
+        stat = os.stat(csv_path)
+        if sync and sync["mtime"] == stat.st_mtime and sync["size"] == stat.st_size:
+            return False
+        if sync and sync["sha256"] and sync["sha256"] == csv_fingerprint(csv_path)["sha256"]:
+            return False
+        counts = self.merge_csv(table, csv_path)
+        print(f"Merged '{csv_path}' into the state store: {counts['added']} rows added, "
+              f"{counts['updated']} updated, {counts['deleted']} deleted.")
+        return True
+
+    def export_tables(self, tables: list[str]):
+        """Exports the given tables to their CSV files, merging any CSV edited by hand first."""
+        for table in tables:
+            self.sync_from_csv(table)
+            count = self.export_csv(table)
+            print(f"Exported {count} rows to '{self.csv_path(table)}'.")
+
+
+def print_status(store: StateStore, tables: list[str]):
+    """Prints row counts, completed rows and active leases per table."""
+    for table_name in tables:
+        spec = TABLE_SPECS[table_name]
+        all_rows = store.rows(table_name)
+        summary = f"{table_name}: {len(all_rows)} rows"
+        if spec["status"]:
+            done = sum(1 for row in all_rows if row.get(spec["status"], "").strip().lower() == "yes")
+            summary += f", {done} with {spec['status']} = Yes"
+        leases = store.active_leases(table_name)
+        if leases:
+            summary += f", {len(leases)} leased ({', '.join(lease['owner'] for lease in leases)})"
+        print(summary)
+
+
+if __name__ == "__main__":
+    # Usage: python state_store.py import|export|status [table ...]
+    command = sys.argv[1] if len(sys.argv) > 1 else "status"
+    selected_tables = sys.argv[2:] or list(TABLE_SPECS)
+    unknown_tables = [t for t in selected_tables if t not in TABLE_SPECS]
+    if command not in ("import", "export", "status") or unknown_tables:
+        print(f"Usage: python state_store.py import|export|status [{'|'.join(TABLE_SPECS)} ...]")
+        sys.exit(1)
+
+    store = StateStore()
+    for table_name in selected_tables:
+        path = store.csv_path(table_name)
+        if command == "import":
+            if os.path.exists(path):
+                print(f"{table_name}: imported {store.import_csv(table_name)} rows from '{path}'.")
+            else:
+                print(f"{table_name}: '{path}' not found, skipped.")
+        elif command == "export":
+            print(f"{table_name}: exported {store.export_csv(table_name)} rows to '{path}'.")
+        else:
+            print_status(store, [table_name])
+    store.close()
@@ -0,0 +1,118 @@
+import argparse
+import asyncio
+import csv
+import functools
+
+import pytest
+
+import analyzer
+import benchmark
+import llm_batch
+from llm_stub_server import add_stub_arguments
+from state_store import StateStore
+
+COMPETITOR_URLS = ["https://clinic.example.com/blog/teeth-whitening", "https://clinic.example.com/blog/root-canal",
+                   "https://clinic.example.com/blog/gum-disease", "https://clinic.example.com/blog/dental-implants"]
+POSTED_URL = "https://our.example.com/blog/invisalign"
+UNREACHABLE_URL = "https://clinic.example.com/blog/unreachable"
+
+
+def write_csv(path, headers, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=headers)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+@pytest.fixture
+def start_stub():
+    stubs = []
+
+    def start(error_rate=0.0):
+        parser = argparse.ArgumentParser()
+        add_stub_arguments(parser)
+        args = parser.parse_args(["--latency", "fixed:0", "--batch-seconds", "0.1", "--error-rate", str(error_rate), "--seed", "3"])
+        process, base_url = benchmark.start_stub(args)
+        stubs.append(process)
+        return base_url
+
+    yield start
+    for process in stubs:
+        process.terminate()
+        process.wait()
+
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    write_csv(tmp_path / "Competitor URLs.csv", ["URL", "Analysed"],
+              [{"URL": url, "Analysed": "No"} for url in COMPETITOR_URLS + [UNREACHABLE_URL]])
+    write_csv(tmp_path / "Competitor Analysis.csv", ["Topic", "Keywords", "Summary", "URL"], [])
+    write_csv(tmp_path / "Posted.csv", analyzer.POSTED_CSV_HEADERS,
+              [{"Topic": "", "Keywords": "", "Summary": "", "URL": POSTED_URL, "Analysed": "No"}])
+    store = StateStore(str(tmp_path / "state.sqlite3"), csv_dir=str(tmp_path))
+    for table in analyzer.STATE_TABLES:
+        store.sync_from_csv(table)
+
+    async def fetch_page_text(url):
+        return None if url == UNREACHABLE_URL else f"A dental clinic blog post about {url.rsplit('/', 1)[1].replace('-', ' ')}."
+
+    monkeypatch.setattr(analyzer, "state_store", store)
+    monkeypatch.setattr(analyzer, "fetch_page_text", fetch_page_text)
+    monkeypatch.setattr(analyzer, "LLM_BATCH_API_KEY", "stub-key")
+    monkeypatch.setattr(llm_batch, "BATCH_DIR", str(tmp_path / "batches"))
+    monkeypatch.setattr(llm_batch, "wait_for_job", functools.partial(llm_batch.wait_for_job, poll_seconds=0.05))
+    yield store
+    store.close()
+
+
+def analyze_pending(store):
+    asyncio.run(analyzer.analyze_in_batch(analyzer.get_urls_to_analyze(), analyzer.get_posted_urls_to_analyze()))
+
+
+def analysed(store, table):
+    return {row["URL"]: row["Analysed"] for row in store.rows(table)}
+
+
+def test_batch_results_are_parsed_into_the_state_store(start_stub, workspace, monkeypatch):
+    monkeypatch.setattr(analyzer, "LLM_BATCH_API_BASE", start_stub())
+
+    analyze_pending(workspace)
+
+    analysis = {row["URL"]: row for row in workspace.rows("competitor_analysis")}
+    assert sorted(analysis) == sorted(COMPETITOR_URLS)
+    assert analysis[COMPETITOR_URLS[0]]["Topic"]
+    assert analysis[COMPETITOR_URLS[0]]["Keywords"]
+    assert "\n" in analysis[COMPETITOR_URLS[0]]["Summary"]  # <br> turned into line breaks.
+    assert analysed(workspace, "competitor_urls") == {**{url: "Yes" for url in COMPETITOR_URLS}, UNREACHABLE_URL: "No"}
+    posted = workspace.rows("posted")[0]
+    assert posted["Analysed"] == "Yes" and posted["Topic"]
+    assert llm_batch.load_job(analyzer.BATCH_JOB_NAME) is None
+
+
+def test_failed_batch_requests_stay_pending(start_stub, workspace, monkeypatch):
+    monkeypatch.setattr(analyzer, "LLM_BATCH_API_BASE", start_stub(error_rate=0.5))
+
+    analyze_pending(workspace)
+
+    statuses = {**analysed(workspace, "competitor_urls"), **analysed(workspace, "posted")}
+    done = {url for url, status in statuses.items() if status == "Yes"}
+    assert 0 < len(done) < len(COMPETITOR_URLS) + 1
+    assert {row["URL"] for row in workspace.rows("competitor_analysis")} == done - {POSTED_URL}
+    assert llm_batch.load_job(analyzer.BATCH_JOB_NAME) is None
+
+
+def test_saved_job_is_resumed_instead_of_submitted_again(start_stub, workspace, monkeypatch):
+    monkeypatch.setattr(analyzer, "LLM_BATCH_API_BASE", start_stub())
+    # An earlier run submitted the job and stopped before it finished.
+    job = asyncio.run(analyzer._submit_analysis_batch(analyzer.get_urls_to_analyze(), analyzer.get_posted_urls_to_analyze()))
+    assert llm_batch.load_job(analyzer.BATCH_JOB_NAME)["batch_id"] == job["batch_id"]
+
+    async def submit_job(*args, **kwargs):
+        raise AssertionError("The saved job should have been resumed")
+    monkeypatch.setattr(llm_batch, "submit_job", submit_job)
+
+    analyze_pending(workspace)
+
+    assert analysed(workspace, "competitor_urls")[COMPETITOR_URLS[0]] == "Yes"
+    assert len(workspace.rows("competitor_analysis")) == len(COMPETITOR_URLS)
+    assert llm_batch.load_job(analyzer.BATCH_JOB_NAME) is None
@@ -0,0 +1,127 @@
+import asyncio
+import gzip
+import time
+
+import litellm
+import pytest
+
+import llm_gateway
+import metrics
+import model_router
+from cassettes import Cassette, CassetteMissError, load_entries
+from model_router import ModelRouter
+
+MODEL = "openai/gpt-4o-mini"
+
+
+def request(text):
+    return {"model": MODEL, "messages": [{"role": "user", "content": text}]}
+
+
+def response(text):
+    return {"id": "chatcmpl-1", "model": MODEL, "object": "chat.completion", "citations": ["https://a.example.com"],
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": text}}],
+            "usage": {"prompt_tokens": 5, "completion_tokens": 2, "total_tokens": 7}}
+
+
+def test_replay_matches_by_key_then_by_stage_order(tmp_path):
+    path = str(tmp_path / "run.cassette.jsonl.gz")
+    recorder = Cassette(path, "record")
+    recorder.record("key-1", "Planner", request("first"), response("one"))
+    recorder.record("key-2", "Planner", request("second"), response("two"))
+    recorder.record("key-3", "Writer", request("third"), response("three"))
+
+    player = Cassette(path, "replay")
+
+    assert player.replay("key-2", "Planner", MODEL)["choices"][0]["message"]["content"] == "two"
+    # A changed prompt gets the next unused response recorded for its stage.
+    assert player.replay("changed", "Planner", MODEL)["choices"][0]["message"]["content"] == "one"
+    with pytest.raises(CassetteMissError):
+        player.replay("changed", "Planner", MODEL)
+    assert player.stats() | {"path": None} == {"path": None, "mode": "replay", "recorded": 0, "replayed": 2, "fuzzy_matches": 1}
+
+
+def test_interrupted_recording_keeps_the_complete_calls(tmp_path):
+    path = str(tmp_path / "run.cassette.jsonl.gz")
+    recorder = Cassette(path, "record")
+    recorder.record("key-1", "Planner", request("first"), response("one"))
+    with open(path, "rb") as f:
+        first_call = len(f.read())
+    recorder.record("key-2", "Planner", request("second"), response("two"))
+    with open(path, "rb") as f:
+        data = f.read()
+    with open(path, "wb") as f:
+        f.write(data[:(first_call + len(data)) // 2])  # The run died while writing the second call.
+
+    assert [entry["key"] for entry in load_entries(path)] == ["key-1"]
+
+
+def test_missing_cassette_is_reported(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        Cassette(str(tmp_path / "none.cassette.jsonl.gz"), "replay")
+
+
+def test_gateway_round_trip(tmp_path, monkeypatch):
+    """A call recorded through the gateway is replayed with its citations and without a provider call."""
+    path = str(tmp_path / "run.cassette.jsonl.gz")
+    provider_calls = []
+
+    async def provider(**request_kwargs):
+        provider_calls.append(request_kwargs)
+        return litellm.ModelResponse(**response("recorded answer"))
+
+    async def call(text):
+        with llm_gateway.stage("Planner"):
+            return await llm_gateway.acompletion(**request(text))
+
+    monkeypatch.setattr(metrics, "METRICS_DIR", str(tmp_path / "metrics"))
+    for name in ("_response_cache", "_rate_limiter", "_concurrency", "_hedger", "_router", "_single_flight"):
+        monkeypatch.setattr(llm_gateway, name, None)
+    monkeypatch.setattr(litellm, "acompletion", provider)
+
+    monkeypatch.setattr(llm_gateway, "_cassette", Cassette(path, "record"))
+    recorded = asyncio.run(call("Plan a post"))
+    monkeypatch.setattr(llm_gateway, "_cassette", Cassette(path, "replay"))
+    replayed = asyncio.run(call("Plan a post"))
+
+    assert len(provider_calls) == 1
+    assert replayed.choices[0].message.content == recorded.choices[0].message.content == "recorded answer"
+    assert replayed.citations == ["https://a.example.com"]
+    assert replayed.usage.total_tokens == 7
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        assert len(f.readlines()) == 1
+
+
+def test_routed_call_is_replayed_under_its_configured_model(tmp_path, monkeypatch):
+    """The router is skipped on replay, so a rerouted call is recorded under the model the script configured."""
+    path = str(tmp_path / "run.cassette.jsonl.gz")
+    provider_models = []
+
+    async def provider(**request_kwargs):
+        provider_models.append(request_kwargs["model"])
+        return litellm.ModelResponse(**response("fast answer"))
+
+    async def call():
+        with llm_gateway.stage("Planner"):
+            return await llm_gateway.acompletion(model="openai/slow", messages=[{"role": "user", "content": "Plan a post"}])
+
+    monkeypatch.setattr(metrics, "METRICS_DIR", str(tmp_path / "metrics"))
+    for name in ("_response_cache", "_rate_limiter", "_concurrency", "_hedger", "_single_flight"):
+        monkeypatch.setattr(llm_gateway, name, None)
+    monkeypatch.setattr(litellm, "acompletion", provider)
+    monkeypatch.setattr(model_router, "MODEL_ROUTES", {"Planner": ["openai/fast"]})
+    monkeypatch.setattr(model_router, "MODEL_PINS", {})
+    router = ModelRouter(str(tmp_path / "model_latencies.json"))
+    now = time.time()
+    router.samples = {"Planner|openai/slow": [[now, 10.0]] * 3, "Planner|openai/fast": [[now, 1.0]] * 3}
+    monkeypatch.setattr(llm_gateway, "_router", router)
+
+    monkeypatch.setattr(llm_gateway, "_cassette", Cassette(path, "record"))
+    asyncio.run(call())
+    monkeypatch.setattr(llm_gateway, "_cassette", Cassette(path, "replay"))
+    replayed = asyncio.run(call())
+
+    assert provider_models == ["openai/fast"]
+    assert replayed.choices[0].message.content == "fast answer"
+    [entry] = load_entries(path)
+    assert (entry["model"], entry["request"]["model"], entry["routed_to"]) == ("openai/slow", "openai/slow", "openai/fast")
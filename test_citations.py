@@ -0,0 +1,55 @@
+from citations import CitationResolver, extract_sources
+
+SOURCES = [{"url": "https://a.example.com/post"}, {"url": "https://b.example.com/"}, {"url": "https://c.example.com"}]
+
+
+def test_single_and_grouped_markers_are_resolved():
+    text = CitationResolver().resolve("Floss daily[1]. Brush twice[2, 3]. Rinse[3,1].", SOURCES)
+
+    assert text == ("Floss daily - source: https://a.example.com/post. "
+                    "Brush twice - source: https://b.example.com/ - source: https://c.example.com. "
+                    "Rinse - source: https://c.example.com - source: https://a.example.com/post.")
+
+
+def test_duplicate_sources_and_markers_collapse():
+    sources = SOURCES + [{"url": "HTTPS://A.example.com/post/#intro", "title": "Post A"}]
+
+    resolver = CitationResolver()
+    text = resolver.resolve("Whitening [1][4] and [1, 4].", sources, renumber_only=True)
+
+    assert text == "Whitening [1][1] and [1]."
+    assert [source["url"] for source in resolver.sources] == [source["url"] for source in SOURCES]
+    assert resolver.sources[0]["title"] == "Post A"
+
+
+def test_sources_of_several_responses_share_one_numbering():
+    resolver = CitationResolver()
+    resolver.resolve("First [1].", SOURCES[:1])
+
+    text = resolver.resolve("Second [1] and [2].", [{"url": "https://d.example.com"}, {"url": "https://a.example.com/post/"}], renumber_only=True)
+
+    assert text == "Second [2] and [1]."
+    assert [source["number"] for source in resolver.sources] == [1, 2]
+
+
+def test_markers_outside_the_source_list_are_kept():
+    assert CitationResolver().resolve("See [2] and [1, 5] and [0].", SOURCES[:1]) == "See [2] and [1, 5] and [0]."
+
+
+def test_streamed_markers_split_across_chunks():
+    stream = CitationResolver().stream()
+
+    output = stream.feed("Implants last[", SOURCES) + stream.feed("1,") + stream.feed(" 2] years[3") + stream.feed("]. More[") + stream.flush()
+
+    assert output == ("Implants last - source: https://a.example.com/post - source: https://b.example.com/ "
+                      "years - source: https://c.example.com. More[")
+
+
+def test_sources_from_annotations():
+    response = {"choices": [{"message": {"content": "Text[1]", "annotations": [
+        {"type": "url_citation", "url_citation": {"url": "https://a.example.com/post", "title": "A"}},
+        {"type": "file_citation"},
+    ]}}]}
+
+    assert extract_sources(response) == [{"url": "https://a.example.com/post", "title": "A"}]
+    assert CitationResolver().resolve_response(response) == "Text - source: https://a.example.com/post"
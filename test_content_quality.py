@@ -0,0 +1,93 @@
+import pytest
+
+import content_quality
+from content_quality import check_section, check_sections
+
+KEYWORDS = ["teeth whitening", "whitening cost", "sensitive teeth"]
+SIMPLE_WORDS = "Your teeth can look brighter. A dentist can help you. It does not take long. You can go home the same day. "
+
+INTRO = "# Teeth Whitening Guide\n\nTeeth whitening makes your smile bright. " + SIMPLE_WORDS * 3
+SECTION = "## What Does Teeth Whitening Cost?\n\nThe whitening cost of teeth whitening depends on the clinic. " + SIMPLE_WORDS * 3
+SECTION_PLAN = "## Cost\nExplain the whitening cost and teeth whitening options - source: https://clinic.example.com/prices"
+
+
+def test_good_sections_pass():
+    intro, section = check_sections([INTRO, SECTION + "See the prices - source: https://clinic.example.com/prices"],
+                                    [None, SECTION_PLAN], ", ".join(KEYWORDS), "teeth whitening")
+
+    assert intro["problems"] == [] and intro["heading_keyword"]
+    assert section["problems"] == []
+    assert section["keywords"] == ["teeth whitening", "whitening cost"]
+    assert section["keyword_coverage"] == 1.0
+    assert section["links"] == 1
+
+
+def test_reading_grade_threshold(monkeypatch):
+    hard = "## Teeth Whitening\n\n" + "Professional bleaching procedures necessitate comprehensive consultation regarding hypersensitivity considerations. " * 4
+    report = check_section(hard, None, KEYWORDS, "teeth whitening")
+    assert report["grade"] > content_quality.QUALITY_MAX_GRADE
+    assert any("reading level" in problem for problem in report["problems"])
+
+    monkeypatch.setattr(content_quality, "QUALITY_MAX_GRADE", report["grade"])
+    assert check_section(hard, None, KEYWORDS, "teeth whitening")["problems"] == []
+
+
+def test_short_sections_get_no_grade():
+    assert check_section("## Teeth Whitening\n\nShort.", None, KEYWORDS, "teeth whitening")["grade"] is None
+
+
+def test_keyword_coverage_threshold(monkeypatch):
+    plan = "Explain teeth whitening. Give the whitening cost. Warn about sensitive teeth."
+    section = "## Teeth Whitening\n\nTeeth whitening is quick. " + SIMPLE_WORDS * 3
+
+    report = check_section(section, plan, KEYWORDS, "teeth whitening")
+    assert report["missing_keywords"] == ["whitening cost", "sensitive teeth"]
+    assert report["keyword_coverage"] == pytest.approx(0.33)
+    assert "These keywords from the plan are missing: whitening cost, sensitive teeth." in report["problems"]
+
+    monkeypatch.setattr(content_quality, "QUALITY_MIN_KEYWORD_COVERAGE", 0.3)
+    assert check_section(section, plan, KEYWORDS, "teeth whitening")["problems"] == []
+
+
+def test_keyword_density_threshold():
+    stuffed = "## Teeth Whitening\n\n" + "Teeth whitening is good. " * 10 + SIMPLE_WORDS * 2
+
+    report = check_section(stuffed, None, KEYWORDS, "teeth whitening")
+
+    assert report["densest_keyword"] == "teeth whitening"
+    assert report["keyword_density"] > content_quality.QUALITY_MAX_KEYWORD_DENSITY
+    assert any("makes up" in problem for problem in report["problems"])
+
+
+def test_intro_needs_the_primary_keyword_in_h1_and_first_words():
+    intro = "# A Brighter Smile\n\n" + SIMPLE_WORDS * 6 + "Teeth whitening helps."
+
+    problems = check_section(intro, None, KEYWORDS, "teeth whitening", is_intro=True)["problems"]
+
+    assert problems == [
+        "The H1 title must contain the primary keyword 'teeth whitening'.",
+        "Place the primary keyword 'teeth whitening' within the first 100 words of the introduction.",
+    ]
+
+
+def test_section_heading_needs_one_of_its_keywords():
+    section = "## Prices\n\nThe whitening cost depends on the clinic. " + SIMPLE_WORDS * 3
+
+    report = check_section(section, "Explain the whitening cost.", KEYWORDS, "teeth whitening")
+
+    assert report["heading_keyword"] is False
+    assert report["problems"] == ["The section heading should contain one of its keywords: whitening cost."]
+
+
+def test_missing_sources_and_link_limit(monkeypatch):
+    monkeypatch.setattr(content_quality, "QUALITY_MAX_LINKS_PER_SECTION", 2)
+    section = SECTION + "Read [one](https://a.example.com), [two](https://b.example.com) and https://c.example.com."
+
+    report = check_section(section, SECTION_PLAN, KEYWORDS, "teeth whitening")
+
+    assert report["links"] == 3
+    assert report["missing_sources"] == ["https://clinic.example.com/prices"]
+    assert report["problems"] == [
+        "Keep the ` - source: URL` markers of the plan; these sources are missing: https://clinic.example.com/prices.",
+        "The section has 3 links; keep at most 2.",
+    ]
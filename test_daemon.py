@@ -0,0 +1,38 @@
+import csv
+
+import daemon
+
+
+def write_urls(path, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=["URL", "Analysed"])
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def test_csv_edited_during_a_run_is_merged_after_it(tmp_path, monkeypatch):
+    monkeypatch.setattr(daemon, "SCRIPT_DIR", str(tmp_path))
+    monkeypatch.setattr(daemon, "STATE_DB_PATH", str(tmp_path / "state.sqlite3"))
+    csv_path = tmp_path / "Competitor URLs.csv"
+    write_urls(csv_path, [{"URL": "https://a.example.com", "Analysed": "No"}])
+    pipeline = daemon.PipelineDaemon(["analyzer"])
+    try:
+        pipeline.store.sync_from_csv("competitor_urls")
+        pipeline.current_run = object()  # A stage is running and marks its URL as analysed.
+        pipeline.store.update("competitor_urls", "https://a.example.com", {"Analysed": "Yes"})
+
+        write_urls(csv_path, [{"URL": "https://a.example.com", "Analysed": "No"}, {"URL": "https://b.example.com", "Analysed": "No"}])
+        pipeline._on_file_change("Competitor URLs.csv")
+        assert pipeline.deferred_tables == {"competitor_urls"}
+        assert len(pipeline.store.rows("competitor_urls")) == 1
+
+        pipeline.current_run = None
+        pipeline._sync_deferred_tables()
+
+        assert pipeline.store.rows("competitor_urls") == [
+            {"URL": "https://a.example.com", "Analysed": "Yes"},
+            {"URL": "https://b.example.com", "Analysed": "No"},
+        ]
+        assert pipeline.changed.is_set()
+    finally:
+        pipeline.store.close()
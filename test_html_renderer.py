@@ -0,0 +1,68 @@
+import re
+
+import pytest
+
+from html_renderer import render_blog_post_html
+
+DRAFT = """# Sensitive Teeth Guide - source: https://clinic.example.com/blog/post-1
+
+Sensitive teeth are common, says a [recent study](https://journal.example.org/a).
+
+## Table of Contents
+- Causes
+- Treatment
+
+## What Causes **Sensitive** Teeth? [https://clinic.example.com/blog/post-2]
+
+Worn enamel exposes the dentin - source: https://clinic.example.com/blog/post-2
+
+## Treatment at https://clinic.example.com/treatments
+
+1. Desensitising toothpaste
+2. Fluoride varnish
+
+## Treatment at https://clinic.example.com/treatments
+
+| Option | Cost |
+|---|---|
+| Toothpaste | $10 |
+"""
+
+
+@pytest.fixture(scope="module")
+def rendered():
+    return render_blog_post_html(DRAFT)
+
+
+def toc_entries(rendered):
+    toc = rendered.split('yoast-table-of-contents">', 1)[1].split("</div>", 1)[0]
+    return re.findall(r'<a href="#([^"]+)" data-level="\d">([^<]*)</a>', toc)
+
+
+def test_toc_labels_and_heading_ids_leave_out_source_urls(rendered):
+    assert toc_entries(rendered) == [
+        ("sensitive-teeth-guide", "Sensitive Teeth Guide"),
+        ("what-causes-sensitive-teeth", "What Causes Sensitive Teeth?"),
+        ("treatment-at", "Treatment at"),
+        ("treatment-at-2", "Treatment at"),
+    ]
+    assert re.findall(r'<h\d id="([^"]+)"', rendered) == [entry[0] for entry in toc_entries(rendered)]
+
+
+def test_headings_keep_their_links(rendered):
+    assert '<h1 id="sensitive-teeth-guide"' in rendered
+    assert 'Sensitive Teeth Guide - source: <a href="https://clinic.example.com/blog/post-1">clinic.example.com</a></h1>' in rendered
+    assert '<strong>Sensitive</strong> Teeth? <a href="https://clinic.example.com/blog/post-2">[source]</a></h2>' in rendered
+
+
+def test_draft_blocks_are_rendered(rendered):
+    assert rendered.count("Table of contents") == 1  # The writer's own TOC is replaced.
+    assert rendered.index("Estimated reading time: 1 minute") < rendered.index("yoast-table-of-contents")
+    assert '<a href="https://journal.example.org/a">recent study</a>' in rendered
+    assert '<ol class="wp-block-list">' in rendered and "<li>Fluoride varnish</li>" in rendered
+    assert "<tr><td>Toothpaste</td><td>$10</td></tr>" in rendered
+
+
+def test_empty_draft_is_rejected():
+    with pytest.raises(ValueError):
+        render_blog_post_html("  \n")
@@ -0,0 +1,87 @@
+import json
+import random
+import time
+
+import pytest
+
+import metrics
+import model_router
+from model_router import ModelRouter
+
+SLOW, FAST, NEW = "openai/slow", "openai/fast", "openai/new"
+
+
+@pytest.fixture
+def router(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_ENABLED", True)
+    monkeypatch.setattr(metrics, "METRICS_DIR", str(tmp_path / "metrics"))
+    monkeypatch.setattr(model_router, "MODEL_ROUTES", {"Planner": [FAST]})
+    monkeypatch.setattr(model_router, "MODEL_PINS", {})
+    router = ModelRouter(str(tmp_path / "model_latencies.json"))
+    router.rng = random.Random(0)
+    return router
+
+
+def seed(router, model, *latencies):
+    router.samples[f"Planner|{model}"] = [[time.time(), latency] for latency in latencies]
+
+
+def test_switches_only_to_a_clearly_faster_model(router):
+    seed(router, SLOW, 1.0, 1.0, 1.0)
+    seed(router, FAST, 0.9, 0.9, 0.9)
+    assert router.choose("Planner", SLOW) == SLOW  # 10% faster is within the switch margin.
+
+    seed(router, FAST, 0.7, 0.7, 0.7)
+    assert router.choose("Planner", SLOW) == FAST
+    assert router.stats() == {"decisions": 2, "rerouted": {"Planner": {FAST: 1}}}
+    decisions = [json.loads(line) for line in open(f"{metrics.METRICS_DIR}/routing.jsonl", encoding="utf-8")]
+    assert [(decision["chosen"], decision["reason"]) for decision in decisions] == [(SLOW, "configured"), (FAST, "fastest")]
+
+
+def test_unhealthy_models_are_avoided(router):
+    seed(router, SLOW, 0.5, None, None, None)
+    seed(router, FAST, 2.0, 2.0, 2.0)
+    assert router.choose("Planner", SLOW) == FAST  # The configured model fails too often.
+
+    seed(router, SLOW, 1.0, 1.0, 1.0)
+    seed(router, FAST, 0.1, 0.1, 0.1)
+    router.health_check = lambda model: model != FAST  # Its circuit breaker is open.
+    assert router.choose("Planner", SLOW) == SLOW
+
+
+def test_pins_override_the_routes(router, monkeypatch):
+    seed(router, SLOW, 1.0, 1.0, 1.0)
+    seed(router, FAST, 0.1, 0.1, 0.1)
+
+    monkeypatch.setattr(model_router, "MODEL_PINS", {"Planner": None})
+    assert router.choose("Planner", SLOW) == SLOW
+    monkeypatch.setattr(model_router, "MODEL_PINS", {"Planner": NEW})
+    assert router.choose("Planner", SLOW) == NEW
+    assert router.decisions == 0
+
+
+def test_unmeasured_models_are_explored(router, monkeypatch):
+    monkeypatch.setattr(model_router, "MODEL_ROUTES", {"Planner": [FAST, NEW]})
+    assert router.choose("Planner", SLOW) == SLOW  # No data: the configured model is tried first.
+
+    seed(router, SLOW, 1.0, 1.0, 1.0)
+    seed(router, FAST, 0.5, 0.5, 0.5)
+    monkeypatch.setattr(model_router, "ROUTER_EXPLORE_RATE", 0.0)
+    assert router.choose("Planner", SLOW) == FAST
+    monkeypatch.setattr(model_router, "ROUTER_EXPLORE_RATE", 1.0)
+    assert router.choose("Planner", SLOW) == NEW
+
+
+def test_record_merges_with_other_processes(router, monkeypatch):
+    monkeypatch.setattr(model_router, "ROUTER_WINDOW", 3)
+    other = ModelRouter(router.path)
+
+    router.record("Planner", SLOW, 1.0)
+    other.record("Planner", FAST, 0.5)
+    for latency in (2.0, 3.0, None):
+        router.record("Planner", SLOW, latency)
+
+    samples = ModelRouter(router.path).samples
+    assert [latency for _, latency in samples[f"Planner|{SLOW}"]] == [2.0, 3.0, None]
+    assert [latency for _, latency in samples[f"Planner|{FAST}"]] == [0.5]
+    assert router.samples == samples
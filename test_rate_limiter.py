@@ -0,0 +1,64 @@
+import asyncio
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import rate_limiter
+from rate_limiter import TokenBucketRateLimiter
+
+
+@pytest.fixture
+def limiter(tmp_path, monkeypatch):
+    monkeypatch.setattr(rate_limiter, "MODEL_RATE_LIMITS", {"model": (60, 1000)})
+    return TokenBucketRateLimiter(str(tmp_path / "rate_limits.sqlite3"))
+
+
+def hold_lock(path, seconds):
+    """Holds the write lock of the buckets file like another process in the middle of an update."""
+    locked = threading.Event()
+
+    def run():
+        conn = sqlite3.connect(path, isolation_level=None)
+        conn.execute("BEGIN IMMEDIATE")
+        locked.set()
+        time.sleep(seconds)
+        conn.execute("COMMIT")
+        conn.close()
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    locked.wait()
+    return thread
+
+
+def test_acquire_consumes_both_buckets(limiter):
+    asyncio.run(limiter.acquire("model", 400))
+    asyncio.run(limiter.record_usage("model", 400, 500))
+
+    bucket = limiter.snapshot()[0]
+    assert bucket["requests"] == pytest.approx(59, abs=0.1)
+    assert bucket["tokens"] == pytest.approx(500, abs=5)
+
+
+def test_waiting_for_the_file_lock_does_not_block_the_event_loop(limiter):
+    async def acquire_while_locked():
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.02)
+                ticks += 1
+
+        ticker = asyncio.create_task(tick())
+        await asyncio.sleep(0)
+        holder = hold_lock(limiter.state_path, 0.3)
+        await limiter.acquire("model", 100)
+        await limiter.record_usage("model", 100, 200)
+        ticker.cancel()
+        holder.join()
+        return ticks
+
+    assert asyncio.run(acquire_while_locked()) >= 5
@@ -0,0 +1,123 @@
+import asyncio
+
+import pytest
+
+import resilience
+from resilience import CircuitOpenError, ResilientCaller
+
+
+class ProviderError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(resilience, "MAX_ATTEMPTS", 1)
+    monkeypatch.setattr(resilience, "CIRCUIT_FAILURE_THRESHOLD", 2)
+    monkeypatch.setattr(resilience, "CIRCUIT_COOLDOWN_SECONDS", 10)
+    monkeypatch.setattr(resilience, "FALLBACK_MODELS", {})
+
+
+def responding(*outcomes):
+    """A send_request that raises or returns the given outcomes in turn."""
+    outcomes = list(outcomes)
+
+    async def send_request(request_kwargs):
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+    return send_request
+
+
+def call(caller, send_request):
+    return asyncio.run(caller.call(send_request, {"model": "m"}))
+
+
+def open_circuit(caller):
+    for _ in range(2):
+        with pytest.raises(ProviderError):
+            call(caller, responding(ProviderError(503)))
+    breaker = caller.breaker_for("m")
+    assert breaker.state == "open"
+    return breaker
+
+
+def end_cooldown(breaker):
+    breaker.opened_at -= breaker.cooldown_seconds
+
+
+def test_circuit_opens_after_consecutive_failures_and_short_circuits():
+    caller = ResilientCaller()
+    breaker = open_circuit(caller)
+
+    with pytest.raises(CircuitOpenError):
+        call(caller, responding("unused"))
+    assert breaker.short_circuited == 1
+    assert caller.stats()["open_circuits"] == ["m"]
+
+
+def test_successful_probe_closes_the_circuit():
+    caller = ResilientCaller()
+    breaker = open_circuit(caller)
+    end_cooldown(breaker)
+
+    assert call(caller, responding("ok")) == "ok"
+
+    assert breaker.state == "closed"
+    assert breaker.consecutive_failures == 0
+
+
+def test_failed_probe_reopens_with_doubled_cooldown():
+    caller = ResilientCaller()
+    breaker = open_circuit(caller)
+    end_cooldown(breaker)
+
+    with pytest.raises(ProviderError):
+        call(caller, responding(ProviderError(503)))
+
+    assert breaker.state == "open"
+    assert breaker.cooldown_seconds == 20
+    assert breaker.times_opened == 2
+
+
+def test_probe_with_fatal_error_hands_the_probe_to_the_next_call():
+    caller = ResilientCaller()
+    breaker = open_circuit(caller)
+    end_cooldown(breaker)
+
+    with pytest.raises(ProviderError):
+        call(caller, responding(ProviderError(400)))
+
+    assert breaker.state == "open"
+    assert breaker.cooldown_seconds == 10
+    assert call(caller, responding("ok")) == "ok"
+    assert breaker.state == "closed"
+
+
+def test_cancelled_probe_hands_the_probe_to_the_next_call():
+    caller = ResilientCaller()
+    breaker = open_circuit(caller)
+    end_cooldown(breaker)
+
+    async def cancel_probe():
+        started = asyncio.Event()
+
+        async def slow_request(request_kwargs):
+            started.set()
+            await asyncio.sleep(60)
+
+        task = asyncio.create_task(caller.call(slow_request, {"model": "m"}))
+        await started.wait()
+        assert breaker.state == "half_open"
+        task.cancel()  # What a hedged request does to the slower copy.
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_probe())
+
+    assert breaker.state == "open"
+    assert call(caller, responding("ok")) == "ok"
+    assert breaker.state == "closed"
@@ -0,0 +1,21 @@
+import json
+import subprocess
+import sys
+
+import seo_cli
+
+
+def run_probe(code):
+    result = subprocess.run([sys.executable, "-c", code], cwd=seo_cli.SCRIPT_DIR, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_status_loads_no_heavy_modules():
+    probe = run_probe(seo_cli._STARTUP_PROBE)
+
+    assert probe["heavy"] == []
+    assert probe["ms"] > 0
+
+
+def test_probe_reports_heavy_modules():
+    assert run_probe("import asyncio\n" + seo_cli._STARTUP_PROBE)["heavy"] == ["asyncio"]
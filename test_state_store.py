@@ -0,0 +1,125 @@
+import asyncio
+import csv
+import time
+
+import pytest
+
+from state_store import StateStore
+
+
+def write_csv(path, headers, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=headers)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def read_csv(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+
+@pytest.fixture
+def store(tmp_path):
+    write_csv(tmp_path / "Competitor URLs.csv", ["URL", "Analysed", "Notes"], [
+        {"URL": "https://a.example.com", "Analysed": "No", "Notes": "first"},
+        {"URL": "https://b.example.com", "Analysed": "No", "Notes": ""},
+    ])
+    store = StateStore(str(tmp_path / "state.sqlite3"), csv_dir=str(tmp_path))
+    store.sync_from_csv("competitor_urls")
+    yield store
+    store.close()
+
+
+def test_import_export_round_trip(store):
+    assert [row["URL"] for row in store.rows("competitor_urls")] == ["https://a.example.com", "https://b.example.com"]
+    assert store.update("competitor_urls", "https://a.example.com", {"Analysed": "Yes"}) == 1
+
+    store.export_tables(["competitor_urls"])
+
+    rows = read_csv(store.csv_path("competitor_urls"))
+    assert list(rows[0]) == ["URL", "Analysed", "Notes"]  # Header order and extra columns are kept.
+    assert rows[0] == {"URL": "https://a.example.com", "Analysed": "Yes", "Notes": "first"}
+    assert store.rows("competitor_urls", status_in=("no", "")) == [{"URL": "https://b.example.com", "Analysed": "No", "Notes": ""}]
+    assert not store.sync_from_csv("competitor_urls")  # Our own export is not a hand edit.
+
+
+def test_hand_edit_between_update_and_export_keeps_database_updates(store):
+    store.export_tables(["competitor_urls"])
+    store.update("competitor_urls", "https://a.example.com", {"Analysed": "Yes"})
+    store.update("competitor_urls", "https://b.example.com", {"Analysed": "Yes"})
+
+    # Someone adds a URL and fixes a note in the CSV while the run is still going.
+    path = store.csv_path("competitor_urls")
+    rows = read_csv(path)
+    rows[1]["Notes"] = "checked by hand"
+    rows.append({"URL": "https://c.example.com", "Analysed": "No", "Notes": ""})
+    write_csv(path, ["URL", "Analysed", "Notes"], rows)
+
+    store.export_tables(["competitor_urls"])
+
+    assert read_csv(path) == [
+        {"URL": "https://a.example.com", "Analysed": "Yes", "Notes": "first"},
+        {"URL": "https://b.example.com", "Analysed": "Yes", "Notes": "checked by hand"},
+        {"URL": "https://c.example.com", "Analysed": "No", "Notes": ""},
+    ]
+
+
+def test_hand_edits_change_and_delete_rows(store):
+    store.export_tables(["competitor_urls"])
+    path = store.csv_path("competitor_urls")
+    write_csv(path, ["URL", "Analysed", "Notes"], [{"URL": "https://a.example.com", "Analysed": "Yes", "Notes": "first"}])
+
+    assert store.sync_from_csv("competitor_urls")
+
+    assert store.rows("competitor_urls") == [{"URL": "https://a.example.com", "Analysed": "Yes", "Notes": "first"}]
+
+
+def test_claim_renew_and_release_leases(store):
+    first = store.claim_next("competitor_urls", "worker-1", lease_seconds=60)
+    second = store.claim_next("competitor_urls", "worker-2", lease_seconds=60)
+    assert (first["URL"], first["lease_claims"]) == ("https://a.example.com", 1)
+    assert second["URL"] == "https://b.example.com"
+    assert store.claim_next("competitor_urls", "worker-3", lease_seconds=60) is None
+
+    assert store.renew_lease("competitor_urls", first["URL"], "worker-1", lease_seconds=60)
+    assert not store.renew_lease("competitor_urls", first["URL"], "worker-2", lease_seconds=60)
+
+    store.release_lease("competitor_urls", second["URL"], "worker-2")
+    assert [lease["owner"] for lease in store.active_leases("competitor_urls")] == ["worker-1"]
+    assert store.claim_next("competitor_urls", "worker-3", lease_seconds=60)["URL"] == "https://b.example.com"
+
+
+def test_expired_lease_is_reclaimed(store):
+    store.claim_next("competitor_urls", "worker-1", lease_seconds=0.01)
+    store.claim_next("competitor_urls", "worker-1", lease_seconds=60)
+    time.sleep(0.05)
+
+    reclaimed = store.claim_next("competitor_urls", "worker-2", lease_seconds=60)
+
+    assert (reclaimed["URL"], reclaimed["lease_claims"]) == ("https://a.example.com", 2)
+
+
+def test_completed_rows_are_not_claimed(store):
+    store.update("competitor_urls", "https://a.example.com", {"Analysed": "Yes"})
+    assert store.claim_next("competitor_urls", "worker-1", lease_seconds=60)["URL"] == "https://b.example.com"
+
+
+def test_heartbeat_in_a_worker_thread(store):
+    """Lease renewals from asyncio.to_thread interleave with writes from the event loop thread."""
+    claimed = store.claim_next("competitor_urls", "worker-1", lease_seconds=60)
+
+    async def run():
+        async def heartbeat():
+            for _ in range(50):
+                assert await asyncio.to_thread(store.renew_lease, "competitor_urls", claimed["URL"], "worker-1", 60)
+
+        task = asyncio.create_task(heartbeat())
+        for n in range(50):
+            store.update("competitor_urls", "https://b.example.com", {"Notes": str(n)})
+            await asyncio.sleep(0)
+        await task
+
+    asyncio.run(run())
+
+    assert store.rows("competitor_urls", key="https://b.example.com")[0]["Notes"] == "49"
@@ -0,0 +1,180 @@
+import os
+import sys
+import json
+import time
+import functools
+import threading
+from contextlib import contextmanager
+
+# --- Span Tracing and Profiling ---
+# span()/traced() record where a run spends its time (CSV I/O, prompt assembly, rate-limit and
+# network waits, parsing, HTML rendering) as Chrome trace events, written to
+# .seo_cache/traces/<script>-<time>-<pid>.trace.json at the end of the run; open it in
+# chrome://tracing or https://ui.perfetto.dev. Concurrent asyncio tasks get their own track.
+# Tracing is off unless SEO_TRACE=1 or --trace is given; while off, span() returns a shared
+# no-op object, so instrumented code pays one flag check per span.
+# SEO_PROFILE=1 or --profile additionally runs each script (each stage run in daemon mode)
+# under cProfile and writes a .prof file plus a text report next to the traces.
+TRACE_ENABLED = os.getenv("SEO_TRACE", "0").strip().lower() not in ("0", "false", "no", "off")
+PROFILE_ENABLED = os.getenv("SEO_PROFILE", "0").strip().lower() not in ("0", "false", "no", "off")
+TRACE_DIR = os.getenv("SEO_TRACE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".seo_cache", "traces"))
+PROFILE_REPORT_LINES = 40
+CO_COROUTINE = 0x80
+
+_events = []
+_tracks = {}
+_origin_ns = time.perf_counter_ns()
+
+
+def enable_tracing():
+    global TRACE_ENABLED
+    TRACE_ENABLED = True
+
+
+def enable_profiling():
+    global PROFILE_ENABLED
+    PROFILE_ENABLED = True
+
+
+def _track_id() -> int:
+    """One track per asyncio task (falling back to the thread), so overlapping tasks do not share a row."""
+    task = None
+    asyncio = sys.modules.get("asyncio")
+    if asyncio is not None:
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+    key = id(task) if task is not None else threading.get_ident()
+    if key not in _tracks:
+        _tracks[key] = len(_tracks) + 1
+        label = task.get_name() if task is not None else threading.current_thread().name
+        _events.append({"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": _tracks[key], "args": {"name": label}})
+    return _tracks[key]
+
+
+class _Span:
+    __slots__ = ("name", "category", "args", "start_ns", "track")
+
+    def __init__(self, name: str, category: str, args: dict):
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        self.track = _track_id()
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end_ns = time.perf_counter_ns()
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        _events.append({
+            "name": self.name, "cat": self.category, "ph": "X", "pid": os.getpid(), "tid": self.track,
+            "ts": (self.start_ns - _origin_ns) / 1000, "dur": (end_ns - self.start_ns) / 1000, "args": self.args,
+        })
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name: str, category: str = "pipeline", **args):
+    """Context manager timing a block as a trace span (a no-op while tracing is off)."""
+    if not TRACE_ENABLED:
+        return _NULL_SPAN
+    return _Span(name, category, args)
+
+
+def traced(category: str, name: str | None = None):
+    """Decorator recording each call of a function or coroutine function as a span."""
+    def decorator(func):
+        span_name = name or func.__name__
+        if _is_coroutine_function(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if not TRACE_ENABLED:
+                    return await func(*args, **kwargs)
+                with _Span(span_name, category, {}):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not TRACE_ENABLED:
+                return func(*args, **kwargs)
+            with _Span(span_name, category, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _is_coroutine_function(func) -> bool:
+    # inspect.iscoroutinefunction() without importing inspect, which would slow `seo status`.
+    return bool(getattr(getattr(func, "__code__", None), "co_flags", 0) & CO_COROUTINE)
+
+
+def _output_path(label: str, extension: str) -> str:
+    os.makedirs(TRACE_DIR, exist_ok=True)
+    return os.path.join(TRACE_DIR, f"{label}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}{extension}")
+
+
+def write_trace(label: str) -> str | None:
+    """Writes the spans recorded so far as Chrome trace JSON and starts a new buffer. Returns the path."""
+    global _events
+    if not TRACE_ENABLED or not _events:
+        return None
+    events, _events = _events, []
+    _tracks.clear()
+    path = _output_path(label, ".trace.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+    print(f"Trace with {sum(1 for e in events if e['ph'] == 'X')} spans written to {path}.")
+    return path
+
+
+@contextmanager
+def profiled(label: str):
+    """Runs the block under cProfile when profiling is enabled and writes <label>.prof and a text report."""
+    if not PROFILE_ENABLED:
+        yield
+        return
+    import io
+    import pstats
+    import cProfile
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        path = _output_path(label, ".prof")
+        profiler.dump_stats(path)
+        report = io.StringIO()
+        pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(PROFILE_REPORT_LINES)
+        with open(path[:-len(".prof")] + ".profile.txt", "w", encoding="utf-8") as f:
+            f.write(report.getvalue())
+        print(f"Profile written to {path} (top functions by cumulative time in {path[:-len('.prof')]}.profile.txt).")
+
+
+def run_script(label: str, main):
+    """Runs a script's async main() with profiling and tracing as configured."""
+    import asyncio
+
+    try:
+        with profiled(label), span(label, "script"):
+            asyncio.run(main())
+    finally:
+        write_trace(label)